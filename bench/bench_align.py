@@ -0,0 +1,40 @@
+"""
+Token alignment: AlignedToken per piece (reconstruct_tokenized) vs. flat offset arrays (align_tokenized).
+Run from the root of the repo: python -m bench.bench_align
+"""
+import timeit
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+from bench.synthetic import make_document
+from vulyk_ner.text import align_tokenized, reconstruct_tokenized
+
+
+def measure(func: Callable[[], Any]) -> Tuple[float, int]:
+    """
+    Returns best of 3 wall times and the peak of the allocated memory for the single run
+    """
+    t: float = min(timeit.repeat(func, number=1, repeat=3))
+
+    tracemalloc.start()
+    result = func()
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+
+    return t, peak
+
+
+if __name__ == "__main__":
+    for sentences in [1000, 10000, 50000]:
+        doc, _ = make_document(sentences)
+
+        assert "".join(map(str, reconstruct_tokenized(doc))) == align_tokenized(doc)[0]
+
+        t_old, m_old = measure(lambda: list(reconstruct_tokenized(doc)))
+        t_new, m_new = measure(lambda: align_tokenized(doc))
+
+        print(
+            f"{sentences} sentences: AlignedToken list {t_old:.3f}s/{m_old / 2 ** 20:.1f}MB, "
+            f"arrays {t_new:.3f}s/{m_new / 2 ** 20:.1f}MB"
+        )
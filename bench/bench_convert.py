@@ -0,0 +1,53 @@
+"""
+Wall time and peak memory of convert_bsf_2_vulyk vs. previous version (string concatenation)
+on a big document (10 MB of text by default).
+Run from the root of the repo: python -m bench.bench_convert [size_in_mb]
+"""
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from bench.legacy import legacy_convert_bsf_2_vulyk
+from bench.synthetic import make_document
+from vulyk_ner.brat import convert_bsf_2_vulyk
+
+
+def measure(func: Callable[[], dict]) -> Tuple[float, float]:
+    """
+    Returns wall time in seconds and peak of allocated memory in MB
+    """
+    started: float = time.perf_counter()
+    func()
+    elapsed: float = time.perf_counter() - started
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    size_mb: float = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+
+    # Approximately 230 bytes of utf-8 text per sentence of synthetic document
+    doc: List[List[str]]
+    doc, _ = make_document(int(size_mb * 1024 * 1024 / 230))
+    print(f"Document: {len(doc)} sentences, {sum(len(' '.join(s).encode('utf-8')) + 1 for s in doc) / 1024 / 1024:.1f} MB")
+
+    for compensate in [False, True]:
+        new: dict = convert_bsf_2_vulyk(doc, "", compensate)
+        old: dict = legacy_convert_bsf_2_vulyk(doc, "", compensate)
+
+        for f in ["text", "sentence_offsets", "token_offsets"]:
+            assert new[f] == old[f], f"{f} differs from the reference implementation"
+
+        t_old, m_old = measure(lambda: legacy_convert_bsf_2_vulyk(doc, "", compensate))
+        t_new, m_new = measure(lambda: convert_bsf_2_vulyk(doc, "", compensate))
+
+        print(
+            f"compensate_for_offsets={compensate}: "
+            f"legacy {t_old:.2f}s / peak {m_old:.0f} MB, current {t_new:.2f}s / peak {m_new:.0f} MB"
+        )
@@ -0,0 +1,111 @@
+"""
+Wall time and peak memory of the conversion of vulyk export to IOB: reading the whole line with json.loads
+(as convert_vulyk2iob.py did before) vs. splitting it into answers on the fly with iter_array_items,
+sequentially and with the pool of workers. Export is a single line with many answers.
+Every variant runs in a fresh process, so the peak resident memory of the process and of its workers
+(which tracemalloc of the main process can't see) is measured separately for each of them.
+Run from the root of the repo: python -m bench.bench_export [answers] [workers]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from bench.synthetic import make_document
+from bin.convert_vulyk2iob import convert_answer, render_answer
+from vulyk_ner.brat import convert_bsf_2_vulyk
+from vulyk_ner.jsonstream import iter_array_items
+from vulyk_ner.metrics import peak_rss_mb
+from vulyk_ner.parallel import ordered_map
+
+
+def make_export(answers: int, sentences: int = 50) -> str:
+    doc, markup = make_document(sentences)
+    answer: dict = convert_bsf_2_vulyk(doc, markup, compensate_for_offsets=False)
+
+    return json.dumps(
+        [{"answer": answer, "task": {"id": f"task{i}"}, "user": {"username": "user"}} for i in range(answers)],
+        ensure_ascii=False,
+    )
+
+
+def legacy(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as fp:
+        return [convert_answer(answer["answer"]) for answer in json.loads(fp.read())]  # type: ignore
+
+
+def streaming(path: str, workers: int) -> List[str]:
+    with open(path, encoding="utf-8") as fp:
+        return [
+            converted.iob  # type: ignore
+            for converted in ordered_map(render_answer, iter_array_items(fp), workers=workers)
+        ]
+
+
+def measure(func: Callable[[], List[str]]) -> dict:
+    """
+    Wall time in seconds and peak resident memory in MB of the current process and of its finished children
+    (the workers, None if there were none)
+    """
+    started: float = time.perf_counter()
+    func()
+    elapsed: float = time.perf_counter() - started
+
+    children: Optional[float] = peak_rss_mb(children=True)
+    return {"elapsed": elapsed, "rss": peak_rss_mb(), "workers_rss": children or None}
+
+
+def variants(path: str, workers: int) -> Dict[str, Callable[[], List[str]]]:
+    return {
+        "json.loads of the line": lambda: legacy(path),
+        "streaming, 1 process": lambda: streaming(path, 1),
+        f"streaming, {workers} workers": lambda: streaming(path, workers),
+    }
+
+
+def mb(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f} MB"
+
+
+def run(answers: int, workers: int, step: str, path: str) -> str:
+    """
+    Runs the step (`export` or the name of the variant) in a fresh process: on Linux the peak memory
+    of the parent carries over to the child, so the parent itself holds neither the export nor the answers
+    """
+    return subprocess.run(
+        [sys.executable, "-m", "bench.bench_export", str(answers), str(workers), step, path],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+if __name__ == "__main__":
+    answers: int = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers: int = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    # Child run: write the export or measure a single variant on it and report back
+    if len(sys.argv) > 4:
+        if sys.argv[3] == "export":
+            with open(sys.argv[4], "w", encoding="utf-8") as out:
+                out.write(make_export(answers) + "\n")
+        else:
+            print(json.dumps(measure(variants(sys.argv[4], workers)[sys.argv[3]])))
+        sys.exit()
+
+    with tempfile.NamedTemporaryFile(suffix=".jsonlines") as fp:
+        run(answers, workers, "export", fp.name)
+        print(f"Export: {answers} answers in one line, {os.path.getsize(fp.name) / 1024 / 1024:.1f} MB")
+
+        for name in variants(fp.name, workers):
+            result: dict = json.loads(run(answers, workers, name, fp.name))
+            print(
+                f"{name}: {result['elapsed']:.2f}s / peak RSS {mb(result['rss'])}, "
+                f"workers {mb(result['workers_rss'])}"
+            )
+
+        # Checked last, see run
+        assert legacy(fp.name) == streaming(fp.name, 1), "Streaming export differs from the reference implementation"
@@ -0,0 +1,83 @@
+"""
+Cold start of the convert command measured with `python -X importtime`.
+Fails (exit code 1) when the imports take more than the budget or when one of the heavy modules
+that are only needed by other commands gets imported.
+Run from the root of the repo: python -m bench.bench_importtime [--budget_ms 120]
+"""
+import argparse
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+# Modules that are not needed to convert the files and shouldn't be loaded by the convert command
+HEAVY_MODULES: Tuple[str, ...] = (
+    "tokenize_uk",
+    "stanza",
+    "spacy",
+    "torch",
+    "sqlite3",
+    "urllib.request",
+    "http.server",
+    "multiprocessing",
+    "concurrent.futures.process",
+)
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def importtime(cmd: List[str]) -> Tuple[Dict[str, int], int, float]:
+    """
+    Run the command with -X importtime, returns cumulative import time of each module (in us),
+    total import time of the top level modules and the wall time of the whole run (in seconds)
+    """
+    started: float = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+    )
+    wall: float = time.perf_counter() - started
+
+    modules: Dict[str, int] = {}
+    total: int = 0
+
+    for line in proc.stderr.decode("utf-8").splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m is None:
+            continue
+
+        modules[m.group(4)] = int(m.group(2))
+        if len(m.group(3)) == 1:
+            total += int(m.group(2))
+
+    return modules, total, wall
+
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser()
+    parser.add_argument("--budget_ms", default=120.0, type=float, help="Maximum total import time of the convert command")
+    parser.add_argument("--repeat", default=5, type=int, help="Number of runs, the best one is taken")
+    args: argparse.Namespace = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cmd: List[str] = ["bin/convert2vulyk.py", "-f", "json", "convert", f"{tmp}/*.json"]
+        runs = [importtime(cmd) for _ in range(args.repeat)]
+
+    modules, total, wall = min(runs, key=lambda run: run[1])
+
+    print(f"convert: imports {total / 1000:.1f}ms, whole run {wall * 1000:.1f}ms (budget {args.budget_ms:.1f}ms)")
+    for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {name}: {cumulative / 1000:.1f}ms")
+
+    failed: bool = False
+    loaded: List[str] = [name for name in HEAVY_MODULES if name in modules]
+    if loaded:
+        print(f"FAIL: heavy modules are imported on the convert path: {', '.join(loaded)}")
+        failed = True
+
+    if total / 1000 > args.budget_ms:
+        print(f"FAIL: imports took {total / 1000:.1f}ms, which is over the budget of {args.budget_ms:.1f}ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,57 @@
+"""
+Wall time of convert_answer (entity-to-token assignment with resolve_overlaps and assign_tags)
+vs. previous version (single cursor over the entities) on a big answer, plus the overlap policies
+on the same answer with a nested entity over every entity.
+Run from the root of the repo: python -m bench.bench_iob [sentences]
+"""
+import sys
+import time
+from typing import Callable, List
+
+from bench.legacy import legacy_convert_answer
+from bench.synthetic import make_document
+from bin.convert_vulyk2iob import convert_answer
+from vulyk_ner.brat import convert_bsf_2_vulyk
+
+
+def measure(func: Callable[[], object], repeat: int = 3) -> float:
+    """
+    Returns best wall time of the runs in seconds
+    """
+    timings: List[float] = []
+
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    return min(timings)
+
+
+if __name__ == "__main__":
+    sentences: int = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    doc, markup = make_document(sentences)
+    answer: dict = convert_bsf_2_vulyk(doc, markup, compensate_for_offsets=False)
+    print(f"Answer: {len(answer['token_offsets'])} tokens, {len(answer['entities'])} entities")
+
+    for overlap in ["first", "longest", "layers"]:
+        assert convert_answer(answer, overlap) == legacy_convert_answer(answer), (
+            f"Output with {overlap} policy differs from the reference implementation"
+        )
+
+    t_old: float = measure(lambda: legacy_convert_answer(answer), repeat=7)
+    t_new: float = measure(lambda: convert_answer(answer), repeat=7)
+    print(f"Non-overlapping entities: {t_old:.3f}s (legacy) vs {t_new:.3f}s (first)")
+
+    # Every entity gets a nested one of a different type and a wider one that covers the next token too
+    nested: dict = dict(answer)
+    nested["entities"] = answer["entities"] + [
+        [f"{ent[0]}n", "PERS", [[ent[2][0][0] + 1, ent[2][0][1]]]] for ent in answer["entities"]
+    ] + [
+        [f"{ent[0]}w", "LOC", [[ent[2][0][0], ent[2][0][1] + 3]]] for ent in answer["entities"]
+    ]
+
+    for overlap in ["first", "longest", "layers"]:
+        elapsed: float = measure(lambda: convert_answer(nested, overlap))
+        print(f"{len(nested['entities'])} overlapping entities, {overlap}: {elapsed:.3f}s")
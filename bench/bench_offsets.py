@@ -0,0 +1,26 @@
+"""
+Offset compensation of convert_bsf_2_vulyk (compensate_for_offsets=True) vs. previous quadratic version.
+Run from the root of the repo: python -m bench.bench_offsets
+"""
+import timeit
+
+from bench.legacy import legacy_convert_bsf_2_vulyk
+from bench.synthetic import make_document
+from vulyk_ner.brat import convert_bsf_2_vulyk
+
+
+if __name__ == "__main__":
+    for sentences in [100, 500, 1500]:
+        doc, markup = make_document(sentences)
+
+        new = convert_bsf_2_vulyk(doc, markup, compensate_for_offsets=True)
+        old = legacy_convert_bsf_2_vulyk(doc, markup, compensate_for_offsets=True)
+        assert new["entities"] == old["entities"], "Entities differ from the reference implementation"
+
+        t_new: float = min(timeit.repeat(lambda: convert_bsf_2_vulyk(doc, markup, True), number=1, repeat=3))
+        t_old: float = min(timeit.repeat(lambda: legacy_convert_bsf_2_vulyk(doc, markup, True), number=1, repeat=3))
+
+        print(
+            f"{sentences} sentences, {len(new['entities'])} entities: "
+            f"legacy {t_old:.3f}s, current {t_new:.3f}s, speedup x{t_old / t_new:.1f}"
+        )
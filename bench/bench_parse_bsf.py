@@ -0,0 +1,34 @@
+"""
+Line-oriented parse_bsf vs. previous regex with lookahead on big .ann files.
+Run from the root of the repo: python -m bench.bench_parse_bsf
+"""
+import timeit
+
+from bench.legacy import legacy_parse_bsf
+from bench.synthetic import make_document
+from vulyk_ner.brat import parse_bsf
+
+
+def long_entities(count: int) -> str:
+    """
+    Markup with long entities (like titles of laws), where the lookahead of the legacy regex is retried on every character
+    """
+    text: str = "Про тих багатих людей, що вступають із світових розкошей " * 5
+
+    return "\n".join(f"T{i}\tMISC {i * 300} {i * 300 + len(text)}\t{text}" for i in range(1, count + 1))
+
+
+if __name__ == "__main__":
+    for markup in [make_document(2500)[1], make_document(25000)[1], long_entities(10000), long_entities(100000)]:
+
+        new = parse_bsf(markup)
+        old = legacy_parse_bsf(markup)
+        assert [e[:5] for e in new] == [e[:5] for e in old], "Entities differ from the reference implementation"
+
+        t_new: float = min(timeit.repeat(lambda: parse_bsf(markup), number=1, repeat=3))
+        t_old: float = min(timeit.repeat(lambda: legacy_parse_bsf(markup), number=1, repeat=3))
+
+        print(
+            f"{len(new)} entities, {len(markup.encode('utf-8')) / 1024 / 1024:.1f} MB: "
+            f"legacy {t_old:.3f}s, current {t_new:.3f}s, speedup x{t_old / t_new:.1f}"
+        )
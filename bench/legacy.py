@@ -0,0 +1,159 @@
+"""
+Reference implementations of the converter as they were before optimizations.
+Used by benchmarks to measure the speedup and to make sure that the output stays the same
+"""
+import re
+import time
+from typing import Any, List, Tuple
+
+from vulyk_ner.brat import BsfInfo
+from vulyk_ner.text import reconstruct_tokenized
+
+
+def legacy_parse_bsf(bsf_data: str) -> List[BsfInfo]:
+    data = bsf_data.strip()
+    if not data:
+        return []
+    ln_ptrn = re.compile(r"(T\d+)\s(\w+)\s(\d+)\s(\d+)\s(.+?)(?=T\d+\s\w+\s\d+\s\d+|$)", flags=re.DOTALL)
+    result: list = []
+    for m in ln_ptrn.finditer(data):
+        bsf = BsfInfo(m.group(1), m.group(2), int(m.group(3)), int(m.group(4)), m.group(5).strip())
+        result.append(bsf)
+    return result
+
+
+def legacy_convert_bsf_2_vulyk(
+    tokenized_text: List[List[str]], bsf_markup: str, compensate_for_offsets: bool = False
+) -> dict:
+    bsf: List[BsfInfo] = legacy_parse_bsf(bsf_markup)
+    ents: List[List[Any]] = [[e.id, e.tag, [(e.start_idx, e.end_idx)]] for e in bsf]
+
+    idx: int = 0
+    t_idx: int = 0
+    s_offsets: List[Tuple[int, int]] = []
+    t_offsets: List[Tuple[int, int]] = []
+    text: str = ""
+    s: str = ""
+    prev_displacement: int = 0
+
+    displacements: List[Tuple[int, int]] = []
+
+    if compensate_for_offsets:
+        for w in reconstruct_tokenized(tokenized_text):
+            if w.orig_pos[0] > w.new_pos[0]:
+                if w.orig_pos[0] - w.new_pos[0] > prev_displacement:
+                    displacements.append((w.orig_pos[0], w.orig_pos[0] - w.new_pos[0] - prev_displacement))
+                    prev_displacement = w.orig_pos[0] - w.new_pos[0]
+
+            if w.token == "\n":
+                if s:
+                    s_offsets.append((idx, idx + len(s)))
+
+                idx += len(s) + 1
+                s = ""
+            else:
+                s += w.token
+
+            text += w.token
+
+            if w.token not in [" ", "\n"]:
+                t_offsets.append((t_idx, t_idx + len(w.token)))
+
+            t_idx += len(w.token)
+
+        if s:
+            s_offsets.append((idx, idx + len(s)))
+
+        for ent in ents:
+            offset: int = 0
+            offset2: int = 0
+            for disp in displacements:
+                if ent[2][0][0] >= disp[0]:
+                    offset += disp[1]
+
+                if ent[2][0][1] >= disp[0]:
+                    offset2 += disp[1]
+
+            ent[2][0] = (ent[2][0][0] - offset, ent[2][0][1] - offset2)
+    else:
+        for sentence in tokenized_text:
+            s = ""
+            t_idx = len(text)
+            for token in sentence:
+                if token.strip():
+                    t_offsets.append((t_idx, t_idx + len(token)))
+                t_idx += len(token) + 1
+
+            s = " ".join(sentence)
+
+            if s:
+                s_offsets.append((len(text), len(text) + len(s)))
+
+            text += s + "\n"
+
+        text = text.rstrip()
+
+    ts: int = int(time.time())
+    return {
+        "text": text,
+        "sentence_offsets": s_offsets,
+        "token_offsets": t_offsets,
+        "entities": ents,
+        "ctime": ts,
+        "mtime": ts,
+    }
+
+
+def legacy_convert_answer(task_record: dict) -> str:
+
+    text: str = task_record["text"]
+
+    # Sorting just to make sure that we are fine
+    sentences_off: List[List[int]] = sorted(task_record["sentence_offsets"], key=lambda x: x[0])
+    tokens_off: List[List[int]] = sorted(task_record["token_offsets"], key=lambda x: x[0])
+    entities: List[tuple[str, int, int]] = []
+
+    # Rearranging entities a bit
+    # Treating fragmented entities as separate for now
+    for ent in task_record["entities"]:
+        for subent in ent[2]:
+            entities.append((ent[1], subent[0], subent[1]))
+
+    entities = sorted(entities, key=lambda x: x[1])
+
+    current_sent: int = 0
+    prev_position: int = 0
+    current_entity: int = 0
+    result: List[str] = []
+
+    for token in tokens_off:
+        # First add things in between tokens
+        if token[0] > prev_position + 1:
+            result.append(text[prev_position : token[0]] + " O")
+
+        # Validate boundaries of sentences
+        if token[0] > sentences_off[current_sent][1]:
+            current_sent += 1
+            result.append("")
+
+        tag: str = " O"
+        if current_entity < len(entities):
+            if entities[current_entity][2] > token[0] >= entities[current_entity][1]:
+                if token[0] == entities[current_entity][1]:
+                    tag = f" B-{entities[current_entity][0]}"
+                else:
+                    tag = f" I-{entities[current_entity][0]}"
+
+            if token[1] >= entities[current_entity][2]:
+                current_entity += 1
+
+        # Adding the token itself
+        result.append(text[token[0] : token[1]] + tag)
+
+        prev_position = token[1]
+
+    # Leftovers
+    if text[prev_position:]:
+        result.append(text[prev_position:] + " O")
+
+    return "\n".join(result)
@@ -0,0 +1,42 @@
+"""
+Synthetic documents for benchmarks
+"""
+import random
+from typing import List, Tuple
+
+WORDS: List[str] = ["розпорядження", "землями", "в", "межах", "визначених", "законом", "громади", "рада", "суд"]
+PUNCTUATION: List[str] = [",", ".", ":", "!", "?"]
+
+
+def make_document(sentences: int, sentence_len: int = 20, seed: int = 42) -> Tuple[List[List[str]], str]:
+    """
+    Generate whitespace tokenized document with a lot of punctuation (each punctuation mark
+    causes a displacement on realignment) and a brat markup with an entity on every fourth word
+    """
+    rnd: random.Random = random.Random(seed)
+
+    doc: List[List[str]] = []
+    markup: List[str] = []
+    pos: int = 0
+
+    for _ in range(sentences):
+        sentence: List[str] = []
+        for w_idx in range(sentence_len):
+            if w_idx > 0 and rnd.random() < 0.2:
+                token = rnd.choice(PUNCTUATION)
+            else:
+                token = rnd.choice(WORDS).capitalize()
+
+            if w_idx > 0:
+                pos += 1
+
+            if token not in PUNCTUATION and w_idx % 4 == 0:
+                markup.append(f"T{len(markup) + 1}\tORG {pos} {pos + len(token)}\t{token}")
+
+            sentence.append(token)
+            pos += len(token)
+
+        doc.append(sentence)
+        pos += 1
+
+    return doc, "\n".join(markup)
@@ -0,0 +1,172 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import pathlib
+import sys
+from typing import Dict, Iterator, List
+
+# Allows to run the script from the checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vulyk_ner.agreement import AGREEMENT_RULES, LabelMatrix, TaskAnswers  # noqa: E402
+from vulyk_ner.agreement import adjudicate, agreement, build_matrix, gold_tags, group_answers  # noqa: E402
+from vulyk_ner.files import open_compressed  # noqa: E402
+from vulyk_ner.iob import IobStreamSink, render_iob  # noqa: E402
+from vulyk_ner.jsonstream import iter_array_items  # noqa: E402
+
+log = logging.getLogger(__name__)
+
+
+def read_answers(jsonl_files: List[str]) -> Iterator[dict]:
+    """
+    Answers from the files exported from vulyk, decoded one by one (see iter_array_items)
+    """
+    for jsonl_file in jsonl_files:
+        with open_compressed(jsonl_file) as fp:
+            for _, raw in iter_array_items(fp):
+                yield json.loads(raw)
+
+
+def compare_answers(
+    jsonl_files: List[str],
+    output_dir: pathlib.Path,
+    rule: str = "unanimous",
+    min_annotators: int = 2,
+    overlap: str = "first",
+    compression: str = "",
+) -> dict:
+    """
+    Group the answers of the batch by task, measure the agreement between the annotators and write
+    the tasks they agree on to the gold IOB stream output_dir/gold.iob (see IobStreamSink, tasks are stored
+    under `gold` user) and the rest to the review queue output_dir/review.jsonlines, with the tags
+    of every annotator and the indices of conflicting tokens. Returns the report, which is also
+    stored to output_dir/agreement.json
+    """
+    import numpy as np
+
+    tasks: Dict[str, TaskAnswers] = group_answers(read_answers(jsonl_files), overlap=overlap)
+    matrix: LabelMatrix = build_matrix(tasks.values(), min_annotators=min_annotators)
+    log.info(f"{len(matrix.tasks)} of {len(tasks)} tasks have at least {min_annotators} answers")
+
+    winner, settled = adjudicate(matrix, rule)
+    conflicts: np.ndarray = np.bincount(matrix.task[~settled], minlength=len(matrix.tasks))
+    tags: List[str] = gold_tags(matrix, winner)
+
+    report: dict = {
+        "tasks": len(tasks),
+        "compared": len(matrix.tasks),
+        "gold": int((conflicts == 0).sum()),
+        "review": int((conflicts > 0).sum()),
+    }
+    report.update(agreement(matrix))
+
+    pos: int = 0
+    with IobStreamSink(output_dir, "gold", compression) as sink, open(
+        output_dir / "review.jsonlines", "w", encoding="utf-8"
+    ) as review:
+        for task, users, task_conflicts in zip(matrix.tasks, matrix.users, conflicts):
+            end: int = pos + len(task.tokens_off)
+
+            if task_conflicts:
+                review.write(
+                    json.dumps(
+                        {
+                            "task_id": task.task_id,
+                            "text": task.text,
+                            "token_offsets": task.tokens_off,
+                            "tags": {user: task.tags[user] for user in users},
+                            "conflicts": np.flatnonzero(~settled[pos:end]).tolist(),
+                        },
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+            else:
+                sink.write("gold", task.task_id, render_iob(task.text, task.sentences_off, task.tokens_off, tags[pos:end]))
+
+            pos = end
+
+    with open(output_dir / "agreement.json", "w", encoding="utf-8") as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=4)
+
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Measure inter-annotator agreement on the answers exported from vulyk (Cohen's kappa "
+        "and span F1 per entity type), write the tasks the annotators agree on to the gold IOB stream "
+        "`output_dir/gold.iob` and the conflicting ones to the review queue `output_dir/review.jsonlines`. "
+        "Requires numpy"
+    )
+
+    parser.add_argument(
+        "jsonl_files",
+        help="File mask to collect jsonlines files to process. Files compressed with gz, bz2, xz or zst are supported",
+    )
+    parser.add_argument("output_dir", help="Directory to store gold file, review queue and report", type=pathlib.Path)
+
+    parser.add_argument(
+        "--rule",
+        default="unanimous",
+        choices=AGREEMENT_RULES,
+        help="Task goes to the gold file when all the annotators agree on every token of it, "
+        "or when more than half of them agree on every token (with two annotators per task it's the same)",
+    )
+
+    parser.add_argument(
+        "--min_annotators",
+        default=2,
+        type=int,
+        help="Tasks with less answers are left out",
+    )
+
+    parser.add_argument(
+        "--overlap",
+        default="first",
+        choices=("first", "longest"),
+        help="What to do with overlapping or nested entities in the answers, see convert_vulyk2iob.py. "
+        "`layers` is not supported: agreement is measured on a single tag per token",
+    )
+
+    parser.add_argument(
+        "--compression",
+        default="",
+        choices=("", ".gz", ".bz2", ".xz", ".zst"),
+        help="Compress the gold stream",
+    )
+
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        help="Print more logs (info)",
+        action="store_const",
+        dest="loglevel",
+        const=logging.INFO,
+        default=logging.WARNING,
+    )
+
+    args: argparse.Namespace = parser.parse_args()
+    assert args.output_dir.is_dir(), f"{args.output_dir} is not a directory"
+
+    log.setLevel(args.loglevel)
+    logging.getLogger("vulyk_ner").setLevel(args.loglevel)
+
+    print(
+        json.dumps(
+            compare_answers(
+                sorted(glob.glob(args.jsonl_files)),
+                args.output_dir,
+                rule=args.rule,
+                min_annotators=args.min_annotators,
+                overlap=args.overlap,
+                compression=args.compression,
+            ),
+            ensure_ascii=False,
+            indent=4,
+        )
+    )
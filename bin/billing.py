@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 import re
-from codecs import open
 from collections import Counter
 import json
+import os
 import sys
 
+# Allows to run the script from the checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vulyk_ner.files import open_compressed  # noqa: E402
+
 if __name__ == '__main__':
     if len(sys.argv) < 3:
         exit("Not enough arguments")
 
     counts = Counter()
     price = int(sys.argv[2]) / 100.
-    with open(sys.argv[1], "r", encoding="utf-8") as f_in:
+    with open_compressed(sys.argv[1]) as f_in:
         for l in f_in:
             for answer in json.loads(l):
 
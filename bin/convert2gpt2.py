@@ -1,8 +1,12 @@
 import sys
 from typing import List
 import argparse
+import os
 
-from convert2vulyk import reconstruct_tokenized
+# Allows to run the script from the checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vulyk_ner.text import align_tokenized  # noqa: E402
 
 
 def convert_sentence(sentence: List[str], prefix_text: str = "речення: ", no_tags_text: str = "Ніц нема") -> str:
@@ -18,7 +22,7 @@ def convert_sentence(sentence: List[str], prefix_text: str = "речення: ",
 
         if tag == "O" or tag.startswith("B-"):
             if ner_token_accum:
-                ner_tokens.append(f"{ner_token_type}: {''.join(map(str, reconstruct_tokenized([ner_token_accum])))}")
+                ner_tokens.append(f"{ner_token_type}: {align_tokenized([ner_token_accum])[0]}")
                 ner_token_accum = []
 
         if tag.startswith("B-"):
@@ -28,7 +32,7 @@ def convert_sentence(sentence: List[str], prefix_text: str = "речення: ",
         if tag.startswith("I-"):
             ner_token_accum.append(w)
 
-    final_sentence: str = "".join(map(str, reconstruct_tokenized([tokens])))
+    final_sentence: str = align_tokenized([tokens])[0]
     if ner_tokens:
         return prefix_text + final_sentence + "\n" + '\n'.join(ner_tokens)
     else:
@@ -57,8 +61,8 @@ def convert_sentence_inline(sentence: List[str], prefix_text: str = "речен
         ner_tokens.append(w)
         ner_tokens.append("/" + mapping[tag])
 
-    final_sentence: str = "".join(map(str, reconstruct_tokenized([tokens])))
-    final_tagged_sentence: str = "".join(map(str, reconstruct_tokenized([ner_tokens])))
+    final_sentence: str = align_tokenized([tokens])[0]
+    final_tagged_sentence: str = align_tokenized([ner_tokens])[0]
     return prefix_text + final_sentence + "\n" + annotation + final_tagged_sentence
 
 
@@ -1,381 +1,373 @@
 #!env python
 
 import argparse
-import json
 import logging
-import re
-import time
-import glob
+import os
 import pathlib
-from typing import Any, Generator, List, Tuple
-from collections import namedtuple
-from enum import Enum
+import sys
+from collections import deque
+from contextlib import nullcontext
+from functools import partial
 from itertools import chain
+from typing import TYPE_CHECKING, Deque, Iterator, List, Optional, Tuple, Union
 
-from tokenize_uk import tokenize_text  # type: ignore
-
-log = logging.getLogger(__name__)
-
-BsfInfo = namedtuple("BsfInfo", "id, tag, start_idx, end_idx, token")
+# Allows to run the script from the checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from vulyk_ner.archives import ArchiveDocument, iter_inputs  # noqa: E402
+from vulyk_ner.brat import convert_bsf_2_vulyk, split_document  # noqa: E402
+from vulyk_ner.files import JsonlinesSink, Manifest, annotation_candidates, find_annotation  # noqa: E402
+from vulyk_ner.files import parse_shard, read_text  # noqa: E402
+from vulyk_ner.metrics import Metrics, profiled  # noqa: E402
+from vulyk_ner.parallel import ordered_map  # noqa: E402
+from vulyk_ner.text import TokenizationType, read_and_tokenize  # noqa: E402
 
-class AlignedToken(namedtuple("AlignedToken", ("token", "orig_pos", "new_pos"))):
-    """
-    As we do changing the whitespaces in tokenized text according to the punctuation rules,
-    we need a class to maintain the positions of whitespace tokenized vs. normalized one
-    """
-
-    __slots__: tuple = ()
-
-    def __str__(self) -> str:
-        return str(self.token)
+if TYPE_CHECKING:
+    from vulyk_ner.prefilter import SentenceFilter
 
+log = logging.getLogger(__name__)
 
-class TokenizationType(Enum):
-    """
-    Tokenization type
-    """
-    NOOP = 1
-    WHITESPACE = 2
-    TOKENIZE_UK = 3
 
+def sink_from_args(args: argparse.Namespace) -> JsonlinesSink:
+    return JsonlinesSink(args.output, shard_docs=args.shard_docs, shard_bytes=args.shard_bytes)
 
-class AbstractNER:
-    """
-    Abstract class for NER
-    """
-    def __init__(self, model: str) -> None:
-        raise NotImplementedError()
 
-    def tag_text(self, txt: str) -> str:
-        """
-        Tag text with NER model and return brat format
-        """
-        raise NotImplementedError()
+def metrics_from_args(args: argparse.Namespace) -> Metrics:
+    return Metrics(args.metrics_json, every=args.metrics_every)
 
 
-class StanzaNER(AbstractNER):
+def convert_file(
+    text: Union[pathlib.Path, ArchiveDocument],
+    fmt: str,
+    ignore_annotations: bool,
+    ann_autodiscovery: str,
+    realign_tokens: bool,
+    metrics: Optional[Metrics] = None,
+) -> dict:
     """
-    NER using Stanza library
+    Read a single text file (and annotations alongside to it) and convert it into the vulyk object.
+    Documents from the archives come with the text and annotations already read.
+    Time spent in reading, tokenization and conversion is added to metrics, if given
     """
-    def __init__(self, model: str) -> None:
-        import stanza  # type: ignore
-
-        logging.getLogger("stanza").setLevel(log.level)
-        stanza.download(model)
-
-        self.ner = stanza.Pipeline(lang=model, processors="tokenize,mwt,ner", tokenize_pretokenized="true")
-
-    def tag_text(self, txt: str) -> str:
-        """
-        Tag with stanza model and convert Stanza NER output to brat format
-        """
-        doc = self.ner(txt)
-
-        brat_str: str = ""
-
-        for tok_i, ent in enumerate(doc.ents):
-            brat_str += f"T{tok_i + 1}\t{ent.type} {ent.start_char} {ent.end_char}\t{ent.text}\n"
-
-        return brat_str
+    metrics = metrics or Metrics()
+    markup: Optional[str] = ""
 
+    if isinstance(text, ArchiveDocument):
+        log.info(f"Found text file {text.source}, parsing it")
+        content: str = text.text
 
-class SpacyNER(AbstractNER):
-    """
-    NER using Spacy library
-    """
-    def __init__(self, model: str) -> None:
-        import spacy
-
-        self.ner = spacy.load(model)
+        if not ignore_annotations:
+            markup = text.ann
+            if markup is None:
+                expected: pathlib.PurePath = annotation_candidates(pathlib.PurePath(text.name), ann_autodiscovery)[0]
+                log.warning(
+                    f"Cannot find annotation {'member' if text.archive else 'file'} {expected} (or compressed one) "
+                    f"alongside to text file {text.source}, skipping"
+                )
+    else:
+        log.info(f"Found text file {text}, parsing it")
+        with metrics.stage("read"):
+            content = read_text(text)
 
-    def tag_text(self, txt: str) -> str:
-        """
-        Tag with spacy model and convert Spacy NER output to brat format
-        """
-        doc = self.ner(txt)
+        if not ignore_annotations:
+            ann: Optional[pathlib.Path] = find_annotation(text, ann_autodiscovery)
 
-        brat_str: str = ""
+            if ann is None:
+                log.warning(
+                    f"Cannot find annotation file {annotation_candidates(text, ann_autodiscovery)[0]} (or compressed one) "
+                    f"alongside to text file {text}, skipping"
+                )
+            else:
+                with metrics.stage("read"):
+                    markup = read_text(ann)
 
-        if doc.ents:
-            for tok_i, ent in enumerate(doc.ents):
-                brat_str += f"T{tok_i + 1}\t{ent.label_} {ent.start_char} {ent.end_char}\t{ent.text}\n"
+    with metrics.stage("tokenize"):
+        tokenized: List[List[str]] = read_and_tokenize(
+            content, fmt, TokenizationType.NOOP if fmt == "json" else TokenizationType.WHITESPACE
+        )
 
-        return brat_str
+    with metrics.stage("convert"):
+        return convert_bsf_2_vulyk(tokenized, markup or "", compensate_for_offsets=realign_tokens)
 
 
-def parse_bsf(bsf_data: str) -> List[BsfInfo]:
+def write_document(
+    out: JsonlinesSink, vulyk_obj: dict, source: Union[str, pathlib.Path], max_sentences: int, max_chars: int
+) -> None:
     """
-    Convert multiline textual bsf representation to a list of named entities.
-
-    :param bsf_data: data in the format 'T9 PERS 778 783    токен'. Can be multiple lines.
-    :return: list of named tuples for each line of the data representing a single named entity token
+    Write vulyk object to the output, splitting it into chunks if max_sentences or max_chars is set
     """
-
-    data = bsf_data.strip()
-    if not data:
-        return []
-    #                     Token_id Entity start  end    text within range
-    #                        \/      \/     \/    \/      \/
-    ln_ptrn = re.compile(r"(T\d+)\s(\w+)\s(\d+)\s(\d+)\s(.+?)(?=T\d+\s\w+\s\d+\s\d+|$)", flags=re.DOTALL)
-    result: list = []
-    for m in ln_ptrn.finditer(data):
-        bsf = BsfInfo(m.group(1), m.group(2), int(m.group(3)), int(m.group(4)), m.group(5).strip())
-        result.append(bsf)
-    return result
-
-
-def simple_tokenizer(text: str) -> List[List[str]]:
+    if max_sentences > 0 or max_chars > 0:
+        for chunk in split_document(vulyk_obj, str(source), max_sentences=max_sentences, max_chars=max_chars):
+            out.write(chunk)
+    else:
+        out.write(vulyk_obj)
+
+
+def convert(
+    input_files: str,
+    fmt: str,
+    ignore_annotations: bool,
+    ann_autodiscovery: str,
+    realign_tokens: bool,
+    workers: int = 1,
+    reorder_window: int = 0,
+    sink: Optional[JsonlinesSink] = None,
+    manifest: str = "",
+    max_sentences: int = 0,
+    max_chars: int = 0,
+    shard: Optional[Tuple[int, int]] = None,
+    metrics: Optional[Metrics] = None,
+) -> None:
     """
-    Given whitespace/newline tokenized text, return the
-    list of sentences (where each sentence is made of tokens)
-    using whitespaces and newlines
+    realign_tokens=True means to apply the typography rules to the tokenized input and move NER tokens accordingly
+    i.e remove spaces before periods and commas, etc.
+    workers > 1 spreads the files over the pool of processes, the order of the output is preserved
+    Converted documents are written to the sink (stdout by default)
+    With manifest, files that were already converted with the same settings are skipped
+    With max_sentences/max_chars, long documents are split into several tasks (see split_document)
+    With shard (i, N), only the files of i-th shard out of N are converted (see in_shard)
+    Input given as archive.tar.gz:pattern is read from the archive, annotations are looked for among its members
+    Time spent in the stages and the throughput are collected to metrics, if given (see Metrics)
     """
+    metrics = metrics or Metrics()
+
+    func = partial(
+        convert_file,
+        fmt=fmt,
+        ignore_annotations=ignore_annotations,
+        ann_autodiscovery=ann_autodiscovery,
+        realign_tokens=realign_tokens,
+        # Stages that run in the workers are not seen by the metrics of the main process
+        metrics=metrics if workers <= 1 else None,
+    )
 
-    doc: List[List[str]] = []
-    if text:
-        for s in text.split("\n"):
-            doc.append(s.split(" "))
-
-    return doc
-
-
-def read_and_tokenize(text: str, fmt: str, tokenizer: TokenizationType) -> List[List[str]]:
-    if fmt == "json":
-        assert tokenizer == TokenizationType.NOOP, "Json is meant to be already tokenized"
-        return json.loads(text)
-    else:
-        assert tokenizer != TokenizationType.NOOP, "You cannot keep texts not-tokenized"
-        if tokenizer == TokenizationType.WHITESPACE:
-            return simple_tokenizer(text)
-        elif tokenizer == TokenizationType.TOKENIZE_UK:
-            return list(chain(*tokenize_text(text)))
+    settings: dict = {
+        "cmd": "convert",
+        "format": fmt,
+        "ignore_annotations": ignore_annotations,
+        "ann_autodiscovery": ann_autodiscovery,
+        "realign_tokens": realign_tokens,
+        "max_sentences": max_sentences,
+        "max_chars": max_chars,
+    }
 
-    return []  # Calm down, mypy
+    with sink or JsonlinesSink() as out, Manifest(manifest, settings) as done:
+        # Files that are sent to the conversion and their digests, in the same order as the results will come
+        pending: Deque[Tuple[Union[str, pathlib.Path], str]] = deque()
 
+        def to_convert() -> Iterator[Union[pathlib.Path, ArchiveDocument]]:
+            texts: Iterator[Union[pathlib.Path, ArchiveDocument]] = iter_inputs(
+                input_files, None if ignore_annotations else ann_autodiscovery, shard=shard
+            )
 
-def reconstruct_tokenized(tokenized_text: List[List[str]]) -> Generator[AlignedToken, None, None]:
-    """
-    Accepts tokenized text [["sent1_word1", "sent1_word2"], ["sent2_word2"]]
-    and normalizes spaces in the text according to the punctuation.
-    Returns an iterator over AlignedToken, where each token has the information
-    on the original position and updated position
-    """
-    SPACES_BEFORE: str = "([“«"
-    NO_SPACE_BEFORE: str = ".,:!?)]”»"
+            for text in metrics.timed("read", texts):
+                source: Union[str, pathlib.Path] = text.source if isinstance(text, ArchiveDocument) else text
 
-    orig_pos: int = 0
-    adj_pos: int = 0
+                if done.enabled and not isinstance(text, ArchiveDocument):
+                    # Files are read once, both for the digest and for the conversion, so they are read here
+                    # rather than in the workers
+                    with metrics.stage("read"):
+                        ann: Optional[pathlib.Path] = (
+                            None if ignore_annotations else find_annotation(text, ann_autodiscovery)
+                        )
+                        text = ArchiveDocument("", str(text), read_text(text), read_text(ann) if ann else None)
 
-    for s_idx, s in enumerate(tokenized_text):
-        if s_idx > 0:
-            yield AlignedToken("\n", (orig_pos, orig_pos + 1), (adj_pos, adj_pos + 1))
-            orig_pos += 1
-            adj_pos += 1
+                with metrics.stage("digest") if done.enabled else nullcontext():
+                    digest: str = done.text_digest(text.text, text.ann) if isinstance(text, ArchiveDocument) else ""
 
-        prev_token: str = ""
-        for w_idx, w in enumerate(s):
-            w_stripped = w.strip()
+                if not done.is_done(source, digest):
+                    pending.append((source, digest))
+                    yield text
 
-            if not w_stripped:
-                # If original text contained a space(-es), let's adjust original position for it
-                # + one space after
-                orig_pos += len(w)
-                if w_idx > 0:
-                    orig_pos += 1
+        results: Iterator[dict] = ordered_map(func, to_convert(), workers=workers, window=reorder_window)
+        if workers > 1:
+            # Inputs are read while waiting for the results, that time is already in the stages of its own
+            results = metrics.timed("workers", results, exclude=("read", "digest"))
 
-                continue
+        for vulyk_obj in results:
+            source, digest = pending.popleft()
 
-            if w_idx > 0:
-                if w_stripped not in NO_SPACE_BEFORE and not prev_token in SPACES_BEFORE:
-                    yield AlignedToken(" ", (orig_pos, orig_pos + 1), (adj_pos, adj_pos + 1))
-                    orig_pos += 1
-                    adj_pos += 1
-                else:
-                    # If we are omitting the space (for example, before comma), we
-                    # adjusting original position as if it's there
-                    orig_pos += 1
+            with metrics.stage("write"):
+                write_document(out, vulyk_obj, source, max_sentences, max_chars)
+                done.record(out, source, digest)
 
-            yield AlignedToken(w_stripped, (orig_pos, orig_pos + len(w)), (adj_pos, adj_pos + len(w_stripped)))
+            metrics.count(documents=1, tokens=len(vulyk_obj["token_offsets"]))
 
-            orig_pos += len(w)
-            adj_pos += len(w_stripped)
 
-            prev_token = w_stripped
+def convert_command(args: argparse.Namespace) -> None:
+    with metrics_from_args(args) as metrics, profiled(args.profile):
+        return convert(
+            input_files=args.input_files,
+            fmt=args.format,
+            ignore_annotations=args.ignore_annotations,
+            ann_autodiscovery=args.ann_autodiscovery,
+            realign_tokens=args.realign_tokens,
+            workers=args.workers,
+            reorder_window=args.reorder_window,
+            sink=sink_from_args(args),
+            manifest=args.manifest,
+            max_sentences=args.max_sentences,
+            max_chars=args.max_chars,
+            shard=args.shard,
+            metrics=metrics,
+        )
 
 
-def convert_bsf_2_vulyk(tokenized_text: List[List[str]], bsf_markup: str, compensate_for_offsets: bool = False) -> dict:
+def tag(
+    input_files: str,
+    fmt: str,
+    ner_framework: str,
+    ner_model: str,
+    batch_size: int = 32,
+    max_batch_chars: int = 0,
+    server: str = "",
+    model_dir: Optional[str] = None,
+    window_sentences: int = 0,
+    window_overlap: int = 1,
+    sink: Optional[JsonlinesSink] = None,
+    manifest: str = "",
+    cache: str = "",
+    cache_size: int = 1 << 30,
+    max_sentences: int = 0,
+    max_chars: int = 0,
+    sentence_filter: Optional["SentenceFilter"] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    metrics: Optional[Metrics] = None,
+) -> None:
     """
-    Given tokenized text and named entities in Brat standoff format, generate object
-    in the format compatible with Vulyk markup tool.
-    :param text: tokenized text
-    :param bsf_markup: named entities in Brat standoff format
-    :param compensate_for_offsets: when converting already tokenized text from txt/ann pair, this will
-    displace NER tokens according to the changes made to the punctuation/whitespaces
-    :return: dict that can be directly converted to Vulyk json file
+    Tag the files with NER model. Documents are sent to the model in batches of batch_size documents
+    (and max_batch_chars characters, if set).
+    When server url is given, model is not loaded and batches are sent to the tagging server instead
+    With window_sentences, spacy model tags the documents by windows of sentences (see SpacyNER)
+    Tagged documents are written to the sink (stdout by default)
+    With manifest, files that were already tagged by the same model are skipped
+    With cache, results of the model are stored in the sqlite database and reused for the same texts
+    With max_sentences/max_chars, long documents are split into several tasks (see split_document)
+    With sentence_filter, only the sentences that pass it are sent to the model (see PrefilteredNER)
+    With shard (i, N), only the files of i-th shard out of N are tagged (see in_shard)
+    Input given as archive.tar.gz:pattern is read from the archive
+    Time spent in the stages and the throughput are collected to metrics, if given (see Metrics)
     """
+    # NER frameworks, sqlite and http client are only needed for tagging, so the convert command doesn't load them
+    from vulyk_ner.ner import AbstractNER, CachedNER, NERCache, RemoteNER, batched, build_ner
+    from vulyk_ner.prefilter import PrefilteredNER
 
-    bsf: List[BsfInfo] = parse_bsf(bsf_markup)
-    ents: List[List[Any]] = [[e.id, e.tag, [(e.start_idx, e.end_idx)]] for e in bsf]
-
-    idx: int = 0
-    t_idx: int = 0
-    s_offsets: List[Tuple[int, int]] = []
-    t_offsets: List[Tuple[int, int]] = []
-    text: str = ""
-    s: str = ""
-    prev_displacement: int = 0
-
-    displacements: List[Tuple[int, int]] = []
-
-    if compensate_for_offsets:
-        for w in reconstruct_tokenized(tokenized_text):
-            # Here we constructing a displacement map, i.e how we should adjust all the entities
-            # after original tokens were displaced according to space normalization.
-            if w.orig_pos[0] > w.new_pos[0]:
-                if w.orig_pos[0] - w.new_pos[0] > prev_displacement:
-                    displacements.append((w.orig_pos[0], w.orig_pos[0] - w.new_pos[0] - prev_displacement))
-                    prev_displacement = w.orig_pos[0] - w.new_pos[0]
-
-            if w.token == "\n":
-                if s:
-                    s_offsets.append((idx, idx + len(s)))
-
-                idx += len(s) + 1
-                s = ""
-            else:
-                s += w.token
-
-            text += w.token
+    metrics = metrics or Metrics()
 
-            if w.token not in [" ", "\n"]:
-                t_offsets.append((t_idx, t_idx + len(w.token)))
+    if server:
+        remote: RemoteNER = RemoteNER(server)
+        model: AbstractNER = remote
+        settings: dict = {"cmd": "tag", "format": fmt, **remote.info}
+    else:
+        with metrics.stage("load_model"):
+            model = build_ner(
+                ner_framework,
+                ner_model,
+                model_dir=model_dir,
+                window_sentences=window_sentences,
+                window_overlap=window_overlap,
+            )
+        settings = {"cmd": "tag", "format": fmt, "ner_framework": ner_framework, "ner_model": ner_model}
 
-            t_idx += len(w.token)
+        if window_sentences > 0:
+            settings.update({"window_sentences": window_sentences, "window_overlap": window_overlap})
 
-        if s:
-            s_offsets.append((idx, idx + len(s)))
+    settings.update({"max_sentences": max_sentences, "max_chars": max_chars})
 
-        for ent in ents:
-            offset: int = 0
-            offset2: int = 0
-            for disp in displacements:
-                # Here is your problem
-                if ent[2][0][0] >= disp[0]:
-                    offset += disp[1]
+    prefiltered: Optional[PrefilteredNER] = None
+    if sentence_filter is not None:
+        prefiltered = PrefilteredNER(model, sentence_filter)
+        model = prefiltered
+        settings["prefilter"] = sentence_filter.identity
 
-                if ent[2][0][1] >= disp[0]:
-                    offset2 += disp[1]
+    ner_cache: Optional[NERCache] = NERCache(cache, max_bytes=cache_size) if cache else None
+    if ner_cache is not None:
+        model = CachedNER(model, ner_cache)
 
-            ent[2][0] = (ent[2][0][0] - offset, ent[2][0][1] - offset2)
-    else:
-        for sentence in tokenized_text:
-            s = ""
-            t_idx = len(text)
-            for token in sentence:
-                if token.strip():
-                    t_offsets.append((t_idx, t_idx + len(token)))
-                t_idx += len(token) + 1
-
-            s = " ".join(sentence)
-
-            if s:
-                s_offsets.append((len(text), len(text) + len(s)))
-
-            text += s + "\n"
-
-        text = text.rstrip()
-
-    ts: int = int(time.time())
-    vulyk: dict = {
-        "modifications": [],
-        "equivs": [],
-        "protocol": 1,
-        "ctime": ts,
-        "triggers": [],
-        "text": text,
-        "source_files": ["ann", "txt"],
-        "messages": [],
-        "sentence_offsets": s_offsets,
-        "comments": [],
-        "entities": ents,
-        "mtime": ts,
-        "relations": [],
-        "token_offsets": t_offsets,
-        "action": "getDocument",
-        "normalizations": [],
-        "attributes": [],
-        "events": [],
-        "document": "",
-        "collection": "/",
-    }
+    with sink or JsonlinesSink() as out, Manifest(manifest, settings) as done:
 
-    return vulyk
+        def read_documents() -> Iterator[Tuple[Union[str, pathlib.Path], str, List[List[str]]]]:
+            for text in metrics.timed("read", iter_inputs(input_files, shard=shard)):
+                source: Union[str, pathlib.Path] = text.source if isinstance(text, ArchiveDocument) else text
 
+                # File is read once, both for the digest and for tagging
+                with metrics.stage("read"):
+                    content: str = text.text if isinstance(text, ArchiveDocument) else read_text(text)
+                    digest: str = done.text_digest(content)
 
-def convert(input_files: str, fmt: str, ignore_annotations: bool, ann_autodiscovery: str, realign_tokens: bool) -> None:
-    """
-    realign_tokens=True means to apply the typography rules to the tokenized input and move NER tokens accordingly
-    i.e remove spaces before periods and commas, etc.
-    """
-    for text in map(pathlib.Path, glob.glob(input_files)):
-        log.info(f"Found text file {text}, parsing it")
+                if done.is_done(source, digest):
+                    continue
 
-        markup = ""
+                log.info(f"Found text file {source}, tagging it")
 
-        if not ignore_annotations:
-            if ann_autodiscovery == "append":
-                ann = text.with_name(text.name + ".ann")
-            else:
-                ann = text.with_suffix(".ann")
+                with metrics.stage("tokenize"):
+                    tokenized: List[List[str]] = read_and_tokenize(
+                        content, fmt, TokenizationType.NOOP if fmt == "json" else TokenizationType.TOKENIZE_UK
+                    )
 
-            if not ann.exists():
-                log.warning(f"Cannot find annotation file {ann} alongside to text file {text}, skipping")
-            else:
-                markup = ann.read_text()
+                yield source, digest, tokenized
 
-        tokenized: List[List[str]] = read_and_tokenize(
-            text.read_text(), fmt, TokenizationType.NOOP if fmt == "json" else TokenizationType.WHITESPACE
-        )
+        try:
+            for batch in batched(
+                read_documents(), batch_size, max_batch_chars, size=lambda doc: sum(map(len, chain(*doc[2])))
+            ):
+                # Tokens are passed to the model as is, offsets in the markups are bound to the text of vulyk task
+                with metrics.stage("ner"):
+                    markups: List[str] = model.tag_tokenized_batch([tokenized for _, _, tokenized in batch])
 
-        vulyk_obj: dict = convert_bsf_2_vulyk(tokenized, markup, compensate_for_offsets=realign_tokens)
+                for (source, digest, tokenized), markup in zip(batch, markups):
+                    with metrics.stage("convert"):
+                        vulyk_obj = convert_bsf_2_vulyk(tokenized, markup, compensate_for_offsets=False)
 
-        # TODO: this should really return something instead of printing
-        print(json.dumps(vulyk_obj, ensure_ascii=False, sort_keys=True))
+                    with metrics.stage("write"):
+                        write_document(out, vulyk_obj, source, max_sentences, max_chars)
+                        done.record(out, source, digest)
 
+                    metrics.count(documents=1, tokens=sum(map(len, tokenized)))
+        finally:
+            if ner_cache is not None:
+                ner_cache.close()
 
-def convert_command(args: argparse.Namespace) -> None:
-    return convert(
-        input_files=args.input_files,
-        fmt=args.format,
-        ignore_annotations=args.ignore_annotations,
-        ann_autodiscovery=args.ann_autodiscovery,
-        realign_tokens=args.realign_tokens,
-    )
+            if prefiltered is not None:
+                prefiltered.close()
 
 
-def tag(input_files: str, fmt: str, ner_framework: str, ner_model: str) -> None:
-    if ner_framework == "stanza":
-        model: AbstractNER = StanzaNER(ner_model)
-    elif ner_framework == "spacy":
-        model = SpacyNER(ner_model)
+def tag_command(args: argparse.Namespace) -> None:
+    sentence_filter: Optional["SentenceFilter"] = None
 
-    for text in map(pathlib.Path, glob.glob(input_files)):
-        log.info(f"Found text file {text}, tagging it")
+    if args.prefilter:
+        from vulyk_ner.gazetteer import GazetteerNER
+        from vulyk_ner.prefilter import SentenceFilter
 
-        tokenized: List[List[str]] = read_and_tokenize(
-            text.read_text(), fmt, TokenizationType.NOOP if fmt == "json" else TokenizationType.TOKENIZE_UK
+        sentence_filter = SentenceFilter(
+            max_digit_share=args.prefilter_digit_share,
+            gazetteer=GazetteerNER(args.prefilter_gazetteer, model_dir=args.model_dir)
+            if args.prefilter_gazetteer
+            else None,
         )
 
-        markup: str = model.tag_text("".join(map(str, reconstruct_tokenized(tokenized))))
-
-        vulyk_obj = convert_bsf_2_vulyk(tokenized, markup, compensate_for_offsets=False)
-
-        print(json.dumps(vulyk_obj, ensure_ascii=False, sort_keys=True))
-
-
-def tag_command(args: argparse.Namespace) -> None:
-    return tag(args.input_files, args.format, args.ner_framework, args.ner_model)
+    with metrics_from_args(args) as metrics, profiled(args.profile):
+        return tag(
+            args.input_files,
+            args.format,
+            args.ner_framework,
+            args.ner_model,
+            batch_size=args.batch_size,
+            max_batch_chars=args.max_batch_chars,
+            server=args.server,
+            model_dir=args.model_dir,
+            window_sentences=args.window_sentences,
+            window_overlap=args.window_overlap,
+            sink=sink_from_args(args),
+            manifest=args.manifest,
+            cache=args.cache,
+            cache_size=args.cache_size_mb * 1024 * 1024,
+            max_sentences=args.max_sentences,
+            max_chars=args.max_chars,
+            sentence_filter=sentence_filter,
+            shard=args.shard,
+            metrics=metrics,
+        )
 
 
 if __name__ == "__main__":
@@ -383,7 +375,7 @@ if __name__ == "__main__":
 
     parser: argparse.ArgumentParser = argparse.ArgumentParser(
         description="Convert tokenized pre-annotated texts or tag generic texts to jsonlines file supported by Vulyk. \n"
-        "Data files supplied via glob-like cmd line arguments. Output goes directly to stdout. \n"
+        "Data files supplied via glob-like cmd line arguments. Output goes to stdout or to the file(s) set by --output. \n"
         "Script has two modes: convert, to convert texts (with optional annotations) "
         "and tag, to tag provided tokenized texts using one of supported frameworks. "
         "Please check help texts for the respecting commands for details on parameters."
@@ -414,18 +406,31 @@ if __name__ == "__main__":
         "--realign_tokens", default=False, action="store_true", help="Apply the typography rules to the input texts "
         "and align annotated tokens accordingly"
     )
+    convert_parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of processes to convert files in parallel. The order of the output stays the same",
+    )
+    convert_parser.add_argument(
+        "--reorder_window",
+        default=0,
+        type=int,
+        help="How many files might be in flight while waiting for the slow one when --workers > 1 "
+        "(defaults to 4 files per worker)",
+    )
 
     tag_parser: argparse.ArgumentParser = subparsers.add_parser(
         "tag",
         help="Tag given files using one of frameworks/models specified in params. "
-        "Currently the script supports Stanza and Spacy frameworks. To use the script in this mode you should install "
-        "additional packages from extra_requirements.txt. "
+        "Currently the script supports Stanza and Spacy frameworks and the gazetteer (lists of names). "
+        "To use the script in this mode you should install additional packages from extra_requirements.txt. "
         "Make sure that you have enough RAM and some patience",
     )
 
     tag_parser.add_argument(
         "--ner_framework",
-        choices=("stanza", "spacy"),
+        choices=("stanza", "spacy", "gazetteer"),
         default="stanza",
         help="Which framework to use for the tagging",
     )
@@ -435,7 +440,89 @@ if __name__ == "__main__":
         default="uk",
         help="Which model to use. Stanza has pre-built model `uk` for ukrainian language. "
         "For Spacy you might specify pre-built model (you should run `python -m spacy download model_name` first) "
-        "or provide a path to the directory with the model",
+        "or provide a path to the directory with the model. "
+        "For gazetteer, give the file mask of tsv lists with `surface<TAB>TAG` lines, i.e `lists/*.tsv`",
+    )
+
+    tag_parser.add_argument(
+        "--batch_size",
+        default=32,
+        type=int,
+        help="How many documents to send to the model at once",
+    )
+
+    tag_parser.add_argument(
+        "--max_batch_chars",
+        default=200000,
+        type=int,
+        help="Maximum total length of documents in one batch (in characters), 0 means no limit. "
+        "Keeps memory in check when some of the documents are huge",
+    )
+
+    tag_parser.add_argument(
+        "--model_dir",
+        default=None,
+        help="Where to keep downloaded stanza models (stanza default dir is used if not set) "
+        "or compiled gazetteers (next to the lists if not set)",
+    )
+
+    tag_parser.add_argument(
+        "--window_sentences",
+        default=0,
+        type=int,
+        help="Tag long documents with spacy model by windows of that many sentences instead of the whole document "
+        "at once. Keeps peak memory of transformer models low. 0 means no windows",
+    )
+
+    tag_parser.add_argument(
+        "--window_overlap",
+        default=1,
+        type=int,
+        help="How many sentences neighbour windows share. Entities in the shared sentences are taken "
+        "from the window where the sentence has more context around it",
+    )
+
+    tag_parser.add_argument(
+        "--server",
+        default="",
+        help="Url of the tagging server started with bin/tagging_server.py, i.e `http://127.0.0.1:8765`. "
+        "When set, the model is not loaded and --ner_framework/--ner_model are ignored",
+    )
+
+    tag_parser.add_argument(
+        "--cache",
+        default="",
+        help="Path to the sqlite database to cache the results of the model. Texts that were tagged before "
+        "by the same model are taken from the cache. Use -v to see cache hits/misses in the end of the run",
+    )
+
+    tag_parser.add_argument(
+        "--cache_size_mb",
+        default=1024,
+        type=int,
+        help="Maximum size of the cache, least recently used results are evicted when it grows bigger",
+    )
+
+    tag_parser.add_argument(
+        "--prefilter",
+        default=False,
+        action="store_true",
+        help="Do not send to the model the sentences that cannot contain entities: with no letters, "
+        "with no capitalized words or with too many digits. Skip rate and time saved are reported with -v",
+    )
+
+    tag_parser.add_argument(
+        "--prefilter_digit_share",
+        default=0.5,
+        type=float,
+        help="Sentences where digits take more than that share of characters are skipped by --prefilter",
+    )
+
+    tag_parser.add_argument(
+        "--prefilter_gazetteer",
+        default="",
+        help="File mask of tsv lists (same format as for the gazetteer framework). "
+        "Sentences with the names from the lists are never skipped by --prefilter",
     )
 
     tag_parser.set_defaults(func=tag_command)
@@ -448,7 +535,8 @@ if __name__ == "__main__":
         "Use `--format` flag to specify the format [`txt` (default) or `json`]. "
         "For text files tokenize_uk tokenizer will be applied. "
         "For json files, provided tokenization will remain intact, however, "
-        "spaces will be normalized/restored according to the `reconstruct_tokenized` logic",
+        "spaces will be normalized/restored according to the `reconstruct_tokenized` logic. "
+        "Files might be read from the tar or zip archive without extracting it, i.e `corpus.tar.gz:*.txt`",
     )
 
     parser.add_argument(
@@ -460,6 +548,83 @@ if __name__ == "__main__":
         default="txt",
     )
 
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="",
+        help="Where to write jsonlines output. Output goes to stdout if not set. "
+        "Output is compressed if the name ends with .gz, .bz2, .xz or .zst",
+    )
+
+    parser.add_argument(
+        "--shard_docs",
+        default=0,
+        type=int,
+        help="Split the output into the shards of at most this number of documents (requires --output)",
+    )
+
+    parser.add_argument(
+        "--shard_bytes",
+        default=0,
+        type=int,
+        help="Split the output into the shards of at most this size in bytes (requires --output)",
+    )
+
+    parser.add_argument(
+        "--shard",
+        default=None,
+        type=parse_shard,
+        help="Process only a part of the input files given as i/N (0 <= i < N), i.e 0/4, 1/4, 2/4, 3/4 "
+        "to spread the work over 4 machines. Files are assigned to the shards by the stable hash of their path",
+    )
+
+    parser.add_argument(
+        "--max_sentences",
+        default=0,
+        type=int,
+        help="Split documents into several tasks of at most this number of sentences. "
+        "Each task keeps the parent document and the index of the chunk, "
+        "so convert_vulyk2iob.py can join the answers back",
+    )
+
+    parser.add_argument(
+        "--max_chars",
+        default=0,
+        type=int,
+        help="Split documents into several tasks of at most this number of characters (on the sentence boundaries)",
+    )
+
+    parser.add_argument(
+        "--manifest",
+        default="",
+        help="Path to the manifest file that records processed inputs with their content hash and settings. "
+        "Inputs already recorded there with the same content and settings are skipped, which allows to process "
+        "only new files of the growing corpus or to resume the interrupted run. "
+        "Only the new documents are written, so use a new --output for each run",
+    )
+
+    parser.add_argument(
+        "--metrics_json",
+        default="",
+        help="Where to write the summary of the run as a json line: wall and cpu time of every stage "
+        "(reading, tokenization, model, conversion, writing), documents and tokens per second, peak memory. "
+        "Use - for stderr",
+    )
+
+    parser.add_argument(
+        "--metrics_every",
+        default=0,
+        type=float,
+        help="Also write the progress line (same as summary, so far) to --metrics_json every that many seconds",
+    )
+
+    parser.add_argument(
+        "--profile",
+        default="",
+        help="Run under cProfile and tracemalloc and write the results to PROFILE.prof and PROFILE.tracemalloc.txt. "
+        "Slows the run down noticeably",
+    )
+
     parser.add_argument(
         "-d",
         "--debug",
@@ -481,6 +646,7 @@ if __name__ == "__main__":
     args: argparse.Namespace = parser.parse_args()
 
     log.setLevel(args.loglevel)
+    logging.getLogger("vulyk_ner").setLevel(args.loglevel)
 
     if hasattr(args, "func"):
         args.func(args)
@@ -1,14 +1,21 @@
 from __future__ import unicode_literals
-from codecs import open
+import argparse
 from copy import deepcopy
 from datetime import datetime
-import json
 import os
+import posixpath
 import re
 import sys
 
 from glob2 import glob
 
+# Allows to run the script from the checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vulyk_ner.archives import iter_archive, split_archive_spec  # noqa: E402
+from vulyk_ner.files import JsonlinesSink, in_shard, open_compressed, parse_shard  # noqa: E402
+from vulyk_ner.metrics import Metrics, profiled  # noqa: E402
+
 TEMPLATE = {
     "action": "getDocument",
     "attributes": [],
@@ -83,10 +90,78 @@ def parse_file(fname, content):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        exit("Not enough arguments")
-
-    with open(sys.argv[2], "w", encoding="utf-8") as f_out:
-        for f in glob(sys.argv[1]):
-            with open(f, "r", encoding="utf-8") as fp:
-                f_out.write(json.dumps(parse_file(os.path.basename(f), fp.read()), ensure_ascii=False) + "\n")
+    parser = argparse.ArgumentParser(
+        description="Convert corpus files with <S>...</S> markup into the jsonlines file supported by Vulyk"
+    )
+    parser.add_argument(
+        "input_files",
+        help="File mask to collect files to process, ** is supported. Files might be compressed. "
+        "Files might be read from the tar or zip archive without extracting it, i.e `corpus.tar.gz:*.txt`",
+    )
+    parser.add_argument(
+        "output", help="Where to write jsonlines output. Output is compressed if the name ends with .gz, .bz2, .xz or .zst"
+    )
+    parser.add_argument(
+        "--shard_docs",
+        default=0,
+        type=int,
+        help="Split the output into the shards of at most this number of documents",
+    )
+    parser.add_argument(
+        "--shard_bytes",
+        default=0,
+        type=int,
+        help="Split the output into the shards of at most this size in bytes",
+    )
+    parser.add_argument(
+        "--shard",
+        default=None,
+        type=parse_shard,
+        help="Process only a part of the input files given as i/N (0 <= i < N), i.e 0/4, 1/4, 2/4, 3/4. "
+        "Files are assigned to the shards by the stable hash of their path",
+    )
+
+    parser.add_argument(
+        "--metrics_json",
+        default="",
+        help="Where to write the summary of the run as a json line: wall and cpu time of every stage, "
+        "documents and tokens per second, peak memory. Use - for stderr",
+    )
+    parser.add_argument(
+        "--metrics_every",
+        default=0,
+        type=float,
+        help="Also write the progress line (same as summary, so far) to --metrics_json every that many seconds",
+    )
+    parser.add_argument(
+        "--profile",
+        default="",
+        help="Run under cProfile and tracemalloc and write the results to PROFILE.prof and PROFILE.tracemalloc.txt",
+    )
+
+    args = parser.parse_args()
+
+    archive = split_archive_spec(args.input_files)
+
+    def read_files():
+        if archive is not None:
+            for doc in iter_archive(*archive, shard=args.shard):
+                yield posixpath.basename(doc.name), doc.text
+        else:
+            # Sorted, so the order of documents and the boundaries of shards don't depend on the filesystem
+            for f in sorted(glob(args.input_files)):
+                if in_shard(f, args.shard):
+                    with open_compressed(f) as fp:
+                        yield os.path.basename(f), fp.read()
+
+    with Metrics(args.metrics_json, every=args.metrics_every) as metrics, profiled(args.profile), JsonlinesSink(
+        args.output, shard_docs=args.shard_docs, shard_bytes=args.shard_bytes, sort_keys=False
+    ) as sink:
+        for fname, content in metrics.timed("read", read_files()):
+            with metrics.stage("convert"):
+                res = parse_file(fname, content)
+
+            with metrics.stage("write"):
+                sink.write(res)
+
+            metrics.count(documents=1, tokens=len(res["token_offsets"]))
@@ -3,13 +3,32 @@ import json
 import logging
 import re
 import glob
+import os
 import pathlib
-from typing import Union, List
+import sys
+from collections import deque
+from functools import partial
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+# Allows to run the script from the checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vulyk_ner.files import ExportState, in_shard, open_compressed, parse_shard, strip_compression_suffix  # noqa: E402
+from vulyk_ner.files import text_digest  # noqa: E402
+from vulyk_ner.iob import OVERLAP_POLICIES, IobFilesSink, IobStreamSink, unpack_iob_stream  # noqa: E402
+from vulyk_ner.iob import Span, answer_spans, assign_tags, render_iob, resolve_overlaps  # noqa: E402
+from vulyk_ner.jsonstream import iter_array_items  # noqa: E402
+from vulyk_ner.metrics import Metrics, profiled  # noqa: E402
+from vulyk_ner.parallel import ordered_map  # noqa: E402
 
 log = logging.getLogger(__name__)
 
 
-def convert_answer(task_record: dict) -> Union[str, None]:
+def convert_answer(task_record: dict, overlap: str = "first") -> Union[str, None]:
+    """
+    Convert the answer to IOB. Overlapping entities are resolved according to the overlap policy
+    (see resolve_overlaps), with `layers` every token gets a column of tags per layer
+    """
     warning: bool = False
 
     for f in ["text", "token_offsets", "entities", "sentence_offsets"]:
@@ -20,84 +39,205 @@ def convert_answer(task_record: dict) -> Union[str, None]:
     if warning:
         return None
 
-    text: str = task_record["text"]
-
     # Sorting just to make sure that we are fine
     sentences_off: List[List[int]] = sorted(task_record["sentence_offsets"], key=lambda x: x[0])
     tokens_off: List[List[int]] = sorted(task_record["token_offsets"], key=lambda x: x[0])
-    entities: List[tuple[str, int, int]] = []
-
-    # Rearranging entities a bit
-    # Treating fragmented entities as separate for now
-    for ent in task_record["entities"]:
-        for subent in ent[2]:
-            entities.append((ent[1], subent[0], subent[1]))
 
-    entities = sorted(entities, key=lambda x: x[1])
+    layers: List[List[Span]] = resolve_overlaps(answer_spans(task_record), overlap) or [[]]
+    tags: List[str] = (
+        assign_tags(tokens_off, layers[0])
+        if len(layers) == 1
+        else [" ".join(token_tags) for token_tags in zip(*(assign_tags(tokens_off, layer) for layer in layers))]
+    )
 
-    current_sent: int = 0
-    prev_position: int = 0
-    current_entity: int = 0
-    result: List[str] = []
+    return render_iob(task_record["text"], sentences_off, tokens_off, tags, outside=" ".join(["O"] * len(layers)))
+
+
+def chunk_document_id(parent: str) -> str:
+    """
+    Id of the document joined from the chunks (used in place of task id), based on the id of the parent document
+    """
+    return re.sub(r"[^\w.-]+", "_", parent).strip("_")
+
+
+def answer_key(answer: dict) -> Tuple[str, str]:
+    """
+    User (as the name of the directory) and the task of the answer, the key of the answer in the output
+    """
+    return answer["user"]["username"].replace("@", "_").replace(".", "_"), answer["task"]["id"]
+
+
+class ConvertedAnswer(NamedTuple):
+    """
+    Answer converted to IOB (None if it cannot be parsed) with the fields needed to store it
+    """
+    line_no: int
+    tokens: int
+    iob: Optional[str]
+    user: str = ""
+    task_id: str = ""
+    parent_document: Optional[str] = None
+    chunk_index: int = 0
+    chunks_total: int = 0
+
+
+def render_answer(
+    item: Tuple[int, str], metrics: Optional[Metrics] = None, overlap: str = "first"
+) -> ConvertedAnswer:
+    """
+    Decode the json of a single answer (see iter_array_items) and convert it to IOB
+    """
+    metrics = metrics or Metrics()
+    line_no, raw = item
+
+    with metrics.stage("decode"):
+        answer: dict = json.loads(raw)
+
+    for f in ["answer", "task", "user"]:
+        if f not in answer:
+            log.warning(f"Cannot find field {f} in answer, skipping")
+            return ConvertedAnswer(line_no, 0, None)
+
+    with metrics.stage("convert"):
+        iob: Optional[str] = convert_answer(answer["answer"], overlap)
+
+    record: dict = answer["answer"]
+    tokens: int = len(record.get("token_offsets", []))
+
+    if iob is None:
+        return ConvertedAnswer(line_no, tokens, None)
+
+    user, task_id = answer_key(answer)
+
+    return ConvertedAnswer(
+        line_no,
+        tokens,
+        iob,
+        user=user,
+        task_id=task_id,
+        parent_document=record.get("parent_document"),
+        chunk_index=record.get("chunk_index", 0),
+        chunks_total=record.get("chunks_total", 0),
+    )
 
-    for token in tokens_off:
-        # First add things in between tokens
-        if token[0] > prev_position + 1:
-            result.append(text[prev_position : token[0]] + " O")
 
-        # Validate boundaries of sentences
-        if token[0] > sentences_off[current_sent][1]:
-            current_sent += 1
-            result.append("")
+def parse_jsonlines(
+    jsonl_file: pathlib.Path,
+    output_dir: pathlib.Path,
+    metrics: Optional[Metrics] = None,
+    workers: int = 1,
+    reorder_window: int = 0,
+    output_format: str = "files",
+    compression: str = "",
+    shard_docs: int = 0,
+    shard_bytes: int = 0,
+    overlap: str = "first",
+    state_dir: Optional[pathlib.Path] = None,
+) -> None:
+    """
+    Convert the answers from the file exported from vulyk into IOB files in output_dir/batch_name/username/.
+    With output_format="stream", the batch is written as one (optionally compressed and sharded)
+    IOB stream with the index instead (see IobStreamSink).
+    Lines of the export are split into the answers on the fly (see iter_array_items), so the huge lines
+    are never read into memory at once.
+    workers > 1 spreads decoding and conversion of the answers over the pool of processes,
+    files are still written in the order of the answers, so the result is the same.
+    Time spent in decoding, conversion and writing is collected to metrics, if given.
+    Overlapping entities are resolved according to the overlap policy (see resolve_overlaps).
+    With state_dir, the answers that haven't changed since the previous runs are skipped (see ExportState).
+    Answers on the chunks of long documents are still converted, and the document is joined back and written
+    when at least one of its chunks has changed
+    """
+    metrics = metrics or Metrics()
+    input_file_base: str = strip_compression_suffix(jsonl_file).with_suffix("").name
+
+    sink: Union[IobFilesSink, IobStreamSink] = (
+        IobStreamSink(output_dir, input_file_base, compression, shard_docs=shard_docs, shard_bytes=shard_bytes)
+        if output_format == "stream"
+        else IobFilesSink(output_dir / input_file_base)
+    )
 
-        tag: str = " O"
-        if current_entity < len(entities):
-            if entities[current_entity][2] > token[0] >= entities[current_entity][1]:
-                if token[0] == entities[current_entity][1]:
-                    tag = f" B-{entities[current_entity][0]}"
-                else:
-                    tag = f" I-{entities[current_entity][0]}"
+    state: ExportState = ExportState(state_dir, input_file_base)
+    # Digests of the answers sent to conversion, they come back in the same order
+    digests: Deque[str] = deque()
+
+    # Answers on the chunks of long documents (see --max_sentences of convert2vulyk.py) are collected here
+    # as (iob, task_id, digest) until all the chunks of the document are annotated by the user, then joined back
+    # into one file
+    chunks: Dict[Tuple[str, str], Dict[int, Tuple[str, str, str]]] = {}
+
+    def write_chunks(user: str, parent: str, parts: Dict[int, Tuple[str, str, str]]) -> None:
+        if state.enabled and all(state.is_unchanged(user, task_id, digest) for _, task_id, digest in parts.values()):
+            state.skip(len(parts))
+            return
+
+        with metrics.stage("write"):
+            sink.write(user, chunk_document_id(parent), "\n\n".join(parts[idx][0] for idx in sorted(parts)))
+
+        for _, task_id, digest in parts.values():
+            state.record(sink, user, task_id, digest)
+
+    # Stages that run in the workers are not seen by the metrics of the main process
+    func = partial(render_answer, metrics=metrics if workers <= 1 else None, overlap=overlap)
+
+    def changed_answers(items: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+        for item in items:
+            if state.enabled:
+                with metrics.stage("digest"):
+                    digest: str = text_digest(item[1])
+
+                # Answers with the digest seen before are decoded to check their user and task. Chunks go further
+                # anyway, as the document is written again when any of its chunks has changed
+                if state.is_known(digest):
+                    with metrics.stage("decode"):
+                        answer: dict = json.loads(item[1])
+
+                    if (
+                        {"answer", "task", "user"} <= answer.keys()
+                        and "parent_document" not in answer["answer"]
+                        and state.is_unchanged(*answer_key(answer), digest)
+                    ):
+                        state.skip()
+                        continue
 
-            if token[1] >= entities[current_entity][2]:
-                current_entity += 1
+                digests.append(digest)
 
-        # Adding the token itself
-        result.append(text[token[0] : token[1]] + tag)
+            yield item
 
-        prev_position = token[1]
+    # State is closed before the sink, to commit the last answers while it's still open
+    with sink, state, open_compressed(jsonl_file) as fp:
+        answers: Iterator[ConvertedAnswer] = ordered_map(
+            func, changed_answers(metrics.timed("read", iter_array_items(fp))), workers=workers, window=reorder_window
+        )
+        if workers > 1:
+            # Answers are read while waiting for the results, that time is already in the stages of its own
+            answers = metrics.timed("workers", answers, exclude=("read", "digest", "decode"))
 
-    # Leftovers
-    if text[prev_position:]:
-        result.append(text[prev_position:] + " O")
+        for converted in answers:
+            metrics.count(documents=1, tokens=converted.tokens)
+            digest: str = digests.popleft() if state.enabled else ""
 
-    return "\n".join(result)
+            if converted.iob is None:
+                log.warning(f"Cannot find parse answer in the line #{converted.line_no} of file {fp}, skipping")
+                continue
 
+            if converted.parent_document is not None:
+                key: Tuple[str, str] = (converted.user, converted.parent_document)
+                parts: Dict[int, Tuple[str, str, str]] = chunks.setdefault(key, {})
+                parts[converted.chunk_index] = (converted.iob, converted.task_id, digest)
 
-def parse_jsonlines(jsonl_file: pathlib.Path, output_dir: pathlib.Path) -> None:
-    input_file_base: str = jsonl_file.with_suffix("").name
+                if len(parts) == converted.chunks_total:
+                    write_chunks(converted.user, converted.parent_document, chunks.pop(key))
+                continue
 
-    batch_dir: pathlib.Path = output_dir / input_file_base
-    batch_dir.mkdir(exist_ok=True)
+            with metrics.stage("write"):
+                sink.write(converted.user, converted.task_id, converted.iob)
 
-    with jsonl_file.open("r") as fp:
-        for line_no, l in enumerate(fp):
-            for answer in json.loads(l):
-                for f in ["answer", "task", "user"]:
-                    if f not in answer:
-                        log.warning(f"Cannot find field {f} in answer, skipping")
-                        continue
+            state.record(sink, converted.user, converted.task_id, digest)
 
-                iob = convert_answer(answer["answer"])
-                if iob is None:
-                    log.warning(f"Cannot find parse answer in the line #{line_no} of file {fp}, skipping")
-                    continue
-                else:
-                    user: str = answer["user"]["username"].replace("@", "_").replace(".", "_")
-                    user_dir: pathlib.Path = batch_dir / user
-                    user_dir.mkdir(exist_ok=True)
-
-                    with open(user_dir / (answer["task"]["id"] + ".iob"), "w") as fp_out:
-                        fp_out.write(iob)
+        for (user, parent), parts in chunks.items():
+            log.warning(f"Only {len(parts)} chunks of {parent} were annotated by {user}, storing them anyway")
+            write_chunks(user, parent, parts)
 
 
 if __name__ == "__main__":
@@ -105,12 +245,114 @@ if __name__ == "__main__":
 
     parser: argparse.ArgumentParser = argparse.ArgumentParser(
         description="Convert jsonlines output files exported from vulyk into IOB format (currently). "
-        "Each answer will be stored in the separate file, located in the `batch_dir/username/task_id.iob`"
+        "Each answer will be stored in the separate file, located in the `batch_dir/username/task_id.iob`. "
+        "Answers on the chunks of the long documents are joined back into `batch_dir/username/parent_document.iob`. "
+        "With --output_format stream, each batch is written as one IOB stream `batch.iob` with the index instead"
     )
 
-    parser.add_argument("jsonl_files", help="File mask to collect jsonlines files to process.")
+    parser.add_argument(
+        "jsonl_files",
+        help="File mask to collect jsonlines files to process. Files compressed with gz, bz2, xz or zst are supported",
+    )
     parser.add_argument("output_dir", help="Directory to store converted files", type=pathlib.Path)
 
+    parser.add_argument(
+        "--shard",
+        default=None,
+        type=parse_shard,
+        help="Process only a part of the input files given as i/N (0 <= i < N), i.e 0/4, 1/4, 2/4, 3/4. "
+        "Files are assigned to the shards by the stable hash of their path",
+    )
+
+    parser.add_argument(
+        "--output_format",
+        default="files",
+        choices=("files", "stream"),
+        help="Write a file per answer or one CoNLL/IOB stream per batch (`batch.iob`, documents start with "
+        "-DOCSTART- line) with the index `batch.index.tsv` to find the answer of the user to the task in it",
+    )
+
+    parser.add_argument(
+        "--compression",
+        default="",
+        choices=("", ".gz", ".bz2", ".xz", ".zst"),
+        help="Compress the stream, every answer is compressed separately, so the index still allows random access",
+    )
+
+    parser.add_argument(
+        "--shard_docs",
+        default=0,
+        type=int,
+        help="Split the stream into the shards of at most this number of answers",
+    )
+
+    parser.add_argument(
+        "--shard_bytes",
+        default=0,
+        type=int,
+        help="Split the stream into the shards of at most this size in bytes",
+    )
+
+    parser.add_argument(
+        "--unpack",
+        default=False,
+        action="store_true",
+        help="Rebuild the layout of a file per answer from the streams: jsonl_files is the mask of the index files "
+        "then, i.e `iobs/*.index.tsv`",
+    )
+
+    parser.add_argument(
+        "--overlap",
+        default="first",
+        choices=OVERLAP_POLICIES,
+        help="What to do with overlapping or nested entities: keep the one that starts first, keep the longest one, "
+        "or keep them all in separate layers (every layer adds a column of tags to the output)",
+    )
+
+    parser.add_argument(
+        "--state_dir",
+        default=None,
+        type=pathlib.Path,
+        help="Convert only new and changed answers: digests of the converted answers are kept in STATE_DIR/batch.state.tsv "
+        "and the answers that haven't changed are skipped on the next runs. With --output_format stream, only new and changed "
+        "answers are written, so use a new output_dir for each run",
+    )
+
+    parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of processes to decode and convert the answers in parallel. The result stays the same",
+    )
+
+    parser.add_argument(
+        "--reorder_window",
+        default=0,
+        type=int,
+        help="How many answers might be in flight while waiting for the slow one when --workers > 1 "
+        "(defaults to 4 answers per worker)",
+    )
+
+    parser.add_argument(
+        "--metrics_json",
+        default="",
+        help="Where to write the summary of the run as a json line: wall and cpu time of every stage "
+        "(reading, json decoding, conversion, writing), answers and tokens per second, peak memory. Use - for stderr",
+    )
+
+    parser.add_argument(
+        "--metrics_every",
+        default=0,
+        type=float,
+        help="Also write the progress line (same as summary, so far) to --metrics_json every that many seconds",
+    )
+
+    parser.add_argument(
+        "--profile",
+        default="",
+        help="Run under cProfile and tracemalloc and write the results to PROFILE.prof and PROFILE.tracemalloc.txt",
+    )
+
     parser.add_argument(
         "-d",
         "--debug",
@@ -132,8 +374,28 @@ if __name__ == "__main__":
 
     args: argparse.Namespace = parser.parse_args()
     assert args.output_dir.is_dir(), f"{args.output_dir} is not a directory"
+    assert args.state_dir is None or args.state_dir.is_dir(), f"{args.state_dir} is not a directory"
 
     log.setLevel(args.loglevel)
-
-    for jsonl in map(pathlib.Path, glob.glob(args.jsonl_files)):
-        parse_jsonlines(jsonl, args.output_dir)
+    logging.getLogger("vulyk_ner").setLevel(args.loglevel)
+
+    if args.unpack:
+        for index in glob.glob(args.jsonl_files):
+            log.info(f"Unpacked {unpack_iob_stream(index, args.output_dir)} documents from {index}")
+    else:
+        with Metrics(args.metrics_json, every=args.metrics_every) as metrics, profiled(args.profile):
+            for jsonl in map(pathlib.Path, glob.glob(args.jsonl_files)):
+                if in_shard(jsonl, args.shard):
+                    parse_jsonlines(
+                        jsonl,
+                        args.output_dir,
+                        metrics=metrics,
+                        workers=args.workers,
+                        reorder_window=args.reorder_window,
+                        output_format=args.output_format,
+                        compression=args.compression,
+                        shard_docs=args.shard_docs,
+                        shard_bytes=args.shard_bytes,
+                        overlap=args.overlap,
+                        state_dir=args.state_dir,
+                    )
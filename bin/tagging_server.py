@@ -0,0 +1,104 @@
+import argparse
+import logging
+import os
+import sys
+
+# Allows to run the script from the checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vulyk_ner.ner import AbstractNER, build_ner  # noqa: E402
+from vulyk_ner.server import TaggingServer  # noqa: E402
+
+log = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Local tagging server that loads NER model once and keeps it in memory. "
+        "Use it together with `python bin/convert2vulyk.py tag --server http://127.0.0.1:8765` "
+        "to avoid loading the model on each run"
+    )
+
+    parser.add_argument(
+        "--ner_framework",
+        choices=("stanza", "spacy", "gazetteer"),
+        default="stanza",
+        help="Which framework to use for the tagging",
+    )
+
+    parser.add_argument(
+        "--ner_model",
+        default="uk",
+        help="Which model to use. Same as for `convert2vulyk.py tag`",
+    )
+
+    parser.add_argument(
+        "--model_dir",
+        default=None,
+        help="Where to keep downloaded stanza models (stanza default dir is used if not set) "
+        "or compiled gazetteers (next to the lists if not set)",
+    )
+
+    parser.add_argument(
+        "--window_sentences",
+        default=0,
+        type=int,
+        help="Tag documents with spacy model by windows of that many sentences. Same as for `convert2vulyk.py tag`",
+    )
+
+    parser.add_argument(
+        "--window_overlap",
+        default=1,
+        type=int,
+        help="How many sentences neighbour windows share. Same as for `convert2vulyk.py tag`",
+    )
+
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", default=8765, type=int, help="Port to listen on")
+
+    parser.add_argument(
+        "-d",
+        "--debug",
+        help="Print even more logs (debug)",
+        action="store_const",
+        dest="loglevel",
+        const=logging.DEBUG,
+        default=logging.WARNING,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        help="Print more logs (info)",
+        action="store_const",
+        dest="loglevel",
+        const=logging.INFO,
+    )
+
+    args: argparse.Namespace = parser.parse_args()
+
+    log.setLevel(args.loglevel)
+    logging.getLogger("vulyk_ner").setLevel(args.loglevel)
+
+    model: AbstractNER = build_ner(
+        args.ner_framework,
+        args.ner_model,
+        model_dir=args.model_dir,
+        window_sentences=args.window_sentences,
+        window_overlap=args.window_overlap,
+    )
+    server: TaggingServer = TaggingServer(
+        (args.host, args.port),
+        model,
+        info={"ner_framework": args.ner_framework, "ner_model": args.ner_model, "identity": model.identity},
+    )
+
+    log.info(f"Serving {args.ner_framework} model {args.ner_model} at http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
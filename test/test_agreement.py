@@ -0,0 +1,142 @@
+import gzip
+import json
+import pathlib
+import tempfile
+import unittest
+from typing import Dict, List
+
+from bin.agreement import compare_answers
+from vulyk_ner.agreement import LabelMatrix, TaskAnswers, adjudicate, agreement, build_matrix, gold_tags
+from vulyk_ner.agreement import group_answers
+from vulyk_ner.iob import IobIndexEntry, read_iob_document, read_iob_index
+
+try:
+    import numpy  # type: ignore
+
+    HAS_NUMPY: bool = True
+except ImportError:
+    HAS_NUMPY = False
+
+TEXT: str = "Тарас Шевченко жив у Києві"
+TOKENS: List[List[int]] = [[0, 5], [6, 14], [15, 18], [19, 20], [21, 26]]
+
+
+def make_answer(task_id: str, user: str, entities: List[list]) -> dict:
+    return {
+        "answer": {"text": TEXT, "sentence_offsets": [[0, 26]], "token_offsets": TOKENS, "entities": entities},
+        "task": {"id": task_id},
+        "user": {"username": user},
+    }
+
+
+PERS: list = ["T1", "PERS", [[0, 14]]]
+PERS_SHORT: list = ["T1", "PERS", [[6, 14]]]
+LOC: list = ["T2", "LOC", [[21, 26]]]
+
+
+@unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+class TestAgreement(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path: pathlib.Path = pathlib.Path(self.tmp.name)
+
+        self.answers: List[dict] = [
+            # Full agreement
+            make_answer("t1", "a", [PERS, LOC]),
+            make_answer("t1", "b", [PERS, LOC]),
+            # Annotators disagree on the first token of the person
+            make_answer("t2", "a", [PERS, LOC]),
+            make_answer("t2", "b", [PERS_SHORT, LOC]),
+            # Single answer
+            make_answer("t3", "a", [PERS]),
+        ]
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_matrix(self):
+        tasks: Dict[str, TaskAnswers] = group_answers(self.answers)
+        self.assertEqual(["B-PERS", "I-PERS", "O", "O", "B-LOC"], tasks["t1"].tags["a"])
+        self.assertEqual(["O", "B-PERS", "O", "O", "B-LOC"], tasks["t2"].tags["b"])
+
+        matrix: LabelMatrix = build_matrix(tasks.values())
+        self.assertEqual(["t1", "t2"], [task.task_id for task in matrix.tasks])
+        self.assertEqual((10, 2), matrix.labels.shape)
+        self.assertEqual(["LOC", "PERS"], matrix.types)
+        self.assertEqual([0] * 5 + [1] * 5, matrix.task.tolist())
+        self.assertEqual(
+            ["O", "B-PERS", "O", "O", "B-LOC"], [matrix.vocabulary[label] for label in matrix.labels[5:, 1].tolist()]
+        )
+
+        # Tasks with a single answer are compared when asked to, the missing annotator is -1
+        single: LabelMatrix = build_matrix(tasks.values(), min_annotators=1)
+        self.assertEqual([-1] * 5, single.labels[10:, 1].tolist())
+
+        with self.assertRaises(ValueError):
+            group_answers(self.answers, overlap="layers")
+
+        # Partial answer is skipped, same as in convert_vulyk2iob.py
+        partial: dict = make_answer("t4", "c", [PERS])
+        del partial["task"]
+        with self.assertLogs("vulyk_ner.agreement", "WARNING"):
+            self.assertEqual(list(tasks), list(group_answers(self.answers + [partial])))
+
+    def test_agreement(self):
+        report: dict = agreement(build_matrix(group_answers(self.answers).values()))
+
+        self.assertEqual(10, report["tokens"])
+        # Locations are the same everywhere
+        self.assertEqual({"kappa": 1.0, "f1": 1.0, "spans": 4}, report["types"]["LOC"])
+        # One of the two persons matches; 3 tokens of 10 are PERS for a, 4 for b, 3 in common:
+        # observed 0.9, expected 0.3 * 0.4 + 0.7 * 0.6 = 0.54
+        self.assertEqual(round((0.9 - 0.54) / (1 - 0.54), 4), report["types"]["PERS"]["kappa"])
+        self.assertEqual(0.5, report["types"]["PERS"]["f1"])
+        self.assertEqual(round(2 * 3 / 8, 4), report["f1"])
+
+    def test_adjudicate(self):
+        tasks: Dict[str, TaskAnswers] = group_answers(self.answers)
+        tasks["t2"].tags["c"] = ["B-PERS", "I-PERS", "O", "O", "B-LOC"]
+        matrix: LabelMatrix = build_matrix(tasks.values())
+
+        _, unanimous = adjudicate(matrix, "unanimous")
+        self.assertEqual([True] * 5 + [False, False, True, True, True], unanimous.tolist())
+
+        winner, majority = adjudicate(matrix, "majority")
+        self.assertTrue(majority.all())
+        self.assertEqual(["B-PERS", "I-PERS"], [matrix.vocabulary[label] for label in winner[5:7].tolist()])
+
+        with self.assertRaises(ValueError):
+            adjudicate(matrix, "any")
+
+        # I- tag that won without the B- before it starts the entity
+        votes: List[str] = ["O", "I-PERS", "O", "O", "B-LOC"] * 2
+        self.assertEqual(
+            ["O", "B-PERS", "O", "O", "B-LOC"] * 2,
+            gold_tags(matrix, numpy.array([matrix.vocabulary.index(tag) for tag in votes])),
+        )
+
+    def test_compare_answers(self):
+        with gzip.open(self.path / "batch.jsonlines.gz", "wt", encoding="utf-8") as fp:
+            fp.write(json.dumps(self.answers[:3], ensure_ascii=False) + "\n")
+            fp.write(json.dumps(self.answers[3:], ensure_ascii=False) + "\n")
+
+        report: dict = compare_answers([str(self.path / "batch.jsonlines.gz")], self.path)
+        self.assertEqual((3, 2, 1, 1), (report["tasks"], report["compared"], report["gold"], report["review"]))
+        self.assertEqual(report, json.loads((self.path / "agreement.json").read_text(encoding="utf-8")))
+
+        index: Dict[tuple, IobIndexEntry] = read_iob_index(self.path / "gold.index.tsv")
+        self.assertEqual([("gold", "t1")], list(index))
+        self.assertEqual(
+            "Тарас B-PERS\nШевченко I-PERS\nжив O\nу O\nКиєві B-LOC", read_iob_document(self.path, index[("gold", "t1")])
+        )
+
+        review: List[dict] = [
+            json.loads(line) for line in (self.path / "review.jsonlines").read_text(encoding="utf-8").splitlines()
+        ]
+        self.assertEqual(["t2"], [task["task_id"] for task in review])
+        self.assertEqual([0, 1], review[0]["conflicts"])
+        self.assertEqual(["a", "b"], sorted(review[0]["tags"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
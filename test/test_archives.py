@@ -0,0 +1,159 @@
+import gzip
+import io
+import json
+import pathlib
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bin.convert2vulyk import convert
+from vulyk_ner.archives import ArchiveDocument, iter_archive, iter_inputs, split_archive_spec
+from vulyk_ner.files import JsonlinesSink
+
+MEMBERS: Dict[str, bytes] = {
+    # Annotation comes before the text
+    "corpus/doc1.ann": "T1\tPERS 0 5\tТарас\n".encode("utf-8"),
+    "corpus/doc1.txt": "Тарас писав вірші .".encode("utf-8"),
+    # Annotation comes after the text and is compressed
+    "corpus/doc2.txt": "Леся жила в Києві .".encode("utf-8"),
+    "corpus/doc3.txt": "Без анотацій .".encode("utf-8"),
+    "corpus/doc2.ann.gz": gzip.compress("T1\tLOC 12 17\tКиєві\n".encode("utf-8")),
+    "corpus/readme.md": b"not a text",
+}
+
+
+class TestArchives(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path: pathlib.Path = pathlib.Path(self.tmp.name)
+
+        for name, content in MEMBERS.items():
+            (self.path / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.path / name).write_bytes(content)
+
+        with tarfile.open(self.path / "corpus.tar.gz", "w:gz") as tf:
+            for name, content in MEMBERS.items():
+                info: tarfile.TarInfo = tarfile.TarInfo(name)
+                info.size = len(content)
+                tf.addfile(info, io.BytesIO(content))
+
+        with zipfile.ZipFile(self.path / "corpus.zip", "w") as zf:
+            for name, content in MEMBERS.items():
+                zf.writestr(name, content)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_split_archive_spec(self):
+        self.assertEqual(("corpus.tar.gz", "docs/*.txt"), split_archive_spec("corpus.tar.gz:docs/*.txt"))
+        self.assertEqual(("/data/Corpus.ZIP", "*.txt"), split_archive_spec("/data/Corpus.ZIP:*.txt"))
+        self.assertEqual(("corpus.tar", "*"), split_archive_spec("corpus.tar:"))
+        self.assertIsNone(split_archive_spec("corpus/*.txt"))
+        self.assertIsNone(split_archive_spec("corpus.tar.gz"))
+
+    def _read(self, archive: str, ann_autodiscovery: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+        return [
+            (doc.name, doc.ann)
+            for doc in iter_archive(str(self.path / archive), "corpus/*.txt", ann_autodiscovery=ann_autodiscovery)
+        ]
+
+    def test_pairing(self):
+        for archive in ["corpus.tar.gz", "corpus.zip"]:
+            self.assertEqual(
+                [
+                    ("corpus/doc1.txt", "T1\tPERS 0 5\tТарас\n"),
+                    ("corpus/doc2.txt", "T1\tLOC 12 17\tКиєві\n"),
+                    # Texts with no annotations come last
+                    ("corpus/doc3.txt", None),
+                ],
+                self._read(archive, "replace"),
+            )
+
+            self.assertEqual(
+                [("corpus/doc1.txt", None), ("corpus/doc2.txt", None), ("corpus/doc3.txt", None)],
+                self._read(archive, None),
+            )
+
+            # With append rule, doc1.txt.ann is expected
+            self.assertEqual([None, None, None], [ann for _, ann in self._read(archive, "append")])
+
+    def test_waiting(self):
+        members: Dict[str, bytes] = {
+            "a/doc1.txt": b"no annotation",
+            "a/sub/doc2.txt": b"in subdirectory",
+            "a/doc3.txt": b"back to a",
+            "b/doc4.ann": b"",
+            "b/doc4.txt": b"annotated",
+            "doc5.txt": b"top level",
+            "doc6.txt": b"top level",
+        }
+
+        with tarfile.open(self.path / "dirs.tar", "w") as tf:
+            for name, content in members.items():
+                info: tarfile.TarInfo = tarfile.TarInfo(name)
+                info.size = len(content)
+                tf.addfile(info, io.BytesIO(content))
+
+        # Texts of a/ are given away once the archive moves past it (and its subdirectories)
+        docs: Iterator[ArchiveDocument] = iter_archive(str(self.path / "dirs.tar"), "*.txt", ann_autodiscovery="replace")
+        self.assertEqual(
+            ["a/sub/doc2.txt", "a/doc1.txt", "a/doc3.txt", "b/doc4.txt"], [next(docs).name for _ in range(4)]
+        )
+        self.assertEqual(["doc5.txt", "doc6.txt"], [doc.name for doc in docs])
+
+        # Texts of the same directory are not held forever either
+        self.assertEqual(
+            ["a/doc1.txt", "a/sub/doc2.txt", "a/doc3.txt", "b/doc4.txt", "doc5.txt", "doc6.txt"],
+            [
+                doc.name
+                for doc in iter_archive(str(self.path / "dirs.tar"), "*.txt", ann_autodiscovery="replace", max_waiting=0)
+            ],
+        )
+
+    def test_iter_inputs(self):
+        doc = next(iter_inputs(f"{self.path / 'corpus.zip'}:*doc1.txt"))
+        self.assertEqual(f"{self.path / 'corpus.zip'}:corpus/doc1.txt", doc.source)
+        self.assertEqual("Тарас писав вірші .", doc.text)
+
+        self.assertEqual(
+            [self.path / "corpus/doc1.txt", self.path / "corpus/doc2.txt", self.path / "corpus/doc3.txt"],
+            list(iter_inputs(str(self.path / "corpus/*.txt"))),
+        )
+
+    def _convert(self, input_files: str, workers: int = 1) -> List[dict]:
+        output: pathlib.Path = self.path / "out.jsonlines"
+        convert(
+            input_files,
+            "txt",
+            ignore_annotations=False,
+            ann_autodiscovery="replace",
+            realign_tokens=False,
+            workers=workers,
+            sink=JsonlinesSink(str(output)),
+        )
+
+        # Timestamps of the tasks differ between the runs
+        return [
+            {k: v for k, v in json.loads(line).items() if k not in ("ctime", "mtime")}
+            for line in output.read_text(encoding="utf-8").splitlines()
+        ]
+
+    def test_convert(self):
+        # Same documents as from the extracted files
+        expected: List[dict] = self._convert(str(self.path / "corpus/*.txt"))
+        self.assertEqual(["PERS"], [ent[1] for ent in expected[0]["entities"]])
+        self.assertEqual(["LOC"], [ent[1] for ent in expected[1]["entities"]])
+
+        self.assertEqual(expected, self._convert(f"{self.path / 'corpus.tar.gz'}:corpus/*.txt"))
+        self.assertEqual(expected, self._convert(f"{self.path / 'corpus.zip'}:corpus/*.txt", workers=2))
+
+        # Bare archive: reads every member, but the annotations are never taken for the texts
+        everything: List[dict] = self._convert(f"{self.path / 'corpus.tar.gz'}:")
+        self.assertEqual(expected, [task for task in everything if task["text"] != "not a text"])
+        self.assertEqual(4, len(everything))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from vulyk_ner.ner import AbstractNER, batched
+
+
+class UpperNER(AbstractNER):
+    def __init__(self, model: str) -> None:
+        self.model = model
+
+    def tag_text(self, txt: str) -> str:
+        return txt.upper()
+
+
+class TestBatched(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual([], list(batched([], 3)))
+
+    def test_batch_size(self):
+        self.assertEqual([[1, 2, 3], [4, 5, 6], [7]], list(batched(range(1, 8), 3, size=lambda x: 1)))
+
+    def test_max_chars(self):
+        data = ["aaaa", "bb", "cc", "d", "eeeeeeeeee", "f"]
+        self.assertEqual(
+            [["aaaa", "bb"], ["cc", "d"], ["eeeeeeeeee"], ["f"]],
+            list(batched(data, 10, max_chars=6)),
+        )
+
+    def test_no_max_chars(self):
+        data = ["aaaa", "bb", "cc", "d", "eeeeeeeeee", "f"]
+        self.assertEqual([data], list(batched(data, 10)))
+
+    def test_default_tag_batch(self):
+        self.assertEqual(["МАМА", "РАМА"], UpperNER("test").tag_batch(["мама", "рама"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
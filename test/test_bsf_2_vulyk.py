@@ -2,7 +2,8 @@ import time
 import unittest
 from typing import List, Tuple
 
-from bin.convert2vulyk import convert_bsf_2_vulyk, simple_tokenizer
+from vulyk_ner.brat import convert_bsf_2_vulyk
+from vulyk_ner.text import simple_tokenizer
 
 
 class TestBsf2Vulyk(unittest.TestCase):
@@ -225,5 +226,23 @@ T2 PERS 23 33 П. Ідоров"""
         self.assertEqual(expected, result["entities"])
         self.assertEqual(self._get_entities(result), ["Сергій Білецький"])
 
+    def test_many_displacements(self):
+        sentence: List[str] = []
+        markup: List[str] = []
+        pos: int = 0
+        for i in range(300):
+            if i:
+                sentence.append(",")
+                pos += 3
+            token: str = f"Токен{i}"
+            markup.append(f"T{i + 1} ORG {pos} {pos + len(token)} {token}")
+            sentence.append(token)
+            pos += len(token)
+
+        result = convert_bsf_2_vulyk([sentence], "\n".join(markup), compensate_for_offsets=True)
+        self.assertEqual(self._get_entities(result), [f"Токен{i}" for i in range(300)])
+        self.assertEqual(result["text"], ", ".join(f"Токен{i}" for i in range(300)))
+
+
 if __name__ == "__main__":
     unittest.main()
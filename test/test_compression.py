@@ -0,0 +1,87 @@
+import gzip
+import json
+import pathlib
+import tempfile
+import unittest
+
+from bin.convert2vulyk import convert_file
+from vulyk_ner.files import JsonlinesSink, find_annotation, open_compressed
+
+try:
+    import zstandard  # type: ignore  # noqa: F401
+
+    HAS_ZSTD: bool = True
+except ImportError:
+    HAS_ZSTD = False
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path: pathlib.Path = pathlib.Path(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _roundtrip(self, name: str) -> None:
+        with open_compressed(self.path / name, "w") as fp:
+            fp.write("Мама мила раму\nРама була біла\n")
+
+        with open_compressed(self.path / name) as fp:
+            self.assertEqual(["Мама мила раму\n", "Рама була біла\n"], list(fp))
+
+    def test_plain(self):
+        self._roundtrip("test.txt")
+
+    def test_gzip(self):
+        self._roundtrip("test.txt.gz")
+
+        with gzip.open(self.path / "test.txt.gz", "rt", encoding="utf-8") as fp:
+            self.assertEqual("Мама мила раму\nРама була біла\n", fp.read())
+
+    def test_bz2(self):
+        self._roundtrip("test.txt.bz2")
+
+    def test_xz(self):
+        self._roundtrip("test.txt.xz")
+
+    @unittest.skipUnless(HAS_ZSTD, "zstandard is not installed")
+    def test_zstd(self):
+        self._roundtrip("test.txt.zst")
+
+    def test_find_annotation(self):
+        text: pathlib.Path = self.path / "doc.txt.gz"
+        self.assertIsNone(find_annotation(text, "replace"))
+
+        (self.path / "doc.ann.gz").touch()
+        self.assertEqual(self.path / "doc.ann.gz", find_annotation(text, "replace"))
+
+        (self.path / "doc.ann").touch()
+        self.assertEqual(self.path / "doc.ann", find_annotation(text, "replace"))
+
+        (self.path / "doc.txt.ann").touch()
+        self.assertEqual(self.path / "doc.txt.ann", find_annotation(text, "append"))
+
+    def test_convert_compressed(self):
+        with open_compressed(self.path / "doc.txt.gz", "w") as fp:
+            fp.write("Речення з Токен .\nтокен Другий")
+
+        with open_compressed(self.path / "doc.ann.bz2", "w") as fp:
+            fp.write("T1 ORG 10 15 Токен\nT2 MISC 24 30 Другий")
+
+        result: dict = convert_file(self.path / "doc.txt.gz", "txt", False, "replace", True)
+        self.assertEqual([["T1", "ORG", [(10, 15)]], ["T2", "MISC", [(23, 29)]]], result["entities"])
+
+    def test_compressed_shards(self):
+        with JsonlinesSink(str(self.path / "tasks.jsonlines.gz"), shard_docs=2) as sink:
+            for i in range(3):
+                sink.write({"id": i})
+
+        self.assertEqual(["tasks.00000.jsonlines.gz", "tasks.00001.jsonlines.gz"], [p.name for p in sink.paths])
+
+        with gzip.open(sink.paths[0], "rt", encoding="utf-8") as fp:
+            self.assertEqual([{"id": 0}, {"id": 1}], [json.loads(line) for line in fp])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import pathlib
+import tempfile
+import unittest
+from typing import List
+
+from vulyk_ner.brat import convert_bsf_2_vulyk, parse_bsf
+from vulyk_ner.gazetteer import GazetteerNER, TokenAutomaton
+from vulyk_ner.ner import build_ner
+
+GAZETTEER: str = """# toponyms
+Київ\tLOC
+Нью-Йорк\tLOC
+Нью-Йорк Сіті\tLOC
+
+ТОВ «Ромашка»\tORG
+Ромашка\tPERS
+Київ\tORG
+"""
+
+
+class TestTokenAutomaton(unittest.TestCase):
+    def test_overlapping_patterns(self):
+        automaton = TokenAutomaton()
+        self.assertTrue(automaton.add(["a", "b", "c"], "ABC"))
+        self.assertTrue(automaton.add(["b", "c"], "BC"))
+        self.assertTrue(automaton.add(["c", "d"], "CD"))
+        self.assertTrue(automaton.add(["b"], "B"))
+        self.assertFalse(automaton.add(["b"], "OTHER"))
+        automaton.build()
+
+        self.assertEqual(
+            {("ABC", 1, 4), ("BC", 2, 4), ("B", 2, 3), ("CD", 3, 5), ("B", 5, 6)},
+            set(automaton.find(["x", "a", "b", "c", "d", "b", "a"])),
+        )
+        self.assertEqual([], list(automaton.find([])))
+
+
+class TestGazetteerNER(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name) / "names.tsv"
+        self.path.write_text(GAZETTEER, encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_tag_tokenized(self):
+        model = build_ner("gazetteer", str(pathlib.Path(self.tmp.name) / "*.tsv"))
+        tokenized: List[List[str]] = [
+            ["Їдемо", "з", "Київ", "у", "Нью-Йорк", "Сіті", "."],
+            ["ТОВ", "«", "Ромашка", "»", "та", "Київський", "Нью-Йорк"],
+        ]
+
+        markup: str = model.tag_tokenized_batch([tokenized])[0]
+        vulyk: dict = convert_bsf_2_vulyk(tokenized, markup)
+
+        self.assertEqual(
+            [("LOC", "Київ"), ("LOC", "Нью-Йорк Сіті"), ("ORG", "ТОВ « Ромашка »"), ("LOC", "Нью-Йорк")],
+            [(tag, vulyk["text"][spans[0][0] : spans[0][1]]) for _, tag, spans in vulyk["entities"]],
+        )
+
+    def test_tag_text(self):
+        model = GazetteerNER(str(self.path))
+        txt: str = "Ромашка з Києва, а ТОВ «Ромашка» з Нью-Йорк."
+
+        self.assertEqual(
+            [("PERS", "Ромашка"), ("ORG", "ТОВ «Ромашка»"), ("LOC", "Нью-Йорк")],
+            [(ent.tag, txt[ent.start_idx : ent.end_idx]) for ent in parse_bsf(model.tag_text(txt))],
+        )
+
+    def test_compiled_cache(self):
+        cache_dir = pathlib.Path(self.tmp.name) / "cache"
+        model = GazetteerNER(str(self.path), model_dir=str(cache_dir))
+
+        cached: List[pathlib.Path] = list(cache_dir.glob("gazetteer.*.pickle"))
+        self.assertEqual(1, len(cached))
+
+        again = GazetteerNER(str(self.path), model_dir=str(cache_dir))
+        self.assertEqual(model.identity, again.identity)
+        self.assertEqual(model.automaton.goto, again.automaton.goto)
+
+        # Changed list gets its own automaton
+        self.path.write_text(GAZETTEER + "Львів\tLOC\n", encoding="utf-8")
+        changed = GazetteerNER(str(self.path), model_dir=str(cache_dir))
+        self.assertNotEqual(model.identity, changed.identity)
+        self.assertEqual(2, len(list(cache_dir.glob("gazetteer.*.pickle"))))
+        self.assertEqual("T1\tLOC 0 5\tЛьвів\n", changed.tag_tokenized_batch([[["Львів"]]])[0])
+
+    def test_broken_line(self):
+        self.path.write_text(GAZETTEER + "broken line\n", encoding="utf-8")
+
+        with self.assertLogs("vulyk_ner.gazetteer", level="WARNING"):
+            model = GazetteerNER(str(self.path))
+
+        self.assertEqual([""], model.tag_tokenized_batch([[["broken", "line"]]]))
+
+    def test_no_files(self):
+        with self.assertRaises(ValueError):
+            GazetteerNER(str(pathlib.Path(self.tmp.name) / "*.csv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import pathlib
+import tempfile
+import unittest
+from typing import List
+
+from vulyk_ner.files import JsonlinesSink
+
+
+class TestJsonlinesSink(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output: pathlib.Path = pathlib.Path(self.tmp.name) / "tasks.jsonlines"
+        self.docs: List[dict] = [{"text": f"Документ {i}", "id": i} for i in range(10)]
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _read(self, path: pathlib.Path) -> List[dict]:
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+    def test_single_file(self):
+        with JsonlinesSink(str(self.output)) as sink:
+            for doc in self.docs:
+                sink.write(doc)
+
+        self.assertEqual([self.output], sink.paths)
+        self.assertEqual(self.docs, self._read(self.output))
+        self.assertEqual(
+            '{"id": 0, "text": "Документ 0"}', self.output.read_text(encoding="utf-8").splitlines()[0]
+        )
+
+    def test_shard_docs(self):
+        with JsonlinesSink(str(self.output), shard_docs=4) as sink:
+            for doc in self.docs:
+                sink.write(doc)
+
+        self.assertEqual(
+            ["tasks.00000.jsonlines", "tasks.00001.jsonlines", "tasks.00002.jsonlines"], [p.name for p in sink.paths]
+        )
+        self.assertEqual([4, 4, 2], [len(self._read(p)) for p in sink.paths])
+        self.assertEqual(self.docs, sum((self._read(p) for p in sink.paths), []))
+
+    def test_shard_bytes(self):
+        line_size: int = len((json.dumps(self.docs[0], ensure_ascii=False, sort_keys=True) + "\n").encode("utf-8"))
+
+        with JsonlinesSink(str(self.output), shard_bytes=line_size * 3 + 1) as sink:
+            for doc in self.docs:
+                sink.write(doc)
+
+        self.assertEqual([3, 3, 3, 1], [len(self._read(p)) for p in sink.paths])
+        self.assertTrue(all(p.stat().st_size <= line_size * 3 + 1 for p in sink.paths))
+        self.assertEqual(self.docs, sum((self._read(p) for p in sink.paths), []))
+
+    def test_shard_without_output(self):
+        with self.assertRaises(ValueError):
+            JsonlinesSink(shard_docs=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
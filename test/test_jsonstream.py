@@ -0,0 +1,43 @@
+import io
+import json
+import unittest
+from typing import List, Tuple
+
+from vulyk_ner.jsonstream import iter_array_items, min_depth_change
+
+
+class TestJsonStream(unittest.TestCase):
+    def _items(self, text: str, chunk_size: int) -> List[Tuple[int, object]]:
+        return [(array_no, json.loads(item)) for array_no, item in iter_array_items(io.StringIO(text), chunk_size)]
+
+    def test_items(self):
+        lines: List[list] = [
+            [{"text": "Тарас \"Шевченко\" ] }", "offsets": [[i, i + 1] for i in range(200)]}, {"a": {"b": [{}]}}],
+            [],
+            [{"escaped": "\\\\", "nested": [[[], {}], {"x": "[{"}]}],
+        ]
+        text: str = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines) + "\n"
+        expected: List[Tuple[int, object]] = [(n, item) for n, line in enumerate(lines) for item in line]
+
+        # Chunks of any size, including the ones that split escape sequences and strings
+        for chunk_size in [1, 2, 3, 5, 64, 1 << 20]:
+            self.assertEqual(expected, self._items(text, chunk_size))
+
+        # Pretty printed arrays work as well
+        self.assertEqual(expected[:2], self._items(json.dumps(lines[0], indent=2), 7))
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(iter_array_items(io.StringIO('[{"a": [1, 2'), 4))
+
+        with self.assertRaises(ValueError):
+            list(iter_array_items(io.StringIO('[{"a": "abc'), 4))
+
+    def test_min_depth_change(self):
+        self.assertEqual((0, 0), min_depth_change(": [[0, 5], [6, 10]], "))
+        self.assertEqual((-2, -1), min_depth_change("]}, {"))
+        self.assertEqual((0, 2), min_depth_change(": [[0, 5], ["))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from typing import Set
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT: str = """
+import runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    sys.stderr.write(" ".join(sys.modules))
+"""
+
+
+def loaded_modules(*args: str) -> Set[str]:
+    proc = subprocess.run(
+        [sys.executable, "-c", SCRIPT] + list(args),
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    return set(proc.stderr.decode("utf-8").split())
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_convert_doesnt_load_heavy_modules(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            modules: Set[str] = loaded_modules("bin/convert2vulyk.py", "-f", "json", "convert", f"{tmp}/*.json")
+
+        self.assertIn("vulyk_ner.brat", modules)
+        for name in ["tokenize_uk", "stanza", "spacy", "sqlite3", "urllib.request", "http.server", "multiprocessing"]:
+            self.assertNotIn(name, modules)
@@ -0,0 +1,114 @@
+import json
+import pathlib
+import tempfile
+import unittest
+from typing import List
+
+from bin.convert2vulyk import convert
+from vulyk_ner.files import JsonlinesSink, Manifest
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path: pathlib.Path = pathlib.Path(self.tmp.name)
+        self.manifest: str = str(self.path / "manifest.jsonlines")
+
+        for i in range(3):
+            (self.path / f"doc{i}.txt").write_text(f"Документ номер {i} .", encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _convert(self, run: int, realign_tokens: bool = False) -> List[str]:
+        output: pathlib.Path = self.path / f"run{run}.jsonlines"
+        convert(
+            str(self.path / "*.txt"),
+            "txt",
+            ignore_annotations=False,
+            ann_autodiscovery="replace",
+            realign_tokens=realign_tokens,
+            sink=JsonlinesSink(str(output)),
+            manifest=self.manifest,
+        )
+
+        return [json.loads(line)["text"] for line in output.read_text(encoding="utf-8").splitlines()]
+
+    def test_incremental(self):
+        self.assertEqual(["Документ номер 0 .", "Документ номер 1 .", "Документ номер 2 ."], self._convert(1))
+        self.assertEqual([], self._convert(2))
+
+        (self.path / "doc1.txt").write_text("Документ змінено .", encoding="utf-8")
+        (self.path / "doc3.txt").write_text("Новий документ .", encoding="utf-8")
+        self.assertEqual(["Документ змінено .", "Новий документ ."], self._convert(3))
+
+        # Annotations are part of the input as well
+        (self.path / "doc2.ann").write_text("T1 MISC 0 8 Документ", encoding="utf-8")
+        self.assertEqual(["Документ номер 2 ."], self._convert(4))
+
+    def test_settings_changed(self):
+        self.assertEqual(3, len(self._convert(1)))
+        self.assertEqual(["Документ номер 0.", "Документ номер 1.", "Документ номер 2."], self._convert(2, True))
+        self.assertEqual([], self._convert(3, True))
+
+    def test_commit(self):
+        source: pathlib.Path = self.path / "doc0.txt"
+
+        with JsonlinesSink(str(self.path / "out.jsonlines")) as out, Manifest(self.manifest, {}, commit_every=2) as done:
+            digest: str = done.digest(source)
+            self.assertFalse(done.is_done(source, digest))
+            # Manifests of the runs that hashed the files are still valid for the texts read into memory
+            self.assertEqual(digest, done.text_digest(source.read_text(encoding="utf-8")))
+
+            done.record(out, source, digest)
+            self.assertEqual(1, len(done.pending))
+
+            done.record(out, source, digest)
+            self.assertEqual(0, len(done.pending))
+            self.assertTrue(done.is_done(source, digest))
+
+        # Incomplete line, i.e after the crash
+        with open(self.manifest, "a") as fp:
+            fp.write('{"input": "doc')
+
+        with JsonlinesSink(str(self.path / "out.jsonlines")) as out, Manifest(self.manifest, {}) as done:
+            self.assertTrue(done.is_done(source, digest))
+            self.assertFalse(done.is_done(source, "other digest"))
+
+            done.record(out, self.path / "doc1.txt", "digest1")
+            done.commit(out)
+
+        with Manifest(self.manifest, {}) as done:
+            self.assertTrue(done.is_done(self.path / "doc1.txt", "digest1"))
+
+        # With commit_every=1 every record is committed at once, as if the run was killed right after it
+        out = JsonlinesSink(str(self.path / "out2.jsonlines"))
+        done = Manifest(self.manifest, {}, commit_every=1)
+        out.write({"id": 2})
+        done.record(out, self.path / "doc2.txt", "digest2")
+
+        with Manifest(self.manifest, {}) as resumed:
+            self.assertTrue(resumed.is_done(self.path / "doc2.txt", "digest2"))
+        self.assertEqual(1, len((self.path / "out2.jsonlines").read_text(encoding="utf-8").splitlines()))
+        done.close()
+        out.close()
+
+        # The rest of the records are committed on close, after the output is flushed
+        out = JsonlinesSink(str(self.path / "out3.jsonlines"))
+        with Manifest(self.manifest, {}) as done:
+            out.write({"id": 3})
+            done.record(out, self.path / "doc3.txt", "digest3")
+            self.assertEqual(1, len(done.pending))
+
+        self.assertEqual(1, len((self.path / "out3.jsonlines").read_text(encoding="utf-8").splitlines()))
+        out.close()
+
+        with Manifest(self.manifest, {}) as resumed:
+            self.assertTrue(resumed.is_done(self.path / "doc3.txt", "digest3"))
+
+        with Manifest(self.manifest, {"ner_model": "other"}) as done:
+            self.assertFalse(done.is_done(source, digest))
+
+
+if __name__ == "__main__":
+    unittest.main()
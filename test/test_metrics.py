@@ -0,0 +1,104 @@
+import json
+import pathlib
+import tempfile
+import time
+import unittest
+from typing import List
+
+from bin.convert2vulyk import convert
+from vulyk_ner.files import JsonlinesSink
+from vulyk_ner.metrics import Metrics, profiled
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path: pathlib.Path = pathlib.Path(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_stages(self):
+        metrics: Metrics = Metrics()
+
+        for _ in range(3):
+            with metrics.stage("convert"):
+                sum(range(10000))
+
+        self.assertEqual([1, 2, 3], list(metrics.timed("read", [1, 2, 3])))
+        metrics.count(documents=3, tokens=30)
+
+        summary: dict = metrics.summary()
+        self.assertEqual(3, summary["documents"])
+        self.assertEqual(30, summary["tokens"])
+        self.assertEqual(3, summary["stages"]["convert"]["calls"])
+        # One more call to find out that the items are over
+        self.assertEqual(4, summary["stages"]["read"]["calls"])
+        self.assertGreater(summary["stages"]["convert"]["wall"], 0)
+        self.assertGreater(summary["peak_rss_mb"], 0)
+
+    def test_timed_exclude(self):
+        metrics: Metrics = Metrics()
+
+        def slow_read():
+            for i in range(3):
+                with metrics.stage("read"):
+                    time.sleep(0.02)
+                yield i
+
+        self.assertEqual([0, 1, 2], list(metrics.timed("workers", slow_read(), exclude=("read",))))
+
+        summary: dict = metrics.summary()
+        self.assertGreaterEqual(summary["stages"]["read"]["wall"], 0.06)
+        self.assertLess(summary["stages"]["workers"]["wall"], 0.02)
+
+    def test_report(self):
+        metrics_path: pathlib.Path = self.path / "metrics.jsonlines"
+
+        # Progress line on every count
+        with Metrics(str(metrics_path), every=1e-9) as metrics:
+            metrics.count(documents=1)
+            metrics.count(documents=1)
+
+        lines: List[dict] = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+        self.assertEqual([False, False, True], [line["final"] for line in lines])
+        self.assertEqual([1, 2, 2], [line["documents"] for line in lines])
+
+    def test_convert(self):
+        for i in range(3):
+            (self.path / f"doc{i}.txt").write_text("Тарас писав вірші .\nДругий рядок .", encoding="utf-8")
+
+        metrics: Metrics = Metrics()
+        convert(
+            str(self.path / "*.txt"),
+            "txt",
+            ignore_annotations=True,
+            ann_autodiscovery="replace",
+            realign_tokens=False,
+            sink=JsonlinesSink(str(self.path / "out.jsonlines")),
+            metrics=metrics,
+        )
+
+        summary: dict = metrics.summary()
+        self.assertEqual(3, summary["documents"])
+        self.assertEqual(21, summary["tokens"])
+        self.assertEqual(["read", "tokenize", "convert", "write"], list(summary["stages"]))
+        self.assertEqual(3, summary["stages"]["tokenize"]["calls"])
+
+    def test_profiled(self):
+        prefix: str = str(self.path / "run")
+
+        with profiled(prefix):
+            [str(i) for i in range(1000)]
+
+        self.assertTrue((self.path / "run.prof").exists())
+        self.assertTrue((self.path / "run.tracemalloc.txt").read_text().startswith("Peak traced memory"))
+
+        with profiled(""):
+            pass
+
+        self.assertEqual(2, len(list(self.path.iterdir())))
+
+
+if __name__ == "__main__":
+    unittest.main()
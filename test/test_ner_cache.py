@@ -0,0 +1,79 @@
+import pathlib
+import tempfile
+import unittest
+from typing import List
+
+from vulyk_ner.ner import AbstractNER, CachedNER, NERCache
+
+
+class CountingNER(AbstractNER):
+    def __init__(self, model: str) -> None:
+        self.identity = f"counting:{model}"
+        self.tagged: List[str] = []
+
+    def tag_text(self, txt: str) -> str:
+        self.tagged.append(txt)
+        return f"T1\tPERS 0 {len(txt)}\t{txt}\n"
+
+
+class TestNERCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path: str = str(pathlib.Path(self.tmp.name) / "cache.sqlite")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_hits_and_misses(self):
+        model = CountingNER("test")
+        cache = NERCache(self.path)
+        cached = CachedNER(model, cache)
+
+        self.assertEqual(["T1\tPERS 0 4\tМама\n", "T1\tPERS 0 4\tРама\n"], cached.tag_batch(["Мама", "Рама"]))
+        self.assertEqual(["T1\tPERS 0 4\tРама\n", "T1\tPERS 0 4\tТато\n"], cached.tag_batch(["Рама", "Тато"]))
+        self.assertEqual(["Мама", "Рама", "Тато"], model.tagged)
+        self.assertEqual((1, 3), (cache.hits, cache.misses))
+        cache.close()
+
+        # Cache survives between the runs
+        model = CountingNER("test")
+        cache = NERCache(self.path)
+        self.assertEqual("T1\tPERS 0 4\tТато\n", CachedNER(model, cache).tag_text("Тато"))
+        self.assertEqual([], model.tagged)
+        cache.close()
+
+        # But not between the models
+        model = CountingNER("other")
+        cache = NERCache(self.path)
+        CachedNER(model, cache).tag_text("Тато")
+        self.assertEqual(["Тато"], model.tagged)
+        cache.close()
+
+    def test_eviction(self):
+        model = CountingNER("test")
+        entry_size: int = len(NERCache.key("", "")) + len(model.tag_text("Текст 00").encode("utf-8"))
+
+        cache = NERCache(self.path, max_bytes=entry_size * 5)
+        cached = CachedNER(model, cache)
+
+        for i in range(5):
+            cached.tag_text(f"Текст {i:02d}")
+
+        # Using the first one, so the second one is the least recently used now
+        cached.tag_text("Текст 00")
+        cached.tag_text("Текст 05")
+
+        self.assertLessEqual(cache.size, entry_size * 5)
+        self.assertEqual(cache.size, cache.db.execute("SELECT SUM(size) FROM ner_cache").fetchone()[0])
+
+        texts: List[str] = [f"Текст {i:02d}" for i in range(6)]
+        found = cache.get_many([cache.key(model.identity, txt) for txt in texts])
+        self.assertEqual(
+            ["Текст 00", "Текст 03", "Текст 04", "Текст 05"],
+            [txt for txt in texts if cache.key(model.identity, txt) in found],
+        )
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+from vulyk_ner.parallel import ordered_map
+
+
+class TestOrderedMap(unittest.TestCase):
+    def test_sequential(self):
+        self.assertEqual(["A", "B", "C"], list(ordered_map(str.upper, ["a", "b", "c"])))
+
+    def test_empty(self):
+        self.assertEqual([], list(ordered_map(str.upper, [], workers=2)))
+
+    def test_parallel_keeps_order(self):
+        data = [str(i) * (i % 7 + 1) for i in range(100)]
+        expected = list(map(len, data))
+
+        self.assertEqual(expected, list(ordered_map(len, data, workers=3)))
+        self.assertEqual(expected, list(ordered_map(len, data, workers=3, window=1)))
+        self.assertEqual(expected, list(ordered_map(len, iter(data), workers=2, window=5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import pathlib
+import tempfile
+import unittest
+
+from vulyk_ner.brat import BsfAttribute, BsfInfo, BsfNote, convert_bsf_2_vulyk, iter_bsf, parse_bsf, read_bsf
+
+
+class TestParseBsf(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual([], parse_bsf(""))
+        self.assertEqual([], parse_bsf("\n  \n"))
+
+    def test_entities(self):
+        data: str = "T1 ORG 10 15 Токен\nT2\tMISC 24 30\tДругий токен\n"
+        self.assertEqual(
+            [
+                BsfInfo("T1", "ORG", 10, 15, "Токен", ((10, 15),)),
+                BsfInfo("T2", "MISC", 24, 30, "Другий токен", ((24, 30),)),
+            ],
+            parse_bsf(data),
+        )
+
+    def test_discontinuous(self):
+        self.assertEqual(
+            [BsfInfo("T1", "LOC", 0, 21, "Києва міста", ((0, 5), (16, 21)))],
+            parse_bsf("T1\tLOC 0 5;16 21\tКиєва міста"),
+        )
+
+    def test_attributes_and_notes(self):
+        data: str = (
+            "T1\tPERS 0 5\tСлово\n"
+            "A1\tNegation T1\n"
+            "A2\tConfidence T1 Low\n"
+            "#1\tAnnotatorNotes T1\tце не людина\n"
+            "R1\tOrigin Arg1:T1 Arg2:T2\n"
+            "T2\tORG 6 9\tРНБО\n"
+        )
+        self.assertEqual(
+            [
+                BsfInfo("T1", "PERS", 0, 5, "Слово", ((0, 5),)),
+                BsfAttribute("A1", "Negation", "T1", ""),
+                BsfAttribute("A2", "Confidence", "T1", "Low"),
+                BsfNote("#1", "AnnotatorNotes", "T1", "це не людина"),
+                BsfInfo("T2", "ORG", 6, 9, "РНБО", ((6, 9),)),
+            ],
+            list(iter_bsf(data.splitlines())),
+        )
+        self.assertEqual(["Слово", "РНБО"], [e.token for e in parse_bsf(data)])
+
+    def test_multiline_entity_text(self):
+        self.assertEqual(
+            [BsfInfo("T1", "MISC", 0, 11, "Перша\nдруга", ((0, 11),)), BsfInfo("T2", "ORG", 12, 14, "ГО", ((12, 14),))],
+            parse_bsf("T1 MISC 0 11 Перша\nдруга\nT2 ORG 12 14 ГО"),
+        )
+
+    def test_read_bsf(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ann: pathlib.Path = pathlib.Path(tmp) / "test.ann"
+            ann.write_text("T1\tPERS 0 5\tСлово\n#1\tAnnotatorNotes T1\tнотатка\n", encoding="utf-8")
+
+            self.assertEqual(
+                [BsfInfo("T1", "PERS", 0, 5, "Слово", ((0, 5),)), BsfNote("#1", "AnnotatorNotes", "T1", "нотатка")],
+                list(read_bsf(ann)),
+            )
+
+    def test_discontinuous_conversion(self):
+        data = [["Житель", "Києва", ",", "міста", "-", "героя"]]
+        result = convert_bsf_2_vulyk(data, "T1\tLOC 7 12;15 20\tКиєва міста", compensate_for_offsets=True)
+        self.assertEqual([["T1", "LOC", [(7, 12), (14, 19)]]], result["entities"])
+        self.assertEqual(["Києва", "міста"], [result["text"][i1:i2] for i1, i2 in result["entities"][0][2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
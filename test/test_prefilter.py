@@ -0,0 +1,95 @@
+import pathlib
+import tempfile
+import unittest
+from typing import List
+
+from vulyk_ner.brat import convert_bsf_2_vulyk
+from vulyk_ner.gazetteer import GazetteerNER
+from vulyk_ner.ner import AbstractNER, spans_to_brat, words_and_offsets
+from vulyk_ner.prefilter import PrefilteredNER, SentenceFilter, sentence_starts
+
+
+class CapitalizedNER(AbstractNER):
+    """
+    Tags every capitalized word as PERS and remembers the sentences it has seen
+    """
+    def __init__(self, model: str) -> None:
+        self.identity = f"capitalized:{model}"
+        self.seen: List[List[str]] = []
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        result: List[str] = []
+
+        for doc in docs:
+            self.seen.extend(doc)
+            sentences, offsets = words_and_offsets(doc)
+            words: List[str] = [w for s in sentences for w in s]
+            result.append(spans_to_brat([("PERS", i, i + 1) for i, w in enumerate(words) if w[0].isupper()], words, offsets))
+
+        return result
+
+
+class TestSentenceFilter(unittest.TestCase):
+    def test_heuristics(self):
+        sentence_filter = SentenceFilter(max_digit_share=0.5)
+
+        self.assertTrue(sentence_filter.keep(["Мама", "мила", "раму", "."]))
+        self.assertTrue(sentence_filter.keep(["рік", "2022", "у", "Києві"]))
+        self.assertFalse(sentence_filter.keep(["мама", "мила", "раму", "."]))
+        self.assertFalse(sentence_filter.keep(["12", "345", "67", "Всього"]))
+        self.assertFalse(sentence_filter.keep(["---", "*", "."]))
+        self.assertFalse(sentence_filter.keep(["", " "]))
+        self.assertTrue(SentenceFilter(require_capitalized=False).keep(["мама", "мила", "раму"]))
+
+    def test_gazetteer(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "names.tsv"
+            path.write_text("ромашка\tORG\n", encoding="utf-8")
+
+            sentence_filter = SentenceFilter(gazetteer=GazetteerNER(str(path)))
+            self.assertTrue(sentence_filter.keep(["купили", "в", "ромашка"]))
+            self.assertFalse(sentence_filter.keep(["купили", "в", "ромашці"]))
+            self.assertNotEqual(SentenceFilter().identity, sentence_filter.identity)
+
+
+class TestPrefilteredNER(unittest.TestCase):
+    def test_sentence_starts(self):
+        tokenized: List[List[str]] = [["Мама", "мила"], [], ["раму", "."]]
+        text: str = convert_bsf_2_vulyk(tokenized, "")["text"]
+
+        self.assertEqual([0, 10, 11], sentence_starts(tokenized))
+        self.assertEqual("раму", text[11:15])
+        self.assertEqual([], sentence_starts([]))
+
+    def test_rejected_sentences_have_no_entities(self):
+        model = CapitalizedNER("test")
+        prefiltered = PrefilteredNER(model, SentenceFilter())
+        docs: List[List[List[str]]] = [
+            [["Тато", "і", "Мама", "."], ["10", "23", "45", "Разом"], ["рама", "біла"], ["Київ", "та", "Львів"]],
+            [["12", "%"], ["рама"]],
+            [],
+        ]
+
+        markups: List[str] = prefiltered.tag_tokenized_batch(docs)
+
+        self.assertEqual(
+            [["Тато", "і", "Мама", "."], ["Київ", "та", "Львів"]],
+            model.seen,
+        )
+        vulyk: dict = convert_bsf_2_vulyk(docs[0], markups[0])
+        self.assertEqual(
+            ["Тато", "Мама", "Київ", "Львів"],
+            [vulyk["text"][spans[0][0] : spans[0][1]] for _, _, spans in vulyk["entities"]],
+        )
+        self.assertEqual(["", ""], markups[1:])
+
+        self.assertEqual((6, 4), (prefiltered.sentences, prefiltered.skipped))
+        self.assertTrue(prefiltered.chars_skipped > 0)
+
+        with self.assertLogs("vulyk_ner.prefilter", level="INFO") as cm:
+            prefiltered.close()
+        self.assertIn("skipped 4 of 6 sentences (66.7%)", cm.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
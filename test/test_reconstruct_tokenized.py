@@ -1,6 +1,6 @@
 import unittest
 from typing import List, Tuple
-from bin.convert2vulyk import reconstruct_tokenized, AlignedToken
+from vulyk_ner.text import align_tokenized, reconstruct_tokenized, AlignedToken
 
 
 class TestReconstructTokenized(unittest.TestCase):
@@ -314,5 +314,38 @@ class TestReconstructTokenized(unittest.TestCase):
         )
 
 
+class TestAlignTokenized(unittest.TestCase):
+    def test_empty_tokenized(self):
+        text, orig_offsets, new_offsets = align_tokenized([])
+        self.assertEqual("", text)
+        self.assertEqual([], orig_offsets.tolist())
+        self.assertEqual([], new_offsets.tolist())
+
+    def test_offsets(self):
+        data: List[List[str]] = [["Мамо", ",", " ", "навіщо ", "!"], ["(", "рама", ")"]]
+        text, orig_offsets, new_offsets = align_tokenized(data)
+
+        self.assertEqual("Мамо, навіщо!\n(рама)", text)
+        self.assertEqual([0, 4, 4, 5, 5, 6, 6, 12, 12, 13, 13, 14, 14, 15, 15, 19, 19, 20], new_offsets.tolist())
+        self.assertEqual(len(orig_offsets), len(new_offsets))
+
+    def test_same_as_reconstruct_tokenized(self):
+        data: List[List[str]] = [["Мамо", ",", " ", "навіщо ", "!", "?"], ["«", "Адже", "»", "рама", "була", "біла", "."]]
+        text, orig_offsets, new_offsets = align_tokenized(data)
+
+        self.assertEqual(
+            list(reconstruct_tokenized(data)),
+            [
+                AlignedToken(
+                    text[new_offsets[i] : new_offsets[i + 1]],
+                    (orig_offsets[i], orig_offsets[i + 1]),
+                    (new_offsets[i], new_offsets[i + 1]),
+                )
+                for i in range(0, len(new_offsets), 2)
+            ],
+        )
+        self.assertEqual("".join(map(str, reconstruct_tokenized(data))), text)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,36 @@
+import pathlib
+import unittest
+from typing import List
+
+from vulyk_ner.files import in_shard, parse_shard
+
+
+class TestShard(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual((0, 4), parse_shard("0/4"))
+        self.assertEqual((3, 4), parse_shard("3/4"))
+
+        for bad in ["4/4", "-1/4", "1/0", "1", "a/b", "1/2/3"]:
+            with self.assertRaises(ValueError):
+                parse_shard(bad)
+
+    def test_partition(self):
+        paths: List[str] = [f"corpus/doc{i:04d}.txt" for i in range(1000)]
+        shards: List[List[str]] = [[p for p in paths if in_shard(p, (i, 4))] for i in range(4)]
+
+        # Every file goes to exactly one shard and shards are roughly even
+        self.assertEqual(sorted(paths), sorted(p for shard in shards for p in shard))
+        for shard in shards:
+            self.assertTrue(200 < len(shard) < 300)
+
+    def test_stable(self):
+        self.assertTrue(all(in_shard(f"doc{i}.txt", None) for i in range(10)))
+        self.assertEqual(in_shard("corpus/doc1.txt", (1, 3)), in_shard(pathlib.Path("corpus/doc1.txt"), (1, 3)))
+        # Hash doesn't depend on the process (unlike built-in hash of str)
+        self.assertEqual(
+            [2, 2, 1, 0, 2], [next(i for i in range(3) if in_shard(f"doc{n}.txt", (i, 3))) for n in range(5)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from bin.convert2vulyk import simple_tokenizer
+from vulyk_ner.text import simple_tokenizer
 
 
 class TestSimpleTokenizer(unittest.TestCase):
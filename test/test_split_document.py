@@ -0,0 +1,85 @@
+import unittest
+from typing import List
+
+from vulyk_ner.brat import convert_bsf_2_vulyk, split_document
+from vulyk_ner.text import simple_tokenizer
+
+
+class TestSplitDocument(unittest.TestCase):
+    def setUp(self) -> None:
+        text: str = "Перше речення про Київ .\nДруге , про Львів .\nТретє .\nЧетверте про ООН і Ко ."
+        markup: str = "\n".join(
+            f"T{i + 1} {tag} {text.index(ent)} {text.index(ent) + len(ent)} {ent}"
+            for i, (tag, ent) in enumerate([("LOC", "Київ"), ("LOC", "Львів"), ("ORG", "ООН"), ("ORG", "і Ко")])
+        )
+        self.doc: dict = convert_bsf_2_vulyk(simple_tokenizer(text), markup, compensate_for_offsets=True)
+
+    def _words(self, doc: dict) -> List[str]:
+        return [doc["text"][i1:i2] for i1, i2 in doc["token_offsets"]]
+
+    def _sentences(self, doc: dict) -> List[str]:
+        return [doc["text"][i1:i2] for i1, i2 in doc["sentence_offsets"]]
+
+    def _entities(self, doc: dict) -> List[str]:
+        return [doc["text"][i1:i2] for _, _, ent in doc["entities"] for i1, i2 in ent]
+
+    def test_no_split(self):
+        chunks: List[dict] = split_document(self.doc, "doc.txt", max_sentences=10)
+        self.assertEqual(1, len(chunks))
+        self.assertEqual(self.doc["text"], chunks[0]["text"])
+        self.assertEqual(self.doc["entities"], chunks[0]["entities"])
+        self.assertEqual(
+            ("doc.txt", 0, 1), (chunks[0]["parent_document"], chunks[0]["chunk_index"], chunks[0]["chunks_total"])
+        )
+
+    def test_max_sentences(self):
+        chunks: List[dict] = split_document(self.doc, "doc.txt", max_sentences=2)
+        self.assertEqual(
+            ["Перше речення про Київ.\nДруге, про Львів.", "Третє.\nЧетверте про ООН і Ко."], [c["text"] for c in chunks]
+        )
+        self.assertEqual(
+            [["Перше речення про Київ.", "Друге, про Львів."], ["Третє.", "Четверте про ООН і Ко."]],
+            [self._sentences(c) for c in chunks],
+        )
+        self.assertEqual([["Київ", "Львів"], ["ООН", "і Ко"]], [self._entities(c) for c in chunks])
+        self.assertEqual(self._words(self.doc), sum((self._words(c) for c in chunks), []))
+        self.assertEqual([0, 1], [c["chunk_index"] for c in chunks])
+        self.assertEqual([2, 2], [c["chunks_total"] for c in chunks])
+        self.assertEqual(["T3", "T4"], [e[0] for e in chunks[1]["entities"]])
+
+    def test_max_chars(self):
+        chunks: List[dict] = split_document(self.doc, "doc.txt", max_chars=30)
+        self.assertEqual(
+            [["Перше речення про Київ."], ["Друге, про Львів.", "Третє."], ["Четверте про ООН і Ко."]],
+            [self._sentences(c) for c in chunks],
+        )
+        self.assertEqual([["Київ"], ["Львів"], ["ООН", "і Ко"]], [self._entities(c) for c in chunks])
+
+    def test_discontinuous_entity(self):
+        doc: dict = dict(self.doc)
+        kyiv: List[int] = self.doc["entities"][0][2][0]
+        oon: List[int] = self.doc["entities"][2][2][0]
+        # Київ ... ООН as one entity of two fragments, which end up in different chunks
+        doc["entities"] = [["T1", "ORG", [kyiv, oon]]] + self.doc["entities"][1:]
+
+        with self.assertLogs("vulyk_ner.brat", "WARNING"):
+            chunks: List[dict] = split_document(doc, "doc.txt", max_sentences=2)
+
+        self.assertEqual([["Київ", "Львів"], ["ООН", "ООН", "і Ко"]], [self._entities(c) for c in chunks])
+        for chunk in chunks:
+            for _, _, fragments in chunk["entities"]:
+                for start, end in fragments:
+                    self.assertTrue(0 <= start < end <= len(chunk["text"]))
+
+    def test_long_sentence(self):
+        chunks: List[dict] = split_document(self.doc, "doc.txt", max_chars=5)
+        self.assertEqual(4, len(chunks))
+        self.assertEqual(self._sentences(self.doc), sum((self._sentences(c) for c in chunks), []))
+
+    def test_empty(self):
+        chunks: List[dict] = split_document(convert_bsf_2_vulyk([], ""), "empty.txt", max_sentences=2)
+        self.assertEqual([""], [c["text"] for c in chunks])
+
+
+if __name__ == "__main__":
+    unittest.main()
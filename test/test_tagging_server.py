@@ -0,0 +1,75 @@
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from vulyk_ner.ner import AbstractNER, RemoteNER
+from vulyk_ner.server import TaggingServer
+
+
+class UpperNER(AbstractNER):
+    def __init__(self, model: str) -> None:
+        self.model = model
+
+    def tag_text(self, txt: str) -> str:
+        if txt == "boom":
+            raise RuntimeError("model is broken")
+
+        return f"T1\tPERS 0 {len(txt)}\t{txt.upper()}\n"
+
+
+class TestTaggingServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = TaggingServer(("127.0.0.1", 0), UpperNER("test"), {"ner_framework": "fake", "ner_model": "test"})
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_remote_batch(self):
+        model = RemoteNER(self.url)
+        self.assertEqual(
+            ["T1\tPERS 0 4\tМАМА\n", "T1\tPERS 0 9\tРАМА БІЛА\n"], model.tag_batch(["мама", "рама біла"])
+        )
+        self.assertEqual([], model.tag_batch([]))
+        self.assertEqual("T1\tPERS 0 4\tМАМА\n", model.tag_text("мама"))
+
+    def test_remote_tokenized_batch(self):
+        model = RemoteNER(self.url)
+        self.assertEqual(
+            ["T1\tPERS 0 11\tМАМА, ТАТО\n", "T1\tPERS 0 4\tРАМА\n"],
+            model.tag_tokenized_batch([[["мама", ",", "тато"]], [["рама"]]]),
+        )
+        self.assertEqual([], model.tag_tokenized_batch([]))
+
+    def test_bad_request(self):
+        req = urllib.request.Request(self.url + "/tag", data=b'{"text": "oops"}')
+
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            urllib.request.urlopen(req)
+
+        self.assertEqual(400, cm.exception.code)
+
+        for payload in [b'[1, 2]', b'{"texts": "oops"}', b'{"texts": [1]}', b'{"documents": ["oops"]}', b"not json"]:
+            with self.assertRaises(urllib.error.HTTPError) as cm:
+                urllib.request.urlopen(urllib.request.Request(self.url + "/tag", data=payload))
+
+            self.assertEqual(400, cm.exception.code)
+
+    def test_model_error(self):
+        req = urllib.request.Request(self.url + "/tag", data=b'{"texts": ["boom"]}')
+
+        with self.assertLogs("vulyk_ner.server", "ERROR"), self.assertRaises(urllib.error.HTTPError) as cm:
+            urllib.request.urlopen(req)
+
+        self.assertEqual(500, cm.exception.code)
+        self.assertIn("model is broken", json.loads(cm.exception.read().decode("utf-8"))["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
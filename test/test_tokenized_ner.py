@@ -0,0 +1,149 @@
+import pathlib
+import tempfile
+import unittest
+from typing import List
+
+from vulyk_ner.brat import convert_bsf_2_vulyk
+from vulyk_ner.ner import AbstractNER, CachedNER, NERCache, drop_overlapping, spans_to_brat, words_and_offsets
+
+try:
+    import spacy  # type: ignore
+except ImportError:
+    spacy = None
+
+
+class CapitalizedNER(AbstractNER):
+    """
+    Tags every capitalized word of the text as PERS
+    """
+    def __init__(self, model: str) -> None:
+        self.identity = f"capitalized:{model}"
+        self.tagged: List[str] = []
+
+    def tag_text(self, txt: str) -> str:
+        self.tagged.append(txt)
+        brat_str: str = ""
+        pos: int = 0
+
+        for word in txt.replace("\n", " ").split(" "):
+            name: str = word.rstrip(",.!?")
+            if name[:1].isupper():
+                brat_str += f"T{brat_str.count(chr(10)) + 1}\tPERS {pos} {pos + len(name)}\t{name}\n"
+            pos += len(word) + 1
+
+        return brat_str
+
+
+def entity_texts(tokenized: List[List[str]], markup: str) -> List[str]:
+    vulyk: dict = convert_bsf_2_vulyk(tokenized, markup)
+    return [vulyk["text"][start:end] for _, _, spans in vulyk["entities"] for start, end in spans]
+
+
+class TestWordsAndOffsets(unittest.TestCase):
+    def test_blank_tokens(self):
+        sentences, offsets = words_and_offsets([["Мама", "", "мила "], [" "], ["раму", "."]])
+
+        self.assertEqual([["Мама", "мила"], ["раму", "."]], sentences)
+        self.assertEqual([0, 4, 6, 11, 14, 18, 19, 20], offsets.tolist())
+
+    def test_spans_to_brat(self):
+        tokenized: List[List[str]] = [["Мама", "мила", "раму"], ["Тато", "Петро", "."]]
+        sentences, offsets = words_and_offsets(tokenized)
+        markup: str = spans_to_brat([("PERS", 0, 1), ("PERS", 3, 5)], [w for s in sentences for w in s], offsets)
+
+        self.assertEqual("T1\tPERS 0 4\tМама\nT2\tPERS 15 25\tТато Петро\n", markup)
+        self.assertEqual(["Мама", "Тато Петро"], entity_texts(tokenized, markup))
+
+
+class TestDropOverlapping(unittest.TestCase):
+    def test_drop_overlapping(self):
+        self.assertEqual(
+            [("PERS", 0, 3), ("LOC", 3, 4), ("ORG", 5, 6)],
+            drop_overlapping([("ORG", 5, 6), ("LOC", 3, 4), ("PERS", 0, 1), ("PERS", 0, 3), ("LOC", 2, 4)]),
+        )
+
+
+class TestTagTokenized(unittest.TestCase):
+    def test_default_realigns_offsets(self):
+        # Model sees normalized "Мама, Тато\nРама.", while the text of vulyk task is "Мама , Тато\nРама ."
+        tokenized: List[List[str]] = [["Мама", ",", "Тато"], ["Рама", "."]]
+        model = CapitalizedNER("test")
+
+        markups: List[str] = model.tag_tokenized_batch([tokenized])
+        self.assertEqual(["Мама, Тато\nРама."], model.tagged)
+        self.assertEqual(["Мама", "Тато", "Рама"], entity_texts(tokenized, markups[0]))
+
+    def test_cached(self):
+        tokenized: List[List[str]] = [["Мама", ",", "Тато"], ["Рама", "."]]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model = CapitalizedNER("test")
+            cache = NERCache(str(pathlib.Path(tmp) / "cache.sqlite"))
+            cached = CachedNER(model, cache)
+
+            first: List[str] = cached.tag_tokenized_batch([tokenized])
+            self.assertEqual(first, cached.tag_tokenized_batch([tokenized]))
+            self.assertEqual(1, len(model.tagged))
+
+            # Same text, but not tokenized, is cached on its own
+            cached.tag_batch(["Мама, Тато\nРама."])
+            self.assertEqual(2, len(model.tagged))
+            cache.close()
+
+
+@unittest.skipUnless(spacy is not None, "spacy is not installed")
+class TestSpacyTokenized(unittest.TestCase):
+    def setUp(self) -> None:
+        from vulyk_ner.ner import SpacyNER
+
+        self.tmp = tempfile.TemporaryDirectory()
+
+        nlp = spacy.blank("xx")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([{"label": "LOC", "pattern": [{"ORTH": "Нью"}, {"ORTH": "-"}, {"ORTH": "Йорк"}]}])
+        nlp.to_disk(self.tmp.name)
+
+        self.model = SpacyNER(self.tmp.name)
+        self.windowed = SpacyNER(self.tmp.name, window_sentences=3, window_overlap=1)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_tokens_are_kept(self):
+        tokenized: List[List[str]] = [["Їдемо", "в", "Нью", "-", "Йорк", "."], ["", "Нью", "-", "Йорк", "!"]]
+
+        doc = self.model.make_doc(tokenized)
+        self.assertEqual(["Їдемо", "в", "Нью", "-", "Йорк", ".", "Нью", "-", "Йорк", "!"], [t.text for t in doc])
+        self.assertEqual("Їдемо в Нью - Йорк. Нью - Йорк!", doc.text)
+        self.assertEqual([True, False, False, False, False, False, True, False, False, False], [t.is_sent_start for t in doc])
+
+        markups: List[str] = self.model.tag_tokenized_batch([tokenized, [["Йорк"]]])
+        self.assertEqual(["Нью - Йорк", "Нью - Йорк"], entity_texts(tokenized, markups[0]))
+        self.assertEqual("", markups[1])
+
+    def test_windows(self):
+        self.assertEqual([(0, 3), (2, 5), (4, 7), (6, 8)], self.windowed.windows(8))
+        self.assertEqual([(0, 2)], self.windowed.windows(2))
+        self.assertEqual([], self.windowed.windows(0))
+        # Shared sentences belong to the window where they aren't at the edge, ties go to the earlier window
+        self.assertEqual([0, 0, 0, 2, 2, 4, 4, 6], self.windowed.window_owners(8))
+
+    def test_windows_match_whole_document(self):
+        tokenized: List[List[str]] = [["Нью", "-", "Йорк", "?"] if i % 3 else ["Так", "."] for i in range(10)]
+        tokenized[4] = ["Нью", "-", "Йорк", "і", "Нью", "-", "Йорк"]
+
+        self.assertNotEqual(self.model.identity, self.windowed.identity)
+
+        markups: List[str] = self.windowed.tag_tokenized_batch([tokenized, [], tokenized[:2]])
+        self.assertEqual(self.model.tag_tokenized_batch([tokenized, [], tokenized[:2]]), markups)
+        self.assertEqual(7, markups[0].count("\n"))
+
+    def test_bad_overlap(self):
+        from vulyk_ner.ner import SpacyNER
+
+        with self.assertRaises(ValueError):
+            SpacyNER(self.tmp.name, window_sentences=2, window_overlap=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,264 @@
+import gzip
+import json
+import pathlib
+import tempfile
+import unittest
+from typing import Dict, List, Tuple
+
+from bin.convert_vulyk2iob import convert_answer, parse_jsonlines
+from vulyk_ner.brat import convert_bsf_2_vulyk
+from vulyk_ner.files import ExportState
+from vulyk_ner.iob import IobFilesSink, IobIndexEntry, read_iob_document, read_iob_index, unpack_iob_stream
+
+
+def make_answer(task_id: str, user: str, sentences: int) -> dict:
+    doc: List[List[str]] = [["Тарас", "писав", "у", "Києві", "."] for _ in range(sentences)]
+    markup: str = "".join(
+        f"T{i + 1}\tPERS {i * 22} {i * 22 + 5}\tТарас\nT{i + 100}\tLOC {i * 22 + 14} {i * 22 + 19}\tКиєві\n"
+        for i in range(sentences)
+    )
+
+    return {
+        "answer": convert_bsf_2_vulyk(doc, markup, compensate_for_offsets=False),
+        "task": {"id": task_id},
+        "user": {"username": user},
+    }
+
+
+class TestVulyk2Iob(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path: pathlib.Path = pathlib.Path(self.tmp.name)
+
+        # Few giant lines, as in the real exports
+        self.lines: List[List[dict]] = [
+            [make_answer(f"task{line}_{i}", user, i % 7 + 1) for i in range(20) for user in ["a@b.c", "d"]]
+            for line in range(3)
+        ]
+
+        with gzip.open(self.path / "batch.jsonlines.gz", "wt", encoding="utf-8") as fp:
+            for line in self.lines:
+                fp.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _export(self, name: str, **kwargs) -> Dict[str, str]:
+        output_dir: pathlib.Path = self.path / name
+        output_dir.mkdir()
+        parse_jsonlines(self.path / "batch.jsonlines.gz", output_dir, **kwargs)
+
+        return {
+            str(p.relative_to(output_dir)): p.read_text(encoding="utf-8") for p in output_dir.rglob("*.iob")
+        }
+
+    def test_parallel(self):
+        sequential: Dict[str, str] = self._export("sequential")
+
+        self.assertEqual(120, len(sequential))
+        self.assertEqual(
+            convert_answer(self.lines[1][5]["answer"]), sequential["batch/d/task1_2.iob"]
+        )
+        self.assertIn("Тарас B-PERS", sequential["batch/a_b_c/task0_0.iob"])
+
+        self.assertEqual(sequential, self._export("parallel", workers=2, reorder_window=3))
+
+    def test_incremental(self):
+        state_dir: pathlib.Path = self.path / "state"
+        state_dir.mkdir()
+
+        with self.assertLogs("vulyk_ner.files", "INFO") as cm:
+            first: Dict[str, str] = self._export("first", state_dir=state_dir)
+        self.assertEqual(120, len(first))
+        self.assertIn("120 new, 0 changed and 0 unchanged answers", cm.output[-1])
+
+        # Nothing to do
+        with self.assertLogs("vulyk_ner.files", "INFO") as cm:
+            self.assertEqual({}, self._export("second", state_dir=state_dir))
+        self.assertIn("0 new, 0 changed and 120 unchanged answers", cm.output[-1])
+
+        # One answer is fixed and one more is added
+        self.lines[1][5]["answer"]["entities"] = []
+        self.lines[2].append(make_answer("task_new", "d", 2))
+        with gzip.open(self.path / "batch.jsonlines.gz", "wt", encoding="utf-8") as fp:
+            for line in self.lines:
+                fp.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+        with self.assertLogs("vulyk_ner.files", "INFO") as cm:
+            third: Dict[str, str] = self._export("third", state_dir=state_dir)
+        self.assertEqual(["batch/d/task1_2.iob", "batch/d/task_new.iob"], sorted(third))
+        self.assertNotIn(" B-", third["batch/d/task1_2.iob"])
+        self.assertIn("1 new, 1 changed and 119 unchanged answers", cm.output[-1])
+
+        self.assertEqual(122, len((state_dir / "batch.state.tsv").read_text(encoding="utf-8").splitlines()))
+
+    def test_incremental_chunks(self):
+        state_dir: pathlib.Path = self.path / "state"
+        state_dir.mkdir()
+
+        chunks: List[dict] = [make_answer(f"doc_{i}", "d", 2) for i in range(2)]
+        for i, chunk in enumerate(chunks):
+            chunk["answer"].update(parent_document="doc.txt", chunk_index=i, chunks_total=2)
+        self.lines[0].extend(chunks)
+
+        def export(name: str) -> Tuple[Dict[str, str], str]:
+            with gzip.open(self.path / "batch.jsonlines.gz", "wt", encoding="utf-8") as fp:
+                for line in self.lines:
+                    fp.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+            with self.assertLogs("vulyk_ner.files", "INFO") as cm:
+                files: Dict[str, str] = self._export(name, state_dir=state_dir)
+            return files, cm.output[-1]
+
+        files, summary = export("first")
+        self.assertEqual(121, len(files))
+        self.assertIn("122 new, 0 changed and 0 unchanged answers", summary)
+
+        # Document is not written again while none of its chunks have changed
+        files, summary = export("second")
+        self.assertEqual({}, files)
+        self.assertIn("0 new, 0 changed and 122 unchanged answers", summary)
+
+        # Both chunks are joined again when one of them has changed
+        chunks[1]["answer"]["entities"] = []
+        files, summary = export("third")
+        self.assertEqual(["batch/d/doc.txt.iob"], list(files))
+        self.assertEqual(2, files["batch/d/doc.txt.iob"].count("Тарас B-PERS"))
+        self.assertIn("0 new, 2 changed and 120 unchanged answers", summary)
+
+    def test_state_commit(self):
+        state_dir: pathlib.Path = self.path / "state"
+        state_dir.mkdir()
+
+        with IobFilesSink(self.path / "batch") as sink, ExportState(state_dir, "batch", commit_every=2) as state:
+            state.record(sink, "d", "task1", "abc")
+            self.assertEqual("", (state_dir / "batch.state.tsv").read_text(encoding="utf-8"))
+
+            # Committed in chunks, so the answers are not converted again if the run is killed now
+            state.record(sink, "d", "task2", "abd")
+            self.assertEqual(2, len((state_dir / "batch.state.tsv").read_text(encoding="utf-8").splitlines()))
+
+            # The rest is committed on close
+            state.record(sink, "d", "task3", "abe")
+
+        self.assertEqual(3, len((state_dir / "batch.state.tsv").read_text(encoding="utf-8").splitlines()))
+
+        state = ExportState(state_dir, "batch")
+        self.assertTrue(state.is_known("abc"))
+        self.assertTrue(state.is_unchanged("d", "task1", "abc"))
+        self.assertFalse(state.is_unchanged("a_b_c", "task1", "abc"))
+        state.close()
+
+    def test_overlaps(self):
+        answer: dict = {
+            "text": "Тарас Шевченко жив у Києві",
+            "sentence_offsets": [[0, 26]],
+            "token_offsets": [[0, 5], [6, 14], [15, 18], [19, 20], [21, 26]],
+            # Nested entity and the longer one that crosses both
+            "entities": [["T1", "PERS", [[0, 14]]], ["T2", "ORG", [[6, 14]]], ["T3", "MISC", [[6, 26]]]],
+        }
+
+        self.assertEqual(
+            "Тарас B-PERS\nШевченко I-PERS\nжив O\nу O\nКиєві O", convert_answer(answer, "first")
+        )
+        self.assertEqual(
+            "Тарас O\nШевченко B-MISC\nжив I-MISC\nу I-MISC\nКиєві I-MISC", convert_answer(answer, "longest")
+        )
+        self.assertEqual(
+            "Тарас B-PERS O O\nШевченко I-PERS B-MISC B-ORG\nжив O I-MISC O\nу O I-MISC O\nКиєві O I-MISC O",
+            convert_answer(answer, "layers"),
+        )
+
+        with self.assertRaises(ValueError):
+            convert_answer(answer, "shortest")
+
+    def test_partial_tokens(self):
+        answer: dict = {
+            "text": "Тарас Шевченко жив у Києві",
+            "sentence_offsets": [[0, 26]],
+            "token_offsets": [[0, 5], [6, 14], [15, 18], [19, 20], [21, 26]],
+            # Entity that starts in the middle of the token and the one that starts in the whitespace
+            "entities": [["T1", "PERS", [[9, 18]]], ["T2", "LOC", [[20, 26]]]],
+        }
+
+        self.assertEqual("Тарас O\nШевченко O\nжив B-PERS\nу O\nКиєві B-LOC", convert_answer(answer))
+
+        # Entity within the token doesn't tag anything
+        answer["entities"] = [["T1", "PERS", [[7, 10]]]]
+        self.assertEqual("Тарас O\nШевченко O\nжив O\nу O\nКиєві O", convert_answer(answer))
+
+    def test_overlaps_large(self):
+        answer: dict = make_answer("task", "user", 5000)["answer"]
+        iob: str = convert_answer(answer)  # type: ignore
+
+        # Nothing overlaps, so the policies agree
+        self.assertEqual(10000, iob.count(" B-"))
+        self.assertEqual(iob, convert_answer(answer, "longest"))
+        self.assertEqual(iob, convert_answer(answer, "layers"))
+
+        # Wider entity over each of the persons: "Тарас писав"
+        wide: dict = dict(answer)
+        wide["entities"] = answer["entities"] + [
+            [f"{ent[0]}w", "MISC", [[ent[2][0][0], ent[2][0][1] + 6]]] for ent in answer["entities"] if ent[1] == "PERS"
+        ]
+
+        for overlap in ["first", "longest"]:
+            flat: str = convert_answer(wide, overlap)  # type: ignore
+            self.assertEqual(0, flat.count("B-PERS"))
+            self.assertEqual(5000, flat.count("Тарас B-MISC\nписав I-MISC\n"))
+            self.assertEqual(5000, flat.count("Києві B-LOC"))
+
+        layers: List[str] = convert_answer(wide, "layers").split("\n")  # type: ignore
+        self.assertEqual(5000, layers.count("Тарас B-MISC B-PERS"))
+        self.assertEqual(5000, layers.count("писав I-MISC O"))
+        self.assertEqual(5000, layers.count("Києві B-LOC O"))
+        self.assertEqual(len(iob.split("\n")), len(layers))
+
+    def test_malformed_answer(self):
+        self.lines[0].insert(3, {"answer": self.lines[0][0]["answer"], "user": {"username": "d"}})
+        with gzip.open(self.path / "batch.jsonlines.gz", "wt", encoding="utf-8") as fp:
+            for line in self.lines:
+                fp.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+        with self.assertLogs("__main__" if __name__ == "__main__" else "bin.convert_vulyk2iob", "WARNING"):
+            self.assertEqual(120, len(self._export("parallel", workers=2)))
+
+    def test_stream(self):
+        files: Dict[str, str] = self._export("files")
+
+        stream_dir: pathlib.Path = self.path / "stream"
+        stream_dir.mkdir()
+        parse_jsonlines(
+            self.path / "batch.jsonlines.gz", stream_dir, output_format="stream", compression=".gz", shard_docs=50
+        )
+
+        self.assertEqual(
+            ["batch.00000.iob.gz", "batch.00001.iob.gz", "batch.00002.iob.gz", "batch.index.tsv"],
+            sorted(p.name for p in stream_dir.iterdir()),
+        )
+
+        # Random access by the index
+        index: Dict[Tuple[str, str], IobIndexEntry] = read_iob_index(stream_dir / "batch.index.tsv")
+        self.assertEqual(120, len(index))
+        self.assertEqual(
+            files["batch/d/task1_2.iob"], read_iob_document(stream_dir, index[("d", "task1_2")])
+        )
+
+        # Shard is a valid gzip file with CoNLL documents
+        with gzip.open(stream_dir / "batch.00000.iob.gz", "rt", encoding="utf-8") as fp:
+            content: str = fp.read()
+        self.assertEqual(50, content.count("-DOCSTART- O\n\n"))
+        self.assertTrue(content.startswith("-DOCSTART- O\n\n" + files["batch/a_b_c/task0_0.iob"] + "\n\n"))
+
+        # Layout of a file per answer is rebuilt from the stream
+        unpacked_dir: pathlib.Path = self.path / "unpacked"
+        unpacked_dir.mkdir()
+        self.assertEqual(120, unpack_iob_stream(stream_dir / "batch.index.tsv", unpacked_dir))
+        self.assertEqual(
+            files,
+            {str(p.relative_to(unpacked_dir)): p.read_text(encoding="utf-8") for p in unpacked_dir.rglob("*.iob")},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
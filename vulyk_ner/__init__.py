@@ -1,8 +1,6 @@
 # -*- coding=utf-8 -*-
 import logging
 
-from werkzeug.utils import import_string
-
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +10,9 @@ def configure(self_settings):
     Getting plugin's default settings, overwriting them with settings
     from local_settings.py, returns dict of settings
     """
+    # Imported here, so the conversion tools can use vulyk_ner package without vulyk and its dependencies
+    from werkzeug.utils import import_string
+
     settings = {}
     try:
         local_settings = import_string('vulyk.local_settings')
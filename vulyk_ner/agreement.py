@@ -0,0 +1,258 @@
+import logging
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from vulyk_ner.iob import answer_spans, assign_tags, resolve_overlaps
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = logging.getLogger(__name__)
+
+AGREEMENT_RULES: Tuple[str, ...] = ("unanimous", "majority")
+
+
+class TaskAnswers(NamedTuple):
+    """
+    Answers of the annotators to the same task: text with the offsets of sentences and tokens (sorted by start)
+    and IOB tags of the tokens by each user
+    """
+    task_id: str
+    text: str
+    sentences_off: List[List[int]]
+    tokens_off: List[List[int]]
+    tags: Dict[str, List[str]]
+
+
+class LabelMatrix(NamedTuple):
+    """
+    Tags of all the tokens of the batch by all the annotators. labels[token, column] is the index of the tag
+    in vocabulary or -1 if the task of the token has less annotators than columns, task[token] is the index
+    of the task in tasks. Annotators of the task are put into the columns in the order of their names (see users).
+    label_type maps the index of the tag to the index of the entity type in types plus one (0 is O),
+    label_begin tells B- tags apart
+    """
+    tasks: List[TaskAnswers]
+    users: List[List[str]]
+    vocabulary: List[str]
+    types: List[str]
+    labels: "np.ndarray"
+    task: "np.ndarray"
+    label_type: "np.ndarray"
+    label_begin: "np.ndarray"
+
+
+def group_answers(answers: Iterable[dict], overlap: str = "first") -> Dict[str, TaskAnswers]:
+    """
+    Group the answers exported from vulyk by the task id, converting the entities of every answer into
+    the tags of its tokens (overlapping entities are resolved with the policy, see resolve_overlaps).
+    `layers` policy is not supported, as the annotators are compared on a single tag per token.
+    Answers with missing fields or with the text or the tokens different from the first answer to the task
+    are dropped
+    """
+    if overlap == "layers":
+        raise ValueError("Overlap policy layers gives a few tags per token, use first or longest")
+
+    tasks: Dict[str, TaskAnswers] = {}
+
+    for answer in answers:
+        missing: List[str] = [f for f in ["answer", "task", "user"] if f not in answer]
+        if missing:
+            log.warning(f"Cannot find field {missing[0]} in answer, skipping")
+            continue
+
+        record: dict = answer["answer"]
+        task_id: str = answer["task"]["id"]
+        user: str = answer["user"]["username"]
+        tokens_off: List[List[int]] = sorted(record["token_offsets"], key=lambda x: x[0])
+
+        if task_id not in tasks:
+            tasks[task_id] = TaskAnswers(
+                task_id, record["text"], sorted(record["sentence_offsets"], key=lambda x: x[0]), tokens_off, {}
+            )
+        elif tasks[task_id].text != record["text"] or tasks[task_id].tokens_off != tokens_off:
+            log.warning(f"Answer of {user} to the task {task_id} has different tokens than the others, skipping")
+            continue
+
+        tasks[task_id].tags[user] = assign_tags(tokens_off, resolve_overlaps(answer_spans(record), overlap)[0])
+
+    return tasks
+
+
+def build_matrix(tasks: Iterable[TaskAnswers], min_annotators: int = 2) -> LabelMatrix:
+    """
+    Stack the tags of the tasks annotated by at least min_annotators users into one label matrix
+    """
+    import numpy as np
+
+    selected: List[TaskAnswers] = [task for task in tasks if len(task.tags) >= min_annotators]
+    users: List[List[str]] = [sorted(task.tags) for task in selected]
+    width: int = max((len(names) for names in users), default=min_annotators)
+
+    # Tags get their indices in the order of appearance, -1 stands for the missing annotator
+    index: Dict[str, int] = defaultdict()
+    index.default_factory = index.__len__  # type: ignore
+
+    columns: List[List[int]] = [[] for _ in range(width)]
+    for task, names in zip(selected, users):
+        for col, column in enumerate(columns):
+            if col < len(names):
+                column.extend(map(index.__getitem__, task.tags[names[col]]))
+            else:
+                column.extend([-1] * len(task.tokens_off))
+
+    labels: np.ndarray = np.array(columns, dtype=np.int32).reshape(width, -1).T
+    tags: List[str] = list(index)
+    types: List[str] = sorted({tag[2:] for tag in tags if tag != "O"})
+
+    return LabelMatrix(
+        tasks=selected,
+        users=users,
+        vocabulary=tags,
+        types=types,
+        labels=labels,
+        task=np.repeat(np.arange(len(selected)), [len(task.tokens_off) for task in selected]),
+        label_type=np.array([0 if tag == "O" else types.index(tag[2:]) + 1 for tag in tags], dtype=np.int32),
+        label_begin=np.array([tag.startswith("B-") for tag in tags], dtype=bool),
+    )
+
+
+def span_keys(token_type: "np.ndarray", begin: "np.ndarray", task: "np.ndarray", types: int) -> "np.ndarray":
+    """
+    Spans of the entities in the column of tags as the sorted keys: (start, end, type) packed into one int64.
+    Entity starts with B- tag, or with the tag of different type than the previous token, or at the start of the task
+    """
+    import numpy as np
+
+    tokens: int = len(token_type)
+    starts_new: np.ndarray = begin.copy()
+    starts_new[1:] |= (token_type[1:] != token_type[:-1]) | (task[1:] != task[:-1])
+    if tokens:
+        starts_new[0] = True
+
+    starts_new &= token_type > 0
+    inside: np.ndarray = (token_type > 0) & ~starts_new
+
+    ends: np.ndarray = token_type > 0
+    ends[:-1] &= ~inside[1:]
+
+    starts_idx: np.ndarray = np.flatnonzero(starts_new).astype(np.int64)
+    ends_idx: np.ndarray = np.flatnonzero(ends).astype(np.int64)
+
+    return (starts_idx * (tokens + 1) + ends_idx) * (types + 1) + token_type[starts_idx]
+
+
+def agreement(matrix: LabelMatrix) -> dict:
+    """
+    Cohen's kappa over the tags of the tokens (per entity type, one against the rest, and overall) and F1
+    of exact span matches between the annotators, for every type and micro-averaged. With more than two
+    annotators per task the pairs of them are pooled together
+    """
+    import numpy as np
+
+    classes: int = len(matrix.types) + 1
+    tokens: int = 0
+    first: np.ndarray = np.zeros(classes, dtype=np.int64)
+    second: np.ndarray = np.zeros(classes, dtype=np.int64)
+    both: np.ndarray = np.zeros(classes, dtype=np.int64)
+    spans: np.ndarray = np.zeros(classes, dtype=np.int64)
+    matched: np.ndarray = np.zeros(classes, dtype=np.int64)
+
+    width: int = matrix.labels.shape[1]
+    for i in range(width):
+        for j in range(i + 1, width):
+            rows: np.ndarray = (matrix.labels[:, i] >= 0) & (matrix.labels[:, j] >= 0)
+            task: np.ndarray = matrix.task[rows]
+            a_labels: np.ndarray = matrix.labels[rows, i]
+            b_labels: np.ndarray = matrix.labels[rows, j]
+            a: np.ndarray = matrix.label_type[a_labels]
+            b: np.ndarray = matrix.label_type[b_labels]
+
+            tokens += len(a)
+            first += np.bincount(a, minlength=classes)
+            second += np.bincount(b, minlength=classes)
+            both += np.bincount(a[a == b], minlength=classes)
+
+            a_spans: np.ndarray = span_keys(a, matrix.label_begin[a_labels], task, classes - 1)
+            b_spans: np.ndarray = span_keys(b, matrix.label_begin[b_labels], task, classes - 1)
+            spans += np.bincount(a_spans % classes, minlength=classes)
+            spans += np.bincount(b_spans % classes, minlength=classes)
+            matched += np.bincount(
+                np.intersect1d(a_spans, b_spans, assume_unique=True) % classes, minlength=classes
+            )
+
+    # Undefined (None) when there is nothing to agree on, i.e. nobody used the type
+    def kappa(p_observed: float, p_expected: float) -> Optional[float]:
+        return round(float((p_observed - p_expected) / (1 - p_expected)), 4) if p_expected < 1 else None
+
+    def f1(type_matched: int, type_spans: int) -> Optional[float]:
+        return round(2 * float(type_matched) / float(type_spans), 4) if type_spans else None
+
+    result: dict = {"tokens": tokens, "types": {}}
+    if not tokens:
+        return result
+
+    p_first: np.ndarray = first / tokens
+    p_second: np.ndarray = second / tokens
+    # Agreement on the type against the rest: both say it's the type or both say it's not
+    observed: np.ndarray = (tokens - first - second + 2 * both) / tokens
+    expected: np.ndarray = p_first * p_second + (1 - p_first) * (1 - p_second)
+
+    for idx, name in enumerate(matrix.types, 1):
+        result["types"][name] = {
+            "kappa": kappa(observed[idx], expected[idx]),
+            "f1": f1(matched[idx], spans[idx]),
+            "spans": int(spans[idx]),
+        }
+
+    result["kappa"] = kappa(both.sum() / tokens, float((p_first * p_second).sum()))
+    result["f1"] = f1(matched[1:].sum(), spans[1:].sum())
+
+    return result
+
+
+def adjudicate(matrix: LabelMatrix, rule: str = "unanimous") -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Gold tags of the tokens (indices in vocabulary) voted by the annotators and whether the tokens are settled.
+    With `unanimous` rule the token is settled when all the annotators of the task agree on it, with `majority`,
+    when more than half of them do. Winning I- tags that don't continue the entity are not fixed here, see gold_tags
+    """
+    import numpy as np
+
+    if rule not in AGREEMENT_RULES:
+        raise ValueError(f"Unknown agreement rule {rule}, should be one of {', '.join(AGREEMENT_RULES)}")
+
+    present: np.ndarray = matrix.labels >= 0
+    votes: np.ndarray = np.zeros((len(matrix.labels), len(matrix.vocabulary)), dtype=np.int32)
+
+    for col in range(matrix.labels.shape[1]):
+        rows: np.ndarray = np.flatnonzero(present[:, col])
+        votes[rows, matrix.labels[rows, col]] += 1
+
+    winner: np.ndarray = votes.argmax(axis=1) if len(votes) else np.zeros(0, dtype=np.int64)
+    top: np.ndarray = votes.max(axis=1) if len(votes) else np.zeros(0, dtype=np.int32)
+    annotators: np.ndarray = present.sum(axis=1)
+
+    settled: np.ndarray = top == annotators if rule == "unanimous" else 2 * top > annotators
+
+    return winner, settled
+
+
+def gold_tags(matrix: LabelMatrix, winner: "np.ndarray") -> List[str]:
+    """
+    Tags of the tokens voted by adjudicate, I- tags that don't continue the entity of the same type
+    (i.e. when the annotators disagree on the first token of the entity) are turned into B-
+    """
+    import numpy as np
+
+    tags: np.ndarray = np.array(matrix.vocabulary, dtype=object)[winner]
+    token_type: np.ndarray = matrix.label_type[winner]
+
+    broken: np.ndarray = (token_type > 0) & ~matrix.label_begin[winner]
+    if len(broken):
+        broken[1:] &= (token_type[1:] != token_type[:-1]) | (matrix.task[1:] != matrix.task[:-1])
+
+    for idx in np.flatnonzero(broken):
+        tags[idx] = "B-" + tags[idx][2:]
+
+    return tags.tolist()
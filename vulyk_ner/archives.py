@@ -0,0 +1,184 @@
+import glob
+import io
+import logging
+import pathlib
+import posixpath
+from fnmatch import fnmatchcase
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from vulyk_ner.files import annotation_candidates, in_shard, open_compressed, strip_compression_suffix
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES: Tuple[str, ...] = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz", ".zip")
+
+
+class ArchiveDocument(NamedTuple):
+    """
+    Text member of the archive (and its annotation, if found) read into memory. Text file that was already read
+    (i.e. to take its digest) comes the same way, with empty archive
+    """
+    archive: str
+    name: str
+    text: str
+    ann: Optional[str] = None
+
+    @property
+    def source(self) -> str:
+        return f"{self.archive}:{self.name}" if self.archive else self.name
+
+
+def split_archive_spec(spec: str) -> Optional[Tuple[str, str]]:
+    """
+    corpus.tar.gz:docs/*.txt -> (corpus.tar.gz, docs/*.txt). Returns None if the input is not an archive
+    """
+    lowered: str = spec.lower()
+
+    for suffix in ARCHIVE_SUFFIXES:
+        pos: int = lowered.find(suffix + ":")
+        if pos >= 0:
+            return spec[: pos + len(suffix)], spec[pos + len(suffix) + 1 :] or "*"
+
+    return None
+
+
+def iter_members(archive: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """
+    Names and the content of the files in the tar (possibly compressed) or zip archive, in the order of the archive.
+    Tar archives are read as a stream, so the content of the member should be read before moving to the next one
+    """
+    # Only needed when reading the archives, so the plain runs don't pay for the import
+    import tarfile
+    import zipfile
+
+    if archive.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    with zf.open(info) as fp:
+                        yield pathlib.PurePosixPath(info.filename).as_posix(), fp
+    else:
+        with tarfile.open(archive, "r|*") as tf:
+            for member in tf:
+                fp: Optional[IO[bytes]] = tf.extractfile(member) if member.isfile() else None
+                if fp is not None:
+                    yield pathlib.PurePosixPath(member.name).as_posix(), fp
+
+
+def read_member(name: str, fp: IO[bytes]) -> str:
+    """
+    Read the whole (possibly compressed) text member of the archive
+    """
+    # Members of the streamed tar cannot tell if they are seekable, which TextIOWrapper needs to know
+    with open_compressed(name, fileobj=io.BytesIO(fp.read())) as member_fp:
+        return member_fp.read()
+
+
+def is_annotation(name: str) -> bool:
+    return strip_compression_suffix(pathlib.PurePosixPath(name)).suffix == ".ann"
+
+
+def iter_archive(
+    archive: str,
+    pattern: str,
+    ann_autodiscovery: Optional[str] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    max_waiting: int = 1000,
+) -> Iterator[ArchiveDocument]:
+    """
+    Read the text members that match the pattern (fnmatch style, * matches / as well) from the archive
+    without extracting it. With ann_autodiscovery, annotations are looked for among the members by the same rules
+    as find_annotation does on the disk (and are never taken for the texts, even if they match the pattern).
+    Archive is read once from start to end, so the documents come in the order of the archive. Text is held
+    until its annotation shows up (annotations that come first wait for their text), but only while the archive
+    is still in the directory of the text: once it moves past that directory (and its subdirectories), the text
+    comes without annotation. No more than max_waiting texts are held at once (the oldest one goes first),
+    so the texts are not piled up in memory. With shard (i, N), only the members of i-th shard are read (see in_shard)
+    """
+    # Texts waiting for the annotation and the names of annotation they are waiting for
+    waiting: Dict[str, Tuple[str, List[str]]] = {}
+    waited_anns: Dict[str, str] = {}
+    # Annotations that came before their text
+    seen_anns: Dict[str, str] = {}
+    # Directory of the current member
+    directory: str = ""
+
+    def left_behind(name: str) -> bool:
+        parent: str = posixpath.dirname(name)
+        return bool(parent) and directory != parent and not directory.startswith(parent + "/")
+
+    def release(text_name: str, ann: Optional[str] = None) -> ArchiveDocument:
+        text, candidates = waiting.pop(text_name)
+        for c in candidates:
+            waited_anns.pop(c, None)
+
+        return ArchiveDocument(archive, text_name, text, ann)
+
+    for name, fp in iter_members(archive):
+        if ann_autodiscovery is not None and posixpath.dirname(name) != directory:
+            directory = posixpath.dirname(name)
+
+            for text_name in [text_name for text_name in waiting if left_behind(text_name)]:
+                yield release(text_name)
+
+            for ann_name in [ann_name for ann_name in seen_anns if left_behind(ann_name)]:
+                log.debug(f"Annotation {archive}:{ann_name} has no text member matching {pattern}")
+                del seen_anns[ann_name]
+
+        annotation: bool = ann_autodiscovery is not None and is_annotation(name)
+
+        if fnmatchcase(name, pattern) and not annotation:
+            source: str = f"{archive}:{name}"
+            if not in_shard(source, shard):
+                continue
+
+            text: str = read_member(name, fp)
+
+            if ann_autodiscovery is None:
+                yield ArchiveDocument(archive, name, text)
+                continue
+
+            candidates: List[str] = [
+                c.as_posix() for c in annotation_candidates(pathlib.PurePosixPath(name), ann_autodiscovery)
+            ]
+            found: Optional[str] = next((c for c in candidates if c in seen_anns), None)
+
+            if found is not None:
+                yield ArchiveDocument(archive, name, text, seen_anns.pop(found))
+                continue
+
+            waiting[name] = (text, candidates)
+            waited_anns.update((c, name) for c in candidates)
+
+            if len(waiting) > max_waiting:
+                yield release(next(iter(waiting)))
+
+        elif annotation:
+            ann: str = read_member(name, fp)
+            waiting_text: Optional[str] = waited_anns.get(name)
+
+            if waiting_text is None:
+                seen_anns[name] = ann
+            else:
+                yield release(waiting_text, ann)
+
+    if seen_anns:
+        log.debug(f"{len(seen_anns)} annotations in {archive} have no text members matching {pattern}")
+
+    for name in list(waiting):
+        yield release(name)
+
+
+def iter_inputs(
+    input_files: str, ann_autodiscovery: Optional[str] = None, shard: Optional[Tuple[int, int]] = None
+) -> Iterator[Union[pathlib.Path, ArchiveDocument]]:
+    """
+    Files matching the mask (sorted, to make the output deterministic) or, when the input is given
+    as archive.tar.gz:pattern, documents read from the archive (see iter_archive)
+    """
+    archive: Optional[Tuple[str, str]] = split_archive_spec(input_files)
+
+    if archive is not None:
+        yield from iter_archive(*archive, ann_autodiscovery=ann_autodiscovery, shard=shard)
+    else:
+        yield from sorted(p for p in map(pathlib.Path, glob.glob(input_files)) if in_shard(p, shard))
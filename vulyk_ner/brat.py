@@ -0,0 +1,321 @@
+import logging
+import pathlib
+import re
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from vulyk_ner.files import open_compressed
+from vulyk_ner.text import align_tokenized
+
+log = logging.getLogger(__name__)
+
+# spans are set for every entity parsed by parse_bsf/iter_bsf and hold all the fragments of discontinuous entity,
+# while start_idx and end_idx are the start of the first fragment and the end of the last one
+BsfInfo = namedtuple("BsfInfo", "id, tag, start_idx, end_idx, token, spans", defaults=(None,))
+BsfAttribute = namedtuple("BsfAttribute", "id, name, target, value")
+BsfNote = namedtuple("BsfNote", "id, type, target, note")
+
+BsfRecord = Union[BsfInfo, BsfAttribute, BsfNote]
+
+#                             Token_id Entity  start end;start end   text within range
+#                                \/      \/         \/                   \/
+BSF_ENTITY_RE = re.compile(r"(T\d+)\s+(\S+)\s+(\d+\s+\d+(?:;\d+\s+\d+)*)(?:\s(.*))?")
+BSF_ATTRIBUTE_RE = re.compile(r"([AM]\d+)\s+(\S+)\s+(\S+)(?:\s+(.*))?")
+BSF_NOTE_RE = re.compile(r"(#\d*)\s+(\S+)\s+(\S+)(?:\s(.*))?")
+# Relations, events, normalizations, equivs. We do not use them, but they shouldn't be confused
+# with the continuation of the previous entity
+BSF_OTHER_RE = re.compile(r"(?:[REN]\d+|\*)\s")
+
+
+def iter_bsf(lines: Iterable[str]) -> Iterator[BsfRecord]:
+    """
+    Parse brat standoff format line by line, so it can be applied to the opened .ann file as well.
+    Yields entities (including discontinuous ones like 'T1 ORG 0 5;10 15  text'), attributes and notes,
+    other kinds of records are skipped.
+
+    :param lines: lines of the data in the format 'T9 PERS 778 783    токен'
+    :return: iterator over the named tuples for each record
+    """
+    entity: Optional[BsfInfo] = None
+
+    for line in lines:
+        # Fast path for the most common case of continuous entity
+        parts: List[str] = line.split(None, 4)
+        if (
+            len(parts) >= 4
+            and parts[0][0] == "T"
+            and parts[0][1:].isdecimal()
+            and parts[2].isdecimal()
+            and parts[3].isdecimal()
+        ):
+            if entity is not None:
+                yield entity
+
+            start_idx, end_idx = int(parts[2]), int(parts[3])
+            entity = BsfInfo(
+                parts[0], parts[1], start_idx, end_idx, parts[4].strip() if len(parts) > 4 else "", ((start_idx, end_idx),)
+            )
+            continue
+
+        m = BSF_ENTITY_RE.match(line)
+        if m:
+            if entity is not None:
+                yield entity
+
+            ent_id, ent_tag, offsets, ent_text = m.groups()
+            if ";" in offsets:
+                spans: Tuple[Tuple[int, int], ...] = tuple(
+                    (int(start), int(end)) for start, end in map(str.split, offsets.split(";"))
+                )
+            else:
+                start, end = offsets.split()
+                spans = ((int(start), int(end)),)
+
+            entity = BsfInfo(ent_id, ent_tag, spans[0][0], spans[-1][1], ent_text.strip() if ent_text else "", spans)
+            continue
+
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+
+        m = BSF_ATTRIBUTE_RE.match(line)
+        if m:
+            if entity is not None:
+                yield entity
+                entity = None
+
+            yield BsfAttribute(m.group(1), m.group(2), m.group(3), m.group(4) or "")
+            continue
+
+        m = BSF_NOTE_RE.match(line)
+        if m:
+            if entity is not None:
+                yield entity
+                entity = None
+
+            yield BsfNote(m.group(1), m.group(2), m.group(3), m.group(4) or "")
+            continue
+
+        if BSF_OTHER_RE.match(line):
+            if entity is not None:
+                yield entity
+                entity = None
+
+            log.debug(f"Skipping unsupported brat record {line}")
+        elif entity is not None:
+            # Text of the entity that spans over the newline
+            entity = entity._replace(token=(entity.token + "\n" + line).strip())
+        else:
+            log.warning(f"Cannot parse brat record {line}, skipping")
+
+    if entity is not None:
+        yield entity
+
+
+def read_bsf(ann_file: pathlib.Path) -> Iterator[BsfRecord]:
+    """
+    Stream records from the .ann file without reading it into memory at once
+    """
+    with open_compressed(ann_file) as fp:
+        yield from iter_bsf(fp)
+
+
+def parse_bsf(bsf_data: str) -> List[BsfInfo]:
+    """
+    Convert multiline textual bsf representation to a list of named entities.
+
+    :param bsf_data: data in the format 'T9 PERS 778 783    токен'. Can be multiple lines.
+    :return: list of named tuples for each line of the data representing a single named entity token
+    """
+
+    return [rec for rec in iter_bsf(bsf_data.splitlines()) if isinstance(rec, BsfInfo)]
+
+
+def convert_bsf_2_vulyk(tokenized_text: List[List[str]], bsf_markup: str, compensate_for_offsets: bool = False) -> dict:
+    """
+    Given tokenized text and named entities in Brat standoff format, generate object
+    in the format compatible with Vulyk markup tool.
+    :param text: tokenized text
+    :param bsf_markup: named entities in Brat standoff format
+    :param compensate_for_offsets: when converting already tokenized text from txt/ann pair, this will
+    displace NER tokens according to the changes made to the punctuation/whitespaces
+    :return: dict that can be directly converted to Vulyk json file
+    """
+
+    bsf: List[BsfInfo] = parse_bsf(bsf_markup)
+    ents: List[List[Any]] = [[e.id, e.tag, list(e.spans or [(e.start_idx, e.end_idx)])] for e in bsf]
+
+    lines: List[str] = []
+    pos: int = 0
+    sent_start: int = 0
+    t_idx: int = 0
+    s_offsets: List[Tuple[int, int]] = []
+    t_offsets: List[Tuple[int, int]] = []
+    prev_displacement: int = 0
+
+    displacements: List[Tuple[int, int]] = []
+
+    if compensate_for_offsets:
+        text, orig_offsets, new_offsets = align_tokenized(tokenized_text)
+
+        for i in range(0, len(new_offsets), 2):
+            piece_start, piece_end = new_offsets[i], new_offsets[i + 1]
+
+            # Here we constructing a displacement map, i.e how we should adjust all the entities
+            # after original tokens were displaced according to space normalization.
+            if orig_offsets[i] - piece_start > prev_displacement:
+                displacements.append((orig_offsets[i], orig_offsets[i] - piece_start - prev_displacement))
+                prev_displacement = orig_offsets[i] - piece_start
+
+            # Tokens are never whitespaces, so one char long whitespace piece is a separator
+            if piece_end - piece_start == 1 and text[piece_start] in " \n":
+                if text[piece_start] == "\n":
+                    if piece_start > sent_start:
+                        s_offsets.append((sent_start, piece_start))
+
+                    sent_start = piece_end
+            else:
+                t_offsets.append((piece_start, piece_end))
+
+        if len(text) > sent_start:
+            s_offsets.append((sent_start, len(text)))
+
+        # Cumulative displacement index: each position of the entity is moved by the sum of all displacements
+        # located at or before it, which we find with the binary search over the positions of displacements
+        disp_positions: List[int] = [disp[0] for disp in displacements]
+        disp_cumulative: List[int] = list(accumulate((disp[1] for disp in displacements), initial=0))
+
+        for ent in ents:
+            ent[2] = [
+                (
+                    start - disp_cumulative[bisect_right(disp_positions, start)],
+                    end - disp_cumulative[bisect_right(disp_positions, end)],
+                )
+                for start, end in ent[2]
+            ]
+    else:
+        for sentence in tokenized_text:
+            t_idx = pos
+            for token in sentence:
+                if token.strip():
+                    t_offsets.append((t_idx, t_idx + len(token)))
+                t_idx += len(token) + 1
+
+            s: str = " ".join(sentence)
+
+            if s:
+                s_offsets.append((pos, pos + len(s)))
+
+            lines.append(s)
+            pos += len(s) + 1
+
+        text = "\n".join(lines).rstrip()
+
+    ts: int = int(time.time())
+    vulyk: dict = {
+        "modifications": [],
+        "equivs": [],
+        "protocol": 1,
+        "ctime": ts,
+        "triggers": [],
+        "text": text,
+        "source_files": ["ann", "txt"],
+        "messages": [],
+        "sentence_offsets": s_offsets,
+        "comments": [],
+        "entities": ents,
+        "mtime": ts,
+        "relations": [],
+        "token_offsets": t_offsets,
+        "action": "getDocument",
+        "normalizations": [],
+        "attributes": [],
+        "events": [],
+        "document": "",
+        "collection": "/",
+    }
+
+    return vulyk
+
+
+def split_document(vulyk_obj: dict, parent: str, max_sentences: int = 0, max_chars: int = 0) -> List[dict]:
+    """
+    Split vulyk object into chunks of no more than max_sentences sentences and max_chars characters
+    (sentence that is longer than max_chars forms a chunk on its own). Chunks are split on the sentence boundaries,
+    offsets of tokens and entities are rebased to the beginning of the chunk. Each chunk keeps the id of the parent
+    document, its index and the total number of chunks, so convert_vulyk2iob.py can join them back.
+    :param vulyk_obj: object produced by convert_bsf_2_vulyk
+    :param parent: id of the original document (i.e the name of input file)
+    :return: list of chunks (list with a single object, if the document is small enough)
+    """
+    text: str = vulyk_obj["text"]
+    sentences: List[Tuple[int, int]] = sorted(map(tuple, vulyk_obj["sentence_offsets"]))  # type: ignore
+
+    # Positions in text where the chunks are starting
+    boundaries: List[int] = [0]
+    chunk_sentences: int = 0
+    chunk_start: int = 0
+
+    for sent_start, sent_end in sentences:
+        if chunk_sentences and (
+            (max_sentences > 0 and chunk_sentences >= max_sentences)
+            or (max_chars > 0 and sent_end - chunk_start > max_chars)
+        ):
+            boundaries.append(sent_start)
+            chunk_start = sent_start
+            chunk_sentences = 0
+
+        chunk_sentences += 1
+
+    boundaries.append(len(text))
+
+    chunks: List[dict] = []
+    for chunk_idx in range(len(boundaries) - 1):
+        chunk = dict(vulyk_obj)
+        chunk.update(
+            {
+                "sentence_offsets": [],
+                "token_offsets": [],
+                "entities": [],
+                "parent_document": parent,
+                "chunk_index": chunk_idx,
+                "chunks_total": len(boundaries) - 1,
+            }
+        )
+        chunks.append(chunk)
+
+    def rebase(offsets: Iterable[Any], field: str) -> None:
+        for start, end in offsets:
+            chunk_idx = bisect_right(boundaries, start, hi=len(boundaries) - 1) - 1
+            chunks[chunk_idx][field].append((start - boundaries[chunk_idx], end - boundaries[chunk_idx]))
+
+    rebase(sentences, "sentence_offsets")
+    rebase(vulyk_obj["token_offsets"], "token_offsets")
+
+    for ent_id, ent_tag, fragments in vulyk_obj["entities"]:
+        # Fragments of discontinuous entity might end up in different chunks, each of them gets its part
+        parts: Dict[int, List[Tuple[int, int]]] = {}
+
+        for start, end in fragments:
+            chunk_idx = bisect_right(boundaries, start, hi=len(boundaries) - 1) - 1
+            chunk_start, chunk_end = boundaries[chunk_idx], boundaries[chunk_idx + 1]
+
+            if end > chunk_end:
+                log.warning(f"Entity {ent_id} of {parent} crosses the boundary of chunk #{chunk_idx}, cutting it")
+
+            parts.setdefault(chunk_idx, []).append((start - chunk_start, min(end, chunk_end) - chunk_start))
+
+        if len(parts) > 1:
+            log.warning(f"Fragments of entity {ent_id} of {parent} are in different chunks, splitting it")
+
+        for chunk_idx, chunk_fragments in parts.items():
+            chunks[chunk_idx]["entities"].append([ent_id, ent_tag, chunk_fragments])
+
+    for chunk_idx, chunk in enumerate(chunks):
+        # Newlines between the chunks are not the part of any of them
+        chunk["text"] = text[boundaries[chunk_idx] : boundaries[chunk_idx + 1]].rstrip("\n")
+
+    return chunks
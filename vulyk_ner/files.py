@@ -0,0 +1,488 @@
+import bz2
+import gzip
+import hashlib
+import io
+import json
+import logging
+import lzma
+import os
+import pathlib
+import sys
+from functools import partial
+from types import TracebackType
+from typing import IO, TYPE_CHECKING, BinaryIO, Dict, List, Optional, Set, Tuple, Type, TypeVar, Union
+
+if TYPE_CHECKING:
+    from vulyk_ner.iob import IobFilesSink, IobStreamSink
+
+log = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES: Tuple[str, ...] = (".gz", ".bz2", ".xz", ".zst")
+
+PathT = TypeVar("PathT", bound=pathlib.PurePath)
+
+
+def open_compressed(
+    path: Union[str, pathlib.PurePath], mode: str = "rt", encoding: str = "utf-8", fileobj: Optional[BinaryIO] = None
+) -> IO:
+    """
+    Open the file, compressing/decompressing it on the fly when the extension is one of COMPRESSION_SUFFIXES.
+    Data is streamed, so the file is never decompressed into memory at once.
+    When fileobj is given (i.e. the member of the archive), it's read instead and the path is only used for the extension.
+    zstd requires zstandard package to be installed
+    """
+    path = pathlib.PurePath(path)
+    suffix: str = path.suffix.lower()
+    text_kwargs: dict = {} if "b" in mode else {"encoding": encoding}
+    source: Union[pathlib.PurePath, BinaryIO] = path if fileobj is None else fileobj
+
+    if mode in ("r", "w", "a", "x"):
+        mode += "t"
+
+    if suffix == ".gz":
+        return gzip.open(source, mode, **text_kwargs)
+    elif suffix == ".bz2":
+        return bz2.open(source, mode, **text_kwargs)
+    elif suffix == ".xz":
+        return lzma.open(source, mode, **text_kwargs)
+    elif suffix == ".zst":
+        import zstandard  # type: ignore
+
+        return zstandard.open(source, mode, **text_kwargs)
+
+    if fileobj is not None:
+        return fileobj if "b" in mode else io.TextIOWrapper(fileobj, **text_kwargs)
+
+    return open(path, mode, **text_kwargs)
+
+
+def strip_compression_suffix(path: PathT) -> PathT:
+    """
+    corpus/doc.txt.gz -> corpus/doc.txt
+    """
+    if path.suffix.lower() in COMPRESSION_SUFFIXES:
+        return path.with_suffix("")
+
+    return path
+
+
+def read_text(path: pathlib.Path) -> str:
+    """
+    Read the whole (possibly compressed) text file
+    """
+    with open_compressed(path) as fp:
+        return fp.read()
+
+
+def annotation_candidates(text: PathT, ann_autodiscovery: str) -> List[PathT]:
+    """
+    Names of *.ann file for the text file by appending or replacing the extension, in the order of preference.
+    Annotations might be compressed as well, i.e for doc.txt.gz we are looking for doc.ann, doc.ann.gz, doc.ann.bz2, etc
+    """
+    base: PathT = strip_compression_suffix(text)
+
+    if ann_autodiscovery == "append":
+        ann = base.with_name(base.name + ".ann")
+    else:
+        ann = base.with_suffix(".ann")
+
+    return [ann] + [ann.with_name(ann.name + suffix) for suffix in COMPRESSION_SUFFIXES]
+
+
+def find_annotation(text: pathlib.Path, ann_autodiscovery: str) -> Optional[pathlib.Path]:
+    """
+    Find *.ann file alongside to the text file (see annotation_candidates)
+    """
+    return next((candidate for candidate in annotation_candidates(text, ann_autodiscovery) if candidate.exists()), None)
+
+
+class JsonlinesSink:
+    """
+    Buffered writer for the jsonlines output. Writes to stdout when no output path is given.
+    With shard_docs and/or shard_bytes the output is rolled over to the next shard once the current one
+    has shard_docs documents or adding the document would make it bigger than shard_bytes.
+    Shards are named after the output path, i.e tasks.jsonlines -> tasks.00000.jsonlines, tasks.00001.jsonlines
+    Output is compressed when the output path ends with one of COMPRESSION_SUFFIXES
+    """
+    def __init__(
+        self,
+        output: str = "",
+        shard_docs: int = 0,
+        shard_bytes: int = 0,
+        sort_keys: bool = True,
+        buffer_size: int = 1 << 20,
+    ) -> None:
+        if (shard_docs or shard_bytes) and not output:
+            raise ValueError("Cannot shard the output without the output path")
+
+        self.output: str = output
+        self.shard_docs: int = shard_docs
+        self.shard_bytes: int = shard_bytes
+        self.sort_keys: bool = sort_keys
+        self.buffer_size: int = buffer_size
+
+        self.paths: List[pathlib.Path] = []
+        self.docs: int = 0
+        self.docs_in_shard: int = 0
+        self.bytes_in_shard: int = 0
+        self.fp: Optional[BinaryIO] = None
+
+        self._open_shard()
+
+    def shard_path(self, shard: int) -> pathlib.Path:
+        path: pathlib.Path = pathlib.Path(self.output)
+        if not (self.shard_docs or self.shard_bytes):
+            return path
+
+        suffixes: str = "".join(path.suffixes)
+        return path.with_name(f"{path.name[: len(path.name) - len(suffixes)]}.{shard:05d}{suffixes}")
+
+    def _open_shard(self) -> None:
+        if not self.output:
+            sys.stdout.flush()
+            self.fp = sys.stdout.buffer
+            return
+
+        path: pathlib.Path = self.shard_path(len(self.paths))
+        log.info(f"Writing output to {path}")
+
+        if path.suffix.lower() in COMPRESSION_SUFFIXES:
+            self.fp = open_compressed(path, "wb")
+        else:
+            self.fp = open(path, "wb", buffering=self.buffer_size)
+        self.paths.append(path)
+        self.docs_in_shard = 0
+        self.bytes_in_shard = 0
+
+    def write(self, obj: dict) -> None:
+        assert self.fp is not None, "Sink is already closed"
+
+        line: bytes = (json.dumps(obj, ensure_ascii=False, sort_keys=self.sort_keys) + "\n").encode("utf-8")
+
+        if self.docs_in_shard and (
+            (self.shard_docs and self.docs_in_shard >= self.shard_docs)
+            or (self.shard_bytes and self.bytes_in_shard + len(line) > self.shard_bytes)
+        ):
+            self._close_shard()
+            self._open_shard()
+
+        self.fp.write(line)
+        self.docs += 1
+        self.docs_in_shard += 1
+        self.bytes_in_shard += len(line)
+
+    def flush(self) -> None:
+        if self.fp is not None:
+            self.fp.flush()
+
+    def _close_shard(self) -> None:
+        assert self.fp is not None
+
+        if self.output:
+            self.fp.close()
+        else:
+            # Not closing stdout
+            self.fp.flush()
+
+    def close(self) -> None:
+        if self.fp is not None:
+            self._close_shard()
+            self.fp = None
+
+    def __enter__(self) -> "JsonlinesSink":
+        return self
+
+    def __exit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        self.close()
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parse shard given as `i/N` (0 <= i < N), suitable to be the type of argparse argument
+    """
+    index, _, total = value.partition("/")
+    shard: Tuple[int, int] = (int(index), int(total))
+
+    if not 0 <= shard[0] < shard[1]:
+        raise ValueError(f"Shard {value} should be i/N with 0 <= i < N")
+
+    return shard
+
+
+def in_shard(path: Union[str, pathlib.PurePath], shard: Optional[Tuple[int, int]]) -> bool:
+    """
+    Tell if the file belongs to the shard (i, N). Files are assigned to the shards by the stable hash of the path,
+    so the runs on the different machines split the same file mask the same way
+    """
+    if shard is None:
+        return True
+
+    digest: bytes = hashlib.sha1(pathlib.PurePath(path).as_posix().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard[1] == shard[0]
+
+
+def file_digest(*paths: Optional[pathlib.Path]) -> str:
+    """
+    Hash of the content of the given files (missing ones are skipped)
+    """
+    h = hashlib.sha256()
+
+    for path in paths:
+        h.update(b"\0")
+        if path is None:
+            continue
+
+        with path.open("rb") as fp:
+            for chunk in iter(partial(fp.read, 1 << 20), b""):
+                h.update(chunk)
+
+    return h.hexdigest()
+
+
+def text_digest(*texts: Optional[str]) -> str:
+    """
+    Same as file_digest, but for the texts that are already in memory (i.e. read from the archive).
+    For uncompressed utf-8 files both give the same digest
+    """
+    h = hashlib.sha256()
+
+    for text in texts:
+        h.update(b"\0")
+        if text is not None:
+            h.update(text.encode("utf-8"))
+
+    return h.hexdigest()
+
+
+class Manifest:
+    """
+    Append-only jsonlines log of the processed input files, their content hash and the settings of the run.
+    Inputs that were processed before with the same content and the same settings are skipped on the next runs,
+    so the tools can be re-run on the growing corpus or resumed after the crash.
+
+    Records are committed in chunks of commit_every records (and the rest on close), each time after the output
+    is flushed, so the manifest never lists the documents that didn't make it to the output. The run killed
+    in the middle might write up to commit_every documents again when resumed. Manifest with empty path does nothing
+    """
+    def __init__(self, path: str, settings: dict, commit_every: int = 1000) -> None:
+        self.path: str = path
+        self.settings: str = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.commit_every: int = commit_every
+
+        self.done: Dict[str, Tuple[str, str]] = {}
+        self.pending: List[dict] = []
+        self.skipped: int = 0
+        # Output of the recorded documents, to flush it before committing the rest of the records on close
+        self.out: Optional[JsonlinesSink] = None
+        self.fp: Optional[IO] = None
+
+        if not self.path:
+            return
+
+        manifest_path: pathlib.Path = pathlib.Path(self.path)
+        line: str = ""
+
+        if manifest_path.exists():
+            with manifest_path.open("r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        rec: dict = json.loads(line)
+                    except ValueError:
+                        # Last line might be incomplete if we crashed while writing it
+                        log.warning(f"Cannot parse the line of manifest {self.path}, ignoring it")
+                        continue
+
+                    self.done[rec["input"]] = (rec["digest"], rec["settings"])
+
+            log.info(f"Loaded {len(self.done)} records from manifest {self.path}")
+
+        self.fp = manifest_path.open("a", encoding="utf-8")
+        if line and not line.endswith("\n"):
+            self.fp.write("\n")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def digest(self, *paths: Optional[pathlib.Path]) -> str:
+        return file_digest(*paths) if self.enabled else ""
+
+    def text_digest(self, *texts: Optional[str]) -> str:
+        return text_digest(*texts) if self.enabled else ""
+
+    def is_done(self, source: Union[str, pathlib.Path], digest: str) -> bool:
+        if self.done.get(str(source)) == (digest, self.settings):
+            self.skipped += 1
+            return True
+
+        return False
+
+    def record(self, out: JsonlinesSink, source: Union[str, pathlib.Path], digest: str) -> None:
+        """
+        Record the input, which document has been just written to the output
+        """
+        if not self.enabled:
+            return
+
+        self.out = out
+        self.pending.append({"input": str(source), "digest": digest, "settings": self.settings})
+
+        if len(self.pending) >= self.commit_every:
+            self.commit(out)
+
+    def commit(self, out: JsonlinesSink) -> None:
+        if self.fp is None or not self.pending:
+            return
+
+        out.flush()
+
+        for rec in self.pending:
+            self.fp.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self.done[rec["input"]] = (rec["digest"], rec["settings"])
+
+        # Flushed to the OS, which is enough to survive the killed process, fsync is left for the end of the run
+        self.fp.flush()
+        self.pending = []
+
+    def close(self) -> None:
+        if self.skipped:
+            log.info(f"Skipped {self.skipped} inputs that were processed before according to manifest {self.path}")
+
+        if self.out is not None:
+            self.commit(self.out)
+            self.out = None
+
+        if self.fp is not None:
+            os.fsync(self.fp.fileno())
+            self.fp.close()
+            self.fp = None
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        self.close()
+
+
+class ExportState:
+    """
+    State of the incremental conversion of the vulyk export: digest of the json of every answer converted
+    before, by (user, task_id), as tab separated lines of {state_dir}/{batch}.state.tsv (the last line wins).
+    Answer hasn't changed since when its digest is the one recorded for its user and task. Answers with the digest
+    never seen before are new or changed for sure, so only the rest have to be decoded to check that.
+    Answers are recorded in chunks of commit_every answers (and the rest on close) after the output is flushed,
+    same as in Manifest. Counts new, changed and unchanged answers of the run. State with no state_dir does nothing
+    """
+    def __init__(self, state_dir: Optional[pathlib.Path], batch: str, commit_every: int = 1000) -> None:
+        self.path: Optional[pathlib.Path] = state_dir / f"{batch}.state.tsv" if state_dir is not None else None
+        self.commit_every: int = commit_every
+
+        self.answers: Dict[Tuple[str, str], str] = {}
+        self.digests: Set[str] = set()
+        self.pending: List[Tuple[str, str, str]] = []
+        self.new: int = 0
+        self.changed: int = 0
+        self.unchanged: int = 0
+        self.fp: Optional[IO] = None
+        # Output of the recorded answers, to flush it before committing the rest of them on close
+        self.out: Optional[Union["IobFilesSink", "IobStreamSink"]] = None
+
+        if self.path is None:
+            return
+
+        line: str = ""
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as fp:
+                for line in fp:
+                    fields: List[str] = line.rstrip("\n").split("\t")
+                    if len(fields) != 3:
+                        # Last line might be incomplete if we crashed while writing it
+                        log.warning(f"Cannot parse the line of state {self.path}, ignoring it")
+                        continue
+
+                    user, task_id, digest = fields
+                    self.answers[(user, task_id)] = digest
+
+            self.digests = set(self.answers.values())
+            log.info(f"Loaded {len(self.answers)} answers from state {self.path}")
+
+        self.fp = self.path.open("a", encoding="utf-8")
+        if line and not line.endswith("\n"):
+            self.fp.write("\n")
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def is_known(self, digest: str) -> bool:
+        """
+        Whether any answer had this digest, the ones that didn't are new or changed
+        """
+        return digest in self.digests
+
+    def is_unchanged(self, user: str, task_id: str, digest: str) -> bool:
+        return self.answers.get((user, task_id)) == digest
+
+    def skip(self, answers: int = 1) -> None:
+        self.unchanged += answers
+
+    def record(self, out: Union["IobFilesSink", "IobStreamSink"], user: str, task_id: str, digest: str) -> None:
+        """
+        Record the answer which has been just written to the output. Answers on the chunks are recorded
+        when the document is joined back and written, and count as changed even if only the other chunks did
+        """
+        if not self.enabled:
+            return
+
+        if (user, task_id) in self.answers:
+            self.changed += 1
+        else:
+            self.new += 1
+
+        self.out = out
+        self.answers[(user, task_id)] = digest
+        self.digests.add(digest)
+        self.pending.append((user, task_id, digest))
+
+        if len(self.pending) >= self.commit_every:
+            self.commit(out)
+
+    def commit(self, out: Union["IobFilesSink", "IobStreamSink"]) -> None:
+        if self.fp is None or not self.pending:
+            return
+
+        out.flush()
+
+        for user, task_id, digest in self.pending:
+            self.fp.write(f"{user}\t{task_id}\t{digest}\n")
+
+        # Flushed to the OS, which is enough to survive the killed process, fsync is left for the end of the run
+        self.fp.flush()
+        self.pending = []
+
+    def close(self) -> None:
+        if self.path is None:
+            return
+
+        log.info(f"{self.path}: {self.new} new, {self.changed} changed and {self.unchanged} unchanged answers")
+
+        if self.out is not None:
+            self.commit(self.out)
+            self.out = None
+
+        if self.fp is not None:
+            os.fsync(self.fp.fileno())
+            self.fp.close()
+            self.fp = None
+
+    def __enter__(self) -> "ExportState":
+        return self
+
+    def __exit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        self.close()
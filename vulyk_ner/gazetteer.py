@@ -0,0 +1,204 @@
+import glob
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from vulyk_ner.files import file_digest, open_compressed
+from vulyk_ner.ner import AbstractNER, WordSpan, drop_overlapping, spans_to_brat, words_and_offsets
+
+log = logging.getLogger(__name__)
+
+# Bump it when the structure of TokenAutomaton changes, so the automatons cached on disk are rebuilt
+AUTOMATON_VERSION: int = 1
+
+
+class TokenAutomaton:
+    """
+    Aho-Corasick automaton over the tokens (rather than characters), so the patterns
+    are only matched on the token boundaries
+    """
+    def __init__(self) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Patterns ending in the state: length in tokens and tag
+        self.out: List[List[Tuple[int, str]]] = [[]]
+
+    def add(self, tokens: List[str], tag: str) -> bool:
+        """
+        Add pattern to the automaton (build should be called after all the patterns are added).
+        Returns False if the pattern is already there
+        """
+        state: int = 0
+
+        for token in tokens:
+            if token not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][token] = len(self.goto) - 1
+
+            state = self.goto[state][token]
+
+        if self.out[state]:
+            return False
+
+        self.out[state].append((len(tokens), tag))
+        return True
+
+    def build(self) -> None:
+        """
+        Compute failure links (breadth first) and merge the outputs of the states they point to
+        """
+        queue: List[int] = list(self.goto[0].values())
+
+        for state in queue:
+            for token, child in self.goto[state].items():
+                fail: int = self.fail[state]
+                while fail and token not in self.goto[fail]:
+                    fail = self.fail[fail]
+
+                self.fail[child] = self.goto[fail].get(token, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+                queue.append(child)
+
+    def find(self, tokens: List[str]) -> Iterator[WordSpan]:
+        """
+        Find all the occurrences (including overlapping ones) of the patterns in the tokens
+        """
+        state: int = 0
+
+        for i, token in enumerate(tokens):
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+
+            state = self.goto[state].get(token, 0)
+
+            for length, tag in self.out[state]:
+                yield tag, i + 1 - length, i + 1
+
+
+def read_gazetteer(path: pathlib.Path) -> Iterator[Tuple[str, str]]:
+    """
+    Read (surface, tag) pairs from the tsv file. Empty lines and lines starting with # are skipped
+    """
+    with open_compressed(path) as fp:
+        for line_no, line in enumerate(fp, 1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+
+            surface, _, tag = line.rpartition("\t")
+            if not surface.strip() or not tag.strip():
+                log.warning(f"Cannot parse line {line_no} of {path}: {line!r}, skipping")
+                continue
+
+            yield surface.strip(), tag.strip()
+
+
+def build_automaton(paths: List[pathlib.Path]) -> TokenAutomaton:
+    """
+    Compile the automaton from the tsv lists of `surface\\tTAG`. Surfaces are tokenized with tokenize_uk,
+    the same way as the raw texts are tokenized by the tag command
+    """
+    from tokenize_uk import tokenize_words  # type: ignore
+
+    automaton: TokenAutomaton = TokenAutomaton()
+    added: int = 0
+    duplicates: int = 0
+
+    for path in paths:
+        for surface, tag in read_gazetteer(path):
+            if automaton.add(tokenize_words(surface), tag):
+                added += 1
+            else:
+                duplicates += 1
+
+    automaton.build()
+    log.info(f"Compiled gazetteer of {added} entries ({duplicates} duplicates are ignored) from {len(paths)} files")
+
+    return automaton
+
+
+class GazetteerNER(AbstractNER):
+    """
+    NER that finds the names from the lists (tsv files with `surface\\tTAG` lines, given by the file mask).
+    Longest leftmost match wins when the names overlap.
+    Compiled automaton is cached in model_dir (or next to the lists), so the next start is instant
+    """
+    def __init__(self, model: str, model_dir: Optional[str] = None) -> None:
+        paths: List[pathlib.Path] = sorted(map(pathlib.Path, glob.glob(model)))
+        if not paths:
+            raise ValueError(f"Cannot find gazetteer files {model}")
+
+        digest: str = file_digest(*paths)[:16]
+        cache_dir: pathlib.Path = pathlib.Path(model_dir) if model_dir else paths[0].parent
+        cache_path: pathlib.Path = cache_dir / f"gazetteer.{digest}.v{AUTOMATON_VERSION}.pickle"
+
+        if cache_path.exists():
+            log.info(f"Loading compiled gazetteer from {cache_path}")
+            with cache_path.open("rb") as fp:
+                self.automaton: TokenAutomaton = pickle.load(fp)
+        else:
+            self.automaton = build_automaton(paths)
+
+            # Writing to the temporary file first, so the concurrent runs never see the partial file
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fp:
+                pickle.dump(self.automaton, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+
+        self.identity = f"gazetteer:{digest}"
+
+    def find(self, sentences: List[List[str]]) -> List[WordSpan]:
+        """
+        Find the names in the sentences of words, returns the spans of words counted through the whole document
+        """
+        spans: List[WordSpan] = []
+        first_word: int = 0
+
+        for words in sentences:
+            spans.extend((tag, first_word + start, first_word + end) for tag, start, end in self.automaton.find(words))
+            first_word += len(words)
+
+        return drop_overlapping(spans)
+
+    def tag_text(self, txt: str) -> str:
+        """
+        Tokenize the text with tokenize_uk and find the names in it
+        """
+        from tokenize_uk import tokenize_text  # type: ignore
+
+        sentences: List[List[str]] = [[w for w in s if w.strip()] for p in tokenize_text(txt) for s in p]
+        words: List[str] = [w for s in sentences for w in s]
+        brat_str: str = ""
+        pos: int = 0
+        starts: List[int] = []
+
+        for word in words:
+            # Tokenizer keeps the words intact, but let's not fail on the text it might have altered
+            found: int = txt.find(word, pos)
+            pos = found if found >= 0 else pos
+            starts.append(pos)
+            pos += len(word)
+
+        for ent_i, (tag, start, end) in enumerate(self.find(sentences)):
+            brat_str += f"T{ent_i + 1}\t{tag} {starts[start]} {starts[end - 1] + len(words[end - 1])}\t"
+            brat_str += f"{txt[starts[start] : starts[end - 1] + len(words[end - 1])]}\n"
+
+        return brat_str
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        """
+        Match the names on the tokens as is
+        """
+        result: List[str] = []
+
+        for doc in docs:
+            sentences, offsets = words_and_offsets(doc)
+            result.append(spans_to_brat(self.find(sentences), [w for s in sentences for w in s], offsets))
+
+        return result
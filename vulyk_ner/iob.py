@@ -0,0 +1,421 @@
+import bisect
+import bz2
+import gzip
+import heapq
+import logging
+import lzma
+import pathlib
+from itertools import islice
+from operator import itemgetter
+from types import TracebackType
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Type, Union
+
+from vulyk_ner.files import COMPRESSION_SUFFIXES
+
+log = logging.getLogger(__name__)
+
+DOCSTART: str = "-DOCSTART- O\n\n"
+OVERLAP_POLICIES: Tuple[str, ...] = ("first", "longest", "layers")
+
+
+# Entity (or a fragment of it): tag, offsets of the first and past the last characters in the text
+Span = Tuple[str, int, int]
+
+
+def answer_spans(task_record: dict) -> List[Span]:
+    """
+    Entities of the vulyk answer as spans, fragmented entities are treated as separate ones for now
+    """
+    return [(ent[1], subent[0], subent[1]) for ent in task_record["entities"] for subent in ent[2]]
+
+
+def resolve_overlaps(spans: List[Span], policy: str = "first") -> List[List[Span]]:
+    """
+    Arrange the (possibly overlapping or nested) spans into layers of non-overlapping spans sorted by start.
+    `first` keeps the span that starts first (the longest of those that start at the same position) and drops
+    the ones overlapping it, `longest` keeps the longest of the overlapping spans, both return a single layer.
+    `layers` keeps all the spans, putting each one into the first layer where it fits.
+    Empty spans are dropped
+    """
+    if policy not in OVERLAP_POLICIES:
+        raise ValueError(f"Unknown overlap policy {policy}, should be one of {', '.join(OVERLAP_POLICIES)}")
+
+    ordered: List[Span] = sorted((s for s in spans if s[2] > s[1]), key=itemgetter(1))
+
+    # Usually nothing overlaps and every policy gives the spans as they are
+    if all(prev[2] <= span[1] for prev, span in zip(ordered, islice(ordered, 1, None))):
+        return [ordered]
+
+    ordered.sort(key=lambda s: (s[1], s[1] - s[2]))
+
+    if policy == "first":
+        layer: List[Span] = []
+        for span in ordered:
+            if not layer or span[1] >= layer[-1][2]:
+                layer.append(span)
+
+        return [layer]
+
+    if policy == "longest":
+        kept: List[Span] = []
+        # Overlapping spans are resolved within the runs of spans that overlap each other, which are short
+        cluster: List[Span] = []
+        cluster_end: int = 0
+
+        for span in ordered:
+            if cluster and span[1] >= cluster_end:
+                kept.extend(keep_longest(cluster))
+                cluster = []
+
+            cluster.append(span)
+            cluster_end = max(cluster_end, span[2]) if len(cluster) > 1 else span[2]
+
+        kept.extend(keep_longest(cluster))
+        return [kept]
+
+    layers: List[List[Span]] = []
+    # Ends of the last spans of the layers that are still open and the layers that are free again
+    busy: List[Tuple[int, int]] = []
+    free: List[int] = []
+
+    for span in ordered:
+        while busy and busy[0][0] <= span[1]:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+
+        if free:
+            layer_no: int = heapq.heappop(free)
+        else:
+            layer_no = len(layers)
+            layers.append([])
+
+        layers[layer_no].append(span)
+        heapq.heappush(busy, (span[2], layer_no))
+
+    return layers
+
+
+def keep_longest(spans: List[Span]) -> List[Span]:
+    """
+    Keep the longest spans (the ones that start first of the same length) dropping the ones overlapping them,
+    returns them sorted by start
+    """
+    starts: List[int] = []
+    kept: List[Span] = []
+
+    for span in sorted(spans, key=lambda s: s[1] - s[2]):
+        pos: int = bisect.bisect_left(starts, span[1])
+        if (pos > 0 and kept[pos - 1][2] > span[1]) or (pos < len(kept) and kept[pos][1] < span[2]):
+            continue
+
+        starts.insert(pos, span[1])
+        kept.insert(pos, span)
+
+    return kept
+
+
+def assign_tags(tokens_off: List[List[int]], layer: List[Span]) -> List[str]:
+    """
+    IOB tags of the tokens (sorted by start) for the layer of non-overlapping spans (see resolve_overlaps).
+    Token belongs to the span its first character falls into, the first token of the span is tagged with B-,
+    even when the span starts in the middle of the token before it or in the whitespace (the token the span starts
+    in is left out). Single pass over the tokens and the spans
+    """
+    tags: List[str] = []
+    spans: Iterator[Span] = iter(layer)
+    span: Optional[Span] = next(spans, None)
+    tag: str = "O"
+
+    for token in tokens_off:
+        start: int = token[0]
+
+        while span is not None and span[2] <= start:
+            span = next(spans, None)
+            tag = "O"
+
+        if span is not None and span[1] <= start:
+            tags.append(tag if tag != "O" else "B-" + span[0])
+            tag = "I-" + span[0]
+        else:
+            tags.append("O")
+
+    return tags
+
+
+def compress_member(data: bytes, suffix: str) -> bytes:
+    """
+    Compress the data as a standalone member (gzip member, bz2/xz stream, zstd frame) according to the suffix.
+    Concatenated members are still a valid compressed file, while each of them can be decompressed on its own
+    """
+    if suffix == ".gz":
+        return gzip.compress(data, mtime=0)
+    elif suffix == ".bz2":
+        return bz2.compress(data)
+    elif suffix == ".xz":
+        return lzma.compress(data)
+    elif suffix == ".zst":
+        import zstandard  # type: ignore
+
+        return zstandard.ZstdCompressor().compress(data)
+
+    return data
+
+
+def decompress_member(data: bytes, suffix: str) -> bytes:
+    if suffix == ".gz":
+        return gzip.decompress(data)
+    elif suffix == ".bz2":
+        return bz2.decompress(data)
+    elif suffix == ".xz":
+        return lzma.decompress(data)
+    elif suffix == ".zst":
+        import zstandard  # type: ignore
+
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return data
+
+
+def render_iob(
+    text: str, sentences_off: List[List[int]], tokens_off: List[List[int]], tags: List[str], outside: str = "O"
+) -> str:
+    """
+    Lines of IOB document for the text with the tags of the tokens (both sentences and tokens are sorted by start).
+    Text between the tokens gets the outside tag, sentences are separated by the blank lines
+    """
+    current_sent: int = 0
+    sent_end: int = sentences_off[0][1] if sentences_off else 0
+    prev_position: int = 0
+    result: List[str] = []
+    append = result.append
+    gap_tag: str = " " + outside
+
+    for token, tag in zip(tokens_off, tags):
+        start, end = token[0], token[1]
+
+        # First add things in between tokens
+        if start > prev_position + 1:
+            append(text[prev_position:start] + gap_tag)
+
+        # Validate boundaries of sentences
+        if start > sent_end:
+            current_sent += 1
+            sent_end = sentences_off[current_sent][1] if current_sent < len(sentences_off) else len(text)
+            append("")
+
+        # Adding the token itself
+        append(f"{text[start:end]} {tag}")
+
+        prev_position = end
+
+    # Leftovers
+    if text[prev_position:]:
+        result.append(text[prev_position:] + " " + outside)
+
+    return "\n".join(result)
+
+
+class IobIndexEntry(NamedTuple):
+    """
+    Where the IOB document of the user lies in the stream: name of the file, offset and length in bytes
+    """
+    user: str
+    task_id: str
+    file: str
+    offset: int
+    length: int
+
+
+class IobFilesSink:
+    """
+    Writes every IOB document into its own file {batch_dir}/{user}/{task_id}.iob
+    """
+    def __init__(self, batch_dir: pathlib.Path) -> None:
+        self.batch_dir: pathlib.Path = batch_dir
+        self.batch_dir.mkdir(exist_ok=True)
+
+    def write(self, user: str, task_id: str, iob: str) -> None:
+        user_dir: pathlib.Path = self.batch_dir / user
+        user_dir.mkdir(exist_ok=True)
+
+        with open(user_dir / (task_id + ".iob"), "w") as fp_out:
+            fp_out.write(iob)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "IobFilesSink":
+        return self
+
+    def __exit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        self.close()
+
+
+class IobStreamSink:
+    """
+    Writes the IOB documents of the batch into one CoNLL stream {batch}.iob (or a few shards of it when
+    shard_docs/shard_bytes are set, named like the shards of JsonlinesSink) instead of a file per document.
+    Every document starts with `-DOCSTART- O` line and ends with the blank line.
+    With compression (.gz, .bz2, .xz or .zst), each document is compressed as a separate member of the stream,
+    so the index {batch}.index.tsv allows to read any of them without decompressing the rest.
+    Index has a `user, task_id, offset, length` line per document, preceded by `#, file name` line
+    of the shard they are written to
+    """
+    def __init__(
+        self, output_dir: pathlib.Path, batch: str, compression: str = "", shard_docs: int = 0, shard_bytes: int = 0
+    ) -> None:
+        if compression and compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression {compression}, should be one of {', '.join(COMPRESSION_SUFFIXES)}")
+
+        self.output_dir: pathlib.Path = output_dir
+        self.batch: str = batch
+        self.compression: str = compression
+        self.shard_docs: int = shard_docs
+        self.shard_bytes: int = shard_bytes
+
+        self.paths: List[pathlib.Path] = []
+        self.docs_in_shard: int = 0
+        self.bytes_in_shard: int = 0
+        self.fp: Optional[IO[bytes]] = None
+
+        self.index_fp: Optional[IO[str]] = open(index_path(output_dir, batch), "w", encoding="utf-8")
+        self._open_shard()
+
+    def shard_path(self, shard: int) -> pathlib.Path:
+        if not (self.shard_docs or self.shard_bytes):
+            return self.output_dir / f"{self.batch}.iob{self.compression}"
+
+        return self.output_dir / f"{self.batch}.{shard:05d}.iob{self.compression}"
+
+    def _open_shard(self) -> None:
+        path: pathlib.Path = self.shard_path(len(self.paths))
+        log.info(f"Writing IOB stream to {path}")
+
+        self.fp = open(path, "wb")
+        self.paths.append(path)
+
+        if self.index_fp is not None:
+            self.index_fp.write(f"#\t{path.name}\n")
+        self.docs_in_shard = 0
+        self.bytes_in_shard = 0
+
+    def write(self, user: str, task_id: str, iob: str) -> None:
+        assert self.fp is not None and self.index_fp is not None, "Sink is already closed"
+
+        member: bytes = compress_member((DOCSTART + iob + "\n\n").encode("utf-8"), self.compression)
+
+        if self.docs_in_shard and (
+            (self.shard_docs and self.docs_in_shard >= self.shard_docs)
+            or (self.shard_bytes and self.bytes_in_shard + len(member) > self.shard_bytes)
+        ):
+            self.fp.close()
+            self._open_shard()
+
+        self.fp.write(member)
+        self.index_fp.write(f"{user}\t{task_id}\t{self.bytes_in_shard}\t{len(member)}\n")
+        self.docs_in_shard += 1
+        self.bytes_in_shard += len(member)
+
+    def flush(self) -> None:
+        if self.fp is not None:
+            self.fp.flush()
+
+        if self.index_fp is not None:
+            self.index_fp.flush()
+
+    def close(self) -> None:
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+        if self.index_fp is not None:
+            self.index_fp.close()
+            self.index_fp = None
+
+    def __enter__(self) -> "IobStreamSink":
+        return self
+
+    def __exit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        self.close()
+
+
+def index_path(output_dir: pathlib.Path, batch: str) -> pathlib.Path:
+    return output_dir / f"{batch}.index.tsv"
+
+
+def read_iob_index(path: pathlib.Path) -> Dict[Tuple[str, str], IobIndexEntry]:
+    """
+    Read the index of IOB stream written by IobStreamSink, keyed by (user, task_id)
+    """
+    index: Dict[Tuple[str, str], IobIndexEntry] = {}
+    file: str = ""
+
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            fields: List[str] = line.rstrip("\n").split("\t")
+
+            if fields[0] == "#":
+                file = fields[1]
+            else:
+                user, task_id, offset, length = fields
+                index[(user, task_id)] = IobIndexEntry(user, task_id, file, int(offset), int(length))
+
+    return index
+
+
+def read_iob_document(stream_dir: pathlib.Path, entry: IobIndexEntry, fp: Optional[IO[bytes]] = None) -> str:
+    """
+    Read a single IOB document from the stream by its index entry. Pass the open file of the stream
+    to read many documents from it
+    """
+    if fp is None:
+        with open(stream_dir / entry.file, "rb") as stream_fp:
+            return read_iob_document(stream_dir, entry, stream_fp)
+
+    fp.seek(entry.offset)
+    doc: str = decompress_member(fp.read(entry.length), pathlib.PurePath(entry.file).suffix.lower()).decode("utf-8")
+
+    return doc[len(DOCSTART) : -2]
+
+
+def iter_iob_stream(index: Union[str, pathlib.Path]) -> Iterator[Tuple[IobIndexEntry, str]]:
+    """
+    Read all the documents of the stream in the order of the index
+    """
+    index = pathlib.Path(index)
+    fp: Optional[IO[bytes]] = None
+
+    try:
+        for entry in read_iob_index(index).values():
+            if fp is None or pathlib.Path(fp.name).name != entry.file:
+                if fp is not None:
+                    fp.close()
+                fp = open(index.parent / entry.file, "rb")
+
+            yield entry, read_iob_document(index.parent, entry, fp)
+    finally:
+        if fp is not None:
+            fp.close()
+
+
+def unpack_iob_stream(index: Union[str, pathlib.Path], output_dir: pathlib.Path) -> int:
+    """
+    Rebuild the layout of a file per document ({output_dir}/{batch}/{user}/{task_id}.iob) from the stream.
+    Returns the number of documents written
+    """
+    index = pathlib.Path(index)
+    batch: str = index.name[: -len(".index.tsv")] if index.name.endswith(".index.tsv") else index.stem
+    written: int = 0
+
+    with IobFilesSink(output_dir / batch) as sink:
+        for entry, iob in iter_iob_stream(index):
+            sink.write(entry.user, entry.task_id, iob)
+            written += 1
+
+    return written
@@ -0,0 +1,105 @@
+import re
+from functools import partial
+from typing import IO, Iterator, List, Pattern, Tuple
+
+# Rest of the json string after the opening quote: stops at the closing quote, or at the end of the chunk
+# (possibly right after the backslash, which escapes the first character of the next chunk)
+STRING_REST: Pattern = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+PLAIN_AND_STRING: Pattern = re.compile(r'([^"]*)(?:"[^"\\]*(?:\\.[^"\\]*)*")?', re.S)
+BRACKET: Pattern = re.compile(r"[\[\]{}]")
+NOT_BRACKET: Pattern = re.compile(r"[^\[\]{}]+")
+
+
+def min_depth_change(segment: str) -> Tuple[int, int]:
+    """
+    Lowest depth relative to the start of the segment (with no strings in it) and the depth change over it.
+    Balanced pairs of brackets are dropped, what's left is a run of closing brackets followed by opening ones
+    """
+    brackets: str = NOT_BRACKET.sub("", segment)
+
+    while True:
+        reduced: str = brackets.replace("[]", "").replace("{}", "")
+        if reduced == brackets:
+            break
+        brackets = reduced
+
+    closing: int = len(brackets) - len(brackets.lstrip("]}"))
+    return -closing, len(brackets) - 2 * closing
+
+
+def iter_array_items(fp: IO[str], chunk_size: int = 1 << 20) -> Iterator[Tuple[int, str]]:
+    """
+    Split the stream of json arrays (i.e. the vulyk export, where each line is an array of answers)
+    into the json of their items without decoding them. Only the item being read is kept in memory,
+    so the giant lines are never materialized at once. Items are expected to be objects or arrays.
+    Yields the number of array (starting from 0) and the json of the item
+    """
+    depth: int = 0
+    array_no: int = 0
+    in_string: bool = False
+    escaped: bool = False
+    # Parts of the current item from the previous chunks and where it starts in the current one
+    parts: List[str] = []
+    item_start: int = 0
+
+    for chunk in iter(partial(fp.read, chunk_size), ""):
+        pos: int = 0
+        size: int = len(chunk)
+
+        while pos < size:
+            if in_string:
+                if escaped:
+                    escaped = False
+                    pos += 1
+                    continue
+
+                pos = STRING_REST.match(chunk, pos).end()  # type: ignore
+                if pos < size:
+                    if chunk[pos] == "\\":
+                        escaped = True
+                    else:
+                        in_string = False
+                    pos += 1
+                continue
+
+            # Run of structure with no strings, followed by the string (unless it continues in the next chunk)
+            m = PLAIN_AND_STRING.match(chunk, pos)
+            end: int = m.end(1)  # type: ignore
+            segment: str = m.group(1)  # type: ignore
+            closing: int = segment.count("]") + segment.count("}")
+
+            # Segments deep inside the item (i.e. token offsets) are skipped without looking at every bracket,
+            # unless the item might end there
+            if depth - closing >= 2:
+                depth += segment.count("[") + segment.count("{") - closing
+            else:
+                lowest, change = min_depth_change(segment) if depth >= 2 else (-depth, 0)
+
+                if depth + lowest >= 2:
+                    depth += change
+                else:
+                    for bracket in BRACKET.finditer(chunk, pos, end):
+                        if bracket.group() in "[{":
+                            depth += 1
+                            if depth == 2:
+                                item_start = bracket.start()
+                                parts = []
+                        else:
+                            depth -= 1
+                            if depth == 1:
+                                yield array_no, "".join(parts) + chunk[item_start : bracket.end()]
+                                parts = []
+                            elif depth == 0:
+                                array_no += 1
+
+            pos = m.end()  # type: ignore
+            if pos == end and pos < size:
+                in_string = True
+                pos += 1
+
+        if depth >= 2:
+            parts.append(chunk[item_start:])
+            item_start = 0
+
+    if depth != 0 or in_string:
+        raise ValueError(f"Unexpected end of json stream in the array #{array_no}")
@@ -0,0 +1,185 @@
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from types import TracebackType
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Type, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    Peak resident memory of the process (or of its finished children, i.e. the workers) in megabytes.
+    None on the platforms with no resource module (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    usage: int = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage / (1 << 20) if sys.platform == "darwin" else usage / (1 << 10)
+
+
+class Metrics:
+    """
+    Wall and CPU time spent in the stages of the pipeline (reading, tokenization, model, conversion, writing),
+    number of documents and tokens processed per second and the peak memory.
+    With path, the summary is written there as a json line in the end of the run and, if every is set,
+    the same progress lines are written every that many seconds. Path `-` means stderr.
+    Metrics with no path still collect the numbers, it's cheap
+    """
+    def __init__(self, path: str = "", every: float = 0.0) -> None:
+        self.path: str = path
+        self.every: float = every
+
+        self.started: float = time.perf_counter()
+        self.started_cpu: float = time.process_time()
+        self.last_report: float = self.started
+
+        self.wall: Dict[str, float] = {}
+        self.cpu: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.documents: int = 0
+        self.tokens: int = 0
+
+        self.fp: Optional[IO] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Add the time spent in the block to the stage
+        """
+        wall: float = time.perf_counter()
+        cpu: float = time.process_time()
+
+        try:
+            yield
+        finally:
+            self.wall[name] = self.wall.get(name, 0.0) + time.perf_counter() - wall
+            self.cpu[name] = self.cpu.get(name, 0.0) + time.process_time() - cpu
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def timed(self, name: str, items: Iterable[T], exclude: Iterable[str] = ()) -> Iterator[T]:
+        """
+        Add the time spent to produce the items (i.e. to read the inputs) to the stage. Time of the exclude stages
+        spent while producing the items (i.e. reading the inputs while waiting for the results of the workers)
+        is not added, so the stages don't overlap
+        """
+        it: Iterator[T] = iter(items)
+        excluded: List[str] = list(exclude)
+
+        while True:
+            wall: float = sum(self.wall.get(stage, 0.0) for stage in excluded)
+            cpu: float = sum(self.cpu.get(stage, 0.0) for stage in excluded)
+
+            with self.stage(name):
+                item: Optional[T] = next(it, None)
+
+            self.wall[name] -= sum(self.wall.get(stage, 0.0) for stage in excluded) - wall
+            self.cpu[name] -= sum(self.cpu.get(stage, 0.0) for stage in excluded) - cpu
+
+            if item is None:
+                return
+
+            yield item
+
+    def count(self, documents: int = 0, tokens: int = 0) -> None:
+        """
+        Count processed documents and tokens, writes the progress line if it's time to
+        """
+        self.documents += documents
+        self.tokens += tokens
+
+        if self.every > 0 and self.path and time.perf_counter() - self.last_report >= self.every:
+            self.report(final=False)
+
+    def summary(self, final: bool = True) -> dict:
+        elapsed: float = time.perf_counter() - self.started
+
+        return {
+            "final": final,
+            "elapsed": round(elapsed, 3),
+            "cpu": round(time.process_time() - self.started_cpu, 3),
+            "documents": self.documents,
+            "tokens": self.tokens,
+            "documents_per_sec": round(self.documents / elapsed, 2) if elapsed else 0.0,
+            "tokens_per_sec": round(self.tokens / elapsed, 2) if elapsed else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_children_mb": peak_rss_mb(children=True),
+            "stages": {
+                name: {"wall": round(self.wall[name], 3), "cpu": round(self.cpu[name], 3), "calls": self.calls[name]}
+                for name in self.wall
+            },
+        }
+
+    def report(self, final: bool = False) -> None:
+        self.last_report = time.perf_counter()
+
+        if self.fp is None:
+            self.fp = sys.stderr if self.path == "-" else open(self.path, "a", encoding="utf-8")
+
+        self.fp.write(json.dumps(self.summary(final)) + "\n")
+        self.fp.flush()
+
+    def close(self) -> None:
+        elapsed: float = time.perf_counter() - self.started
+        stages: str = ", ".join(f"{name} {wall:.1f}s" for name, wall in self.wall.items())
+        log.info(f"Processed {self.documents} documents ({self.tokens} tokens) in {elapsed:.1f}s: {stages}")
+
+        if self.path:
+            self.report(final=True)
+
+        if self.fp is not None and self.fp is not sys.stderr:
+            self.fp.close()
+        self.fp = None
+
+    def __enter__(self) -> "Metrics":
+        return self
+
+    def __exit__(
+        self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]
+    ) -> None:
+        self.close()
+
+
+@contextmanager
+def profiled(prefix: str, top: int = 50) -> Iterator[None]:
+    """
+    Run the block under cProfile and tracemalloc. Writes {prefix}.prof (open it with `python -m pstats` or snakeviz)
+    and {prefix}.tracemalloc.txt with the lines that allocated the most. Empty prefix means no profiling.
+    Both slow the run down noticeably, so it's for the investigations only
+    """
+    if not prefix:
+        yield
+        return
+
+    import cProfile
+    import tracemalloc
+
+    profiler: cProfile.Profile = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(f"{prefix}.prof")
+
+        with open(f"{prefix}.tracemalloc.txt", "w", encoding="utf-8") as fp:
+            fp.write(f"Peak traced memory: {peak / (1 << 20):.1f}MB\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                fp.write(f"{stat}\n")
+
+        log.info(f"Profile is written to {prefix}.prof and {prefix}.tracemalloc.txt")
@@ -0,0 +1,607 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import urllib.request
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from vulyk_ner.brat import parse_bsf
+from vulyk_ner.text import align_tokenized
+
+log = logging.getLogger(__name__)
+
+# Entity found by the model: tag, index of the first word and index of the word after the last one
+# (words are counted through the whole document, see words_and_offsets)
+WordSpan = Tuple[str, int, int]
+
+
+def words_and_offsets(tokenized_text: List[List[str]]) -> Tuple[List[List[str]], array]:
+    """
+    Prepare tokenized text to be fed to the model as is: blank tokens (and sentences that have nothing else)
+    are dropped. Returns the sentences of words and flat array with the offsets of the words in the text of vulyk task
+    (tokens joined by spaces and sentences by newlines, see convert_bsf_2_vulyk), i-th word of the document
+    spans from offsets[2 * i] to offsets[2 * i + 1]
+    """
+    sentences: List[List[str]] = []
+    offsets: array = array("l")
+    pos: int = 0
+
+    for sentence in tokenized_text:
+        words: List[str] = []
+
+        for token in sentence:
+            if token.strip():
+                words.append(token.strip())
+                offsets.extend((pos, pos + len(token)))
+
+            pos += len(token) + 1
+
+        if words:
+            sentences.append(words)
+
+    return sentences, offsets
+
+
+def spans_to_brat(spans: Iterable[WordSpan], words: List[str], offsets: array) -> str:
+    """
+    Convert entities found by the model on the words (see words_and_offsets) to brat format
+    """
+    brat_str: str = ""
+
+    for ent_i, (tag, start, end) in enumerate(spans):
+        brat_str += f"T{ent_i + 1}\t{tag} {offsets[2 * start]} {offsets[2 * end - 1]}\t{' '.join(words[start:end])}\n"
+
+    return brat_str
+
+
+def drop_overlapping(spans: Iterable[WordSpan]) -> List[WordSpan]:
+    """
+    Keep only one of the overlapping entities (the one that starts first, or the longest of those starting together)
+    """
+    result: List[WordSpan] = []
+    last_end: int = 0
+
+    for span in sorted(spans, key=lambda span: (span[1], span[1] - span[2])):
+        if span[1] >= last_end:
+            result.append(span)
+            last_end = span[2]
+
+    return result
+
+
+class AbstractNER:
+    """
+    Abstract class for NER
+    """
+    # Framework, model and its version, used to tell the results of different models apart (i.e in the cache)
+    identity: str = ""
+
+    def __init__(self, model: str) -> None:
+        raise NotImplementedError()
+
+    def tag_text(self, txt: str) -> str:
+        """
+        Tag text with NER model and return brat format
+        """
+        raise NotImplementedError()
+
+    def tag_batch(self, texts: List[str]) -> List[str]:
+        """
+        Tag a batch of texts with NER model and return brat format for each of them.
+        Frameworks that can process documents in bulk should override it
+        """
+        return [self.tag_text(txt) for txt in texts]
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        """
+        Tag a batch of tokenized documents and return brat format for each of them, with offsets in the text
+        of vulyk task (see convert_bsf_2_vulyk with compensate_for_offsets=False).
+        By default documents are normalized with align_tokenized, tagged as texts and the offsets
+        are moved back. Frameworks that can take the tokens as is should override it
+        """
+        aligned: List[Tuple[str, array, array]] = [align_tokenized(doc) for doc in docs]
+        markups: List[str] = self.tag_batch([text for text, _, _ in aligned])
+
+        result: List[str] = []
+        for (_, orig_offsets, new_offsets), markup in zip(aligned, markups):
+            starts: array = new_offsets[::2]
+
+            def realign(pos: int, is_end: bool) -> int:
+                i: int = max(bisect_right(starts, pos - is_end) - 1, 0)
+                return orig_offsets[2 * i] + pos - new_offsets[2 * i]
+
+            brat_str: str = ""
+            for ent_i, ent in enumerate(parse_bsf(markup)):
+                brat_str += (
+                    f"T{ent_i + 1}\t{ent.tag} {realign(ent.start_idx, False)} {realign(ent.end_idx, True)}\t{ent.token}\n"
+                )
+            result.append(brat_str)
+
+        return result
+
+
+class StanzaNER(AbstractNER):
+    """
+    NER using Stanza library
+    """
+    def __init__(self, model: str, model_dir: Optional[str] = None) -> None:
+        import stanza  # type: ignore
+        from stanza.pipeline.core import DownloadMethod  # type: ignore
+
+        logging.getLogger("stanza").setLevel(log.getEffectiveLevel())
+
+        # Models are downloaded only once, subsequent runs are using local copy from the model_dir
+        self.ner = stanza.Pipeline(
+            lang=model,
+            processors="tokenize,mwt,ner",
+            tokenize_pretokenized="true",
+            download_method=DownloadMethod.REUSE_RESOURCES,
+            **({"dir": model_dir} if model_dir else {}),
+        )
+        self.identity = f"stanza:{model}:{stanza.__version__}"
+
+    @staticmethod
+    def doc_to_brat(doc: Any) -> str:
+        """
+        Convert Stanza NER output to brat format
+        """
+        brat_str: str = ""
+
+        for tok_i, ent in enumerate(doc.ents):
+            brat_str += f"T{tok_i + 1}\t{ent.type} {ent.start_char} {ent.end_char}\t{ent.text}\n"
+
+        return brat_str
+
+    def tag_text(self, txt: str) -> str:
+        """
+        Tag with stanza model and convert Stanza NER output to brat format
+        """
+        return self.doc_to_brat(self.ner(txt))
+
+    def tag_batch(self, texts: List[str]) -> List[str]:
+        """
+        Tag the whole batch with stanza model at once (stanza processes list of documents in bulk)
+        """
+        import stanza  # type: ignore
+
+        if not texts:
+            return []
+
+        docs: list = self.ner([stanza.Document([], text=txt) for txt in texts])
+
+        return [self.doc_to_brat(doc) for doc in docs]
+
+    @staticmethod
+    def doc_to_spans(doc: Any) -> Iterator[WordSpan]:
+        """
+        Convert Stanza NER output on pretokenized document to the spans of words
+        """
+        first_word: int = 0
+
+        for sentence in doc.sentences:
+            index: Dict[Any, int] = {token.id: i for i, token in enumerate(sentence.tokens)}
+
+            for ent in sentence.ents:
+                yield ent.type, first_word + index[ent.tokens[0].id], first_word + index[ent.tokens[-1].id] + 1
+
+            first_word += len(sentence.tokens)
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        """
+        Feed the tokens to stanza as is (list of lists), so stanza doesn't split the text once again
+        """
+        import stanza  # type: ignore
+
+        if not docs:
+            return []
+
+        prepared: List[Tuple[List[List[str]], array]] = [words_and_offsets(doc) for doc in docs]
+        tagged: list = self.ner([stanza.Document([], text=sentences) for sentences, _ in prepared])
+
+        return [
+            spans_to_brat(self.doc_to_spans(doc), [w for s in sentences for w in s], offsets)
+            for doc, (sentences, offsets) in zip(tagged, prepared)
+        ]
+
+
+class SpacyNER(AbstractNER):
+    """
+    NER using Spacy library.
+    With window_sentences, tokenized documents are tagged by the windows of that many sentences
+    (neighbour windows share window_overlap sentences), which keeps the memory of transformer models in check
+    """
+    def __init__(self, model: str, window_sentences: int = 0, window_overlap: int = 1) -> None:
+        import spacy
+
+        if window_sentences > 0 and not 0 <= window_overlap < window_sentences:
+            raise ValueError(f"Overlap of the windows should be less than {window_sentences} sentences")
+
+        self.ner = spacy.load(model)
+        self.window_sentences: int = window_sentences
+        self.window_overlap: int = window_overlap
+        self.identity = f"spacy:{model}:{self.ner.meta.get('name')}:{self.ner.meta.get('version')}"
+
+        if window_sentences > 0:
+            self.identity += f":window={window_sentences}/{window_overlap}"
+
+    @staticmethod
+    def doc_to_brat(doc: Any) -> str:
+        """
+        Convert Spacy NER output to brat format
+        """
+        brat_str: str = ""
+
+        if doc.ents:
+            for tok_i, ent in enumerate(doc.ents):
+                brat_str += f"T{tok_i + 1}\t{ent.label_} {ent.start_char} {ent.end_char}\t{ent.text}\n"
+
+        return brat_str
+
+    def tag_text(self, txt: str) -> str:
+        """
+        Tag with spacy model and convert Spacy NER output to brat format
+        """
+        return self.doc_to_brat(self.ner(txt))
+
+    def tag_batch(self, texts: List[str]) -> List[str]:
+        """
+        Tag the whole batch with spacy model using nlp.pipe
+        """
+        return [self.doc_to_brat(doc) for doc in self.ner.pipe(texts, batch_size=max(len(texts), 1))]
+
+    def make_doc(self, tokenized_text: List[List[str]]) -> Any:
+        """
+        Build spacy Doc from the tokens, so spacy tokenizer isn't applied. Spaces between the words are
+        set according to align_tokenized and sentence boundaries are kept
+        """
+        from spacy.tokens import Doc  # type: ignore
+
+        text, _, new_offsets = align_tokenized(tokenized_text)
+        words: List[str] = []
+        spaces: List[bool] = []
+        sent_starts: List[bool] = []
+        new_sentence: bool = True
+
+        for i in range(0, len(new_offsets), 2):
+            piece_start, piece_end = new_offsets[i], new_offsets[i + 1]
+
+            if piece_end - piece_start == 1 and text[piece_start] in " \n":
+                if spaces:
+                    spaces[-1] = True
+                new_sentence = new_sentence or text[piece_start] == "\n"
+            else:
+                words.append(text[piece_start:piece_end])
+                spaces.append(False)
+                sent_starts.append(new_sentence)
+                new_sentence = False
+
+        return Doc(self.ner.vocab, words=words, spaces=spaces, sent_starts=sent_starts)
+
+    def windows(self, n_sentences: int) -> List[Tuple[int, int]]:
+        """
+        Split sentences of the document into windows, returns (first sentence, sentence after the last one) for each
+        """
+        result: List[Tuple[int, int]] = []
+        start: int = 0
+
+        while start < n_sentences:
+            end: int = min(start + self.window_sentences, n_sentences)
+            result.append((start, end))
+
+            if end == n_sentences:
+                break
+
+            start += self.window_sentences - self.window_overlap
+
+        return result
+
+    def window_owners(self, n_sentences: int) -> List[int]:
+        """
+        For each sentence find the window (by its first sentence) where the sentence has the most context around it,
+        entities found in the overlaps are taken from that window only
+        """
+        owners: List[int] = [0] * n_sentences
+        margins: List[float] = [-1.0] * n_sentences
+
+        for start, end in self.windows(n_sentences):
+            for i in range(start, end):
+                # Document boundaries aren't cut by the window, so they don't count
+                margin: float = min(
+                    i - start if start > 0 else float("inf"), end - 1 - i if end < n_sentences else float("inf")
+                )
+
+                if margin > margins[i]:
+                    margins[i] = margin
+                    owners[i] = start
+
+        return owners
+
+    def tag_windows(self, docs: List[List[List[str]]]) -> List[List[WordSpan]]:
+        """
+        Tag the sentences of the documents by windows and merge the entities back into the spans of the documents
+        """
+        # Index of the first word of each sentence (and the total number of words in the end)
+        first_words: List[List[int]] = [list(accumulate((len(s) for s in sentences), initial=0)) for sentences in docs]
+        owners: List[List[int]] = [self.window_owners(len(sentences)) for sentences in docs]
+        windows: List[Tuple[int, int, int]] = [
+            (doc_i, start, end) for doc_i, sentences in enumerate(docs) for start, end in self.windows(len(sentences))
+        ]
+
+        tagged = self.ner.pipe(
+            (self.make_doc(docs[doc_i][start:end]) for doc_i, start, end in windows), batch_size=max(len(docs), 1)
+        )
+
+        found: List[List[WordSpan]] = [[] for _ in docs]
+        for (doc_i, start, _), doc in zip(windows, tagged):
+            shift: int = first_words[doc_i][start]
+
+            for ent in doc.ents:
+                sentence: int = bisect_right(first_words[doc_i], shift + ent.start) - 1
+
+                if owners[doc_i][sentence] == start:
+                    found[doc_i].append((ent.label_, shift + ent.start, shift + ent.end))
+
+        return [drop_overlapping(spans) for spans in found]
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        """
+        Feed the tokens to spacy as prebuilt Doc objects (whole documents or windows of sentences)
+        and take the entities as the spans of words
+        """
+        if not docs:
+            return []
+
+        prepared: List[Tuple[List[List[str]], array]] = [words_and_offsets(doc) for doc in docs]
+
+        if self.window_sentences > 0:
+            spans: List[List[WordSpan]] = self.tag_windows([sentences for sentences, _ in prepared])
+        else:
+            tagged = self.ner.pipe((self.make_doc(sentences) for sentences, _ in prepared), batch_size=max(len(docs), 1))
+            spans = [[(ent.label_, ent.start, ent.end) for ent in doc.ents] for doc in tagged]
+
+        return [
+            spans_to_brat(doc_spans, [w for s in sentences for w in s], offsets)
+            for doc_spans, (sentences, offsets) in zip(spans, prepared)
+        ]
+
+
+class RemoteNER(AbstractNER):
+    """
+    NER that sends texts to the tagging server (see bin/tagging_server.py) which keeps the model loaded
+    """
+    def __init__(self, model: str, timeout: float = 600.0) -> None:
+        self.url: str = model.rstrip("/")
+        self.timeout: float = timeout
+
+        self.info: dict = self._request("/")
+        self.identity = self.info.get("identity") or f"remote:{self.url}"
+        log.info(f"Using {self.info.get('ner_framework')} model {self.info.get('ner_model')} served at {self.url}")
+
+    def _request(self, path: str, payload: Optional[dict] = None) -> dict:
+        data: Optional[bytes] = None if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def tag_text(self, txt: str) -> str:
+        """
+        Tag text on the server and return brat format
+        """
+        return self.tag_batch([txt])[0]
+
+    def tag_batch(self, texts: List[str]) -> List[str]:
+        """
+        Send the whole batch to the server in one request
+        """
+        if not texts:
+            return []
+
+        return self._request("/tag", {"texts": texts})["markups"]
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        """
+        Send the whole batch of tokenized documents to the server in one request
+        """
+        if not docs:
+            return []
+
+        return self._request("/tag", {"documents": docs})["markups"]
+
+
+class NERCache:
+    """
+    Persistent cache of NER results (in brat format) stored in sqlite database.
+    Results are keyed by the identity of the model and the hash of the text (or tokenized document) sent to it
+    (offsets in the result are bound to the exact input, so we hash it as is).
+    When the size of the cache goes over max_bytes, least recently used results are evicted
+    """
+    def __init__(self, path: str, max_bytes: int = 1 << 30) -> None:
+        self.path: str = path
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self.db: sqlite3.Connection = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS ner_cache "
+            "(key TEXT PRIMARY KEY, markup TEXT NOT NULL, size INTEGER NOT NULL, accessed INTEGER NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ner_cache_accessed ON ner_cache (accessed)")
+
+        self.size: int
+        self.clock: int
+        self.size, self.clock = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0), COALESCE(MAX(accessed), 0) FROM ner_cache"
+        ).fetchone()
+
+    @staticmethod
+    def key(identity: str, txt: str) -> str:
+        return hashlib.sha256(f"{identity}\0{txt}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """
+        Look up the results for the given keys, returns only the found ones
+        """
+        found: Dict[str, str] = {}
+        unique: List[str] = list(set(keys))
+
+        # Keeping the number of sqlite variables under the default limit
+        for i in range(0, len(unique), 500):
+            chunk: List[str] = unique[i : i + 500]
+            found.update(
+                self.db.execute(
+                    f"SELECT key, markup FROM ner_cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            )
+
+        if found:
+            self.clock += 1
+            self.db.executemany("UPDATE ner_cache SET accessed = ? WHERE key = ?", [(self.clock, k) for k in found])
+            self.db.commit()
+
+        hits: int = sum(k in found for k in keys)
+        self.hits += hits
+        self.misses += len(keys) - hits
+
+        return found
+
+    def put_many(self, items: List[Tuple[str, str]]) -> None:
+        """
+        Store the results given as (key, markup) pairs
+        """
+        self.clock += 1
+
+        for key, markup in items:
+            size: int = len(key) + len(markup.encode("utf-8"))
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO ner_cache (key, markup, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, markup, size, self.clock),
+            )
+            self.size += size * cur.rowcount
+
+        self.evict()
+        self.db.commit()
+
+    def evict(self) -> None:
+        """
+        Remove least recently used results until the cache takes no more than 90% of max_bytes
+        """
+        if self.size <= self.max_bytes:
+            return
+
+        target: int = int(self.max_bytes * 0.9)
+        evicted: List[str] = []
+
+        # Rows come one by one in the order of the index on accessed, so only the oldest ones are read
+        cur: sqlite3.Cursor = self.db.execute("SELECT key, size FROM ner_cache ORDER BY accessed")
+        for key, size in cur:
+            if self.size <= target:
+                break
+
+            evicted.append(key)
+            self.size -= size
+        cur.close()
+
+        self.db.executemany("DELETE FROM ner_cache WHERE key = ?", [(k,) for k in evicted])
+        log.debug(f"Evicted {len(evicted)} results from NER cache {self.path}")
+
+    def close(self) -> None:
+        total: int = self.hits + self.misses
+        if total:
+            log.info(
+                f"NER cache {self.path}: {self.hits} hits, {self.misses} misses ({self.hits / total:.1%} hit rate)"
+            )
+
+        self.db.close()
+
+
+class CachedNER(AbstractNER):
+    """
+    Wrapper around another NER model that looks up the results in the NERCache first
+    and runs the model only for the texts that weren't found there
+    """
+    def __init__(self, model: AbstractNER, cache: NERCache) -> None:
+        self.model: AbstractNER = model
+        self.cache: NERCache = cache
+        self.identity = model.identity
+
+    def tag_text(self, txt: str) -> str:
+        return self.tag_batch([txt])[0]
+
+    def _tag_cached(self, keys: List[str], items: List[Any], tag: Callable[[List[Any]], List[str]]) -> List[str]:
+        found: Dict[str, str] = self.cache.get_many(keys)
+
+        missing: List[int] = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            markups: List[str] = tag([items[i] for i in missing])
+            self.cache.put_many([(keys[i], markup) for i, markup in zip(missing, markups)])
+
+            for i, markup in zip(missing, markups):
+                found[keys[i]] = markup
+
+        return [found[key] for key in keys]
+
+    def tag_batch(self, texts: List[str]) -> List[str]:
+        keys: List[str] = [self.cache.key(self.identity, txt) for txt in texts]
+
+        return self._tag_cached(keys, texts, self.model.tag_batch)
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        # Offsets of results for tokenized documents are different, so they are cached separately from the texts
+        keys: List[str] = [
+            self.cache.key(f"{self.identity}:tokenized", json.dumps(doc, ensure_ascii=False)) for doc in docs
+        ]
+
+        return self._tag_cached(keys, docs, self.model.tag_tokenized_batch)
+
+
+def build_ner(
+    ner_framework: str,
+    ner_model: str,
+    model_dir: Optional[str] = None,
+    window_sentences: int = 0,
+    window_overlap: int = 1,
+) -> AbstractNER:
+    """
+    Load NER model of the given framework
+    """
+    if ner_framework == "stanza":
+        return StanzaNER(ner_model, model_dir=model_dir)
+    elif ner_framework == "spacy":
+        return SpacyNER(ner_model, window_sentences=window_sentences, window_overlap=window_overlap)
+    elif ner_framework == "gazetteer":
+        from vulyk_ner.gazetteer import GazetteerNER
+
+        return GazetteerNER(ner_model, model_dir=model_dir)
+
+    raise ValueError(f"Unknown NER framework {ner_framework}")
+
+
+def batched(
+    items: Iterable[Any], batch_size: int, max_chars: int = 0, size: Callable[[Any], int] = len
+) -> Iterator[List[Any]]:
+    """
+    Group items into batches of no more than batch_size items.
+    When max_chars is set, batch is also closed once the total size of its items would exceed it
+    (item that is bigger than max_chars forms a batch on its own)
+    """
+    batch: List[Any] = []
+    batch_chars: int = 0
+
+    for item in items:
+        item_size: int = size(item)
+
+        if batch and (len(batch) >= batch_size or (max_chars > 0 and batch_chars + item_size > max_chars)):
+            yield batch
+            batch = []
+            batch_chars = 0
+
+        batch.append(item)
+        batch_chars += item_size
+
+    if batch:
+        yield batch
@@ -0,0 +1,34 @@
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Iterable, Iterator
+
+
+def ordered_map(func: Callable[[Any], Any], items: Iterable[Any], workers: int = 1, window: int = 0) -> Iterator[Any]:
+    """
+    Apply func to each of the items, optionally spreading the work over a pool of processes.
+    Results are yielded strictly in the order of items. No more than `window` items are in flight
+    at any moment, so a slow item can hold back at most `window` finished ones (and memory stays bounded)
+    :param func: picklable callable to apply
+    :param items: items to process
+    :param workers: number of processes to use, 1 or less means to process everything in the current process
+    :param window: size of the reorder window, defaults to 4 items per worker
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    # multiprocessing is slow to import, so it is loaded only when the pool is actually needed
+    from concurrent.futures import ProcessPoolExecutor
+
+    window = max(window or workers * 4, 1)
+    pending: Deque[Future] = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for item in items:
+            pending.append(pool.submit(func, item))
+
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,137 @@
+import logging
+import time
+from bisect import bisect_right
+from itertools import accumulate
+from typing import List, Optional, Tuple
+
+from vulyk_ner.brat import parse_bsf
+from vulyk_ner.gazetteer import GazetteerNER
+from vulyk_ner.ner import AbstractNER
+
+log = logging.getLogger(__name__)
+
+
+class SentenceFilter:
+    """
+    Cheap heuristics to tell the sentences that cannot contain entities: sentences with no letters
+    (punctuation, numbers), sentences where digits take more than max_digit_share of the characters (tables)
+    and sentences with no capitalized words. Sentences with the names from the gazetteer are always kept
+    """
+    def __init__(
+        self, max_digit_share: float = 0.5, require_capitalized: bool = True, gazetteer: Optional[GazetteerNER] = None
+    ) -> None:
+        self.max_digit_share: float = max_digit_share
+        self.require_capitalized: bool = require_capitalized
+        self.gazetteer: Optional[GazetteerNER] = gazetteer
+
+    @property
+    def identity(self) -> str:
+        return (
+            f"prefilter:{self.max_digit_share}:{self.require_capitalized}:"
+            f"{self.gazetteer.identity if self.gazetteer is not None else ''}"
+        )
+
+    def keep(self, sentence: List[str]) -> bool:
+        words: List[str] = [w.strip() for w in sentence if w.strip()]
+
+        if self.gazetteer is not None and next(self.gazetteer.automaton.find(words), None) is not None:
+            return True
+
+        chars: int = sum(map(len, words))
+        letters: int = sum(c.isalpha() for w in words for c in w)
+        if not letters:
+            return False
+
+        if sum(c.isdigit() for w in words for c in w) > self.max_digit_share * chars:
+            return False
+
+        if self.require_capitalized and not any(w[0].isupper() for w in words):
+            return False
+
+        return True
+
+
+def sentence_starts(tokenized_text: List[List[str]]) -> List[int]:
+    """
+    Offsets of the sentences in the text of vulyk task (see convert_bsf_2_vulyk with compensate_for_offsets=False)
+    """
+    if not tokenized_text:
+        return []
+
+    return list(accumulate((sum(map(len, s)) + max(len(s) - 1, 0) + 1 for s in tokenized_text[:-1]), initial=0))
+
+
+class PrefilteredNER(AbstractNER):
+    """
+    Wrapper around another NER model that sends to it only the sentences that passed the SentenceFilter.
+    Rejected sentences get no entities. Keeps the stats to report the skip rate and the (estimated) time saved
+    """
+    def __init__(self, model: AbstractNER, sentence_filter: SentenceFilter) -> None:
+        self.model: AbstractNER = model
+        self.filter: SentenceFilter = sentence_filter
+        self.identity = f"{model.identity}:{sentence_filter.identity}"
+
+        self.sentences: int = 0
+        self.skipped: int = 0
+        self.chars_sent: int = 0
+        self.chars_skipped: int = 0
+        self.model_time: float = 0.0
+
+    def tag_text(self, txt: str) -> str:
+        return self.model.tag_text(txt)
+
+    def tag_batch(self, texts: List[str]) -> List[str]:
+        return self.model.tag_batch(texts)
+
+    @staticmethod
+    def restore_offsets(markup: str, full: List[List[str]], filtered: List[List[str]], kept: List[int]) -> str:
+        """
+        Move the entities found in the filtered document back to their sentences in the full one
+        """
+        full_starts: List[int] = sentence_starts(full)
+        filtered_starts: List[int] = sentence_starts(filtered)
+
+        def restore(pos: int, is_end: bool) -> int:
+            i: int = max(bisect_right(filtered_starts, pos - is_end) - 1, 0)
+            return pos - filtered_starts[i] + full_starts[kept[i]]
+
+        brat_str: str = ""
+        for ent in parse_bsf(markup):
+            spans: str = ";".join(f"{restore(start, False)} {restore(end, True)}" for start, end in ent.spans)
+            brat_str += f"{ent.id}\t{ent.tag} {spans}\t{ent.token}\n"
+
+        return brat_str
+
+    def tag_tokenized_batch(self, docs: List[List[List[str]]]) -> List[str]:
+        prepared: List[Tuple[List[List[str]], List[int]]] = []
+
+        for doc in docs:
+            kept: List[int] = [i for i, sentence in enumerate(doc) if self.filter.keep(sentence)]
+            prepared.append(([doc[i] for i in kept], kept))
+
+            kept_chars: int = sum(len(w) for i in kept for w in doc[i])
+            self.sentences += len(doc)
+            self.skipped += len(doc) - len(kept)
+            self.chars_sent += kept_chars
+            self.chars_skipped += sum(len(w) for s in doc for w in s) - kept_chars
+
+        # Documents that were rejected completely are not sent to the model at all
+        to_tag: List[int] = [i for i, (filtered, _) in enumerate(prepared) if filtered]
+
+        started: float = time.perf_counter()
+        markups: List[str] = self.model.tag_tokenized_batch([prepared[i][0] for i in to_tag]) if to_tag else []
+        self.model_time += time.perf_counter() - started
+
+        result: List[str] = [""] * len(docs)
+        for i, markup in zip(to_tag, markups):
+            result[i] = self.restore_offsets(markup, docs[i], *prepared[i])
+
+        return result
+
+    def close(self) -> None:
+        if self.sentences:
+            saved: float = self.model_time / self.chars_sent * self.chars_skipped if self.chars_sent else 0.0
+            log.info(
+                f"Pre-filter skipped {self.skipped} of {self.sentences} sentences ({self.skipped / self.sentences:.1%}), "
+                f"model time {self.model_time:.1f}s, saved ~{saved:.1f}s (estimated by the share of skipped characters)"
+            )
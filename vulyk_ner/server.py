@@ -0,0 +1,88 @@
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, List, Tuple
+
+from vulyk_ner.ner import AbstractNER
+
+log = logging.getLogger(__name__)
+
+
+class TaggingRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET / returns the information on the loaded model,
+    POST /tag with {"texts": ["text1", "text2"]} returns {"markups": ["brat1", "brat2"]},
+    tokenized documents might be sent as {"documents": [[["sent1_word1", "sent1_word2"]], [["doc2_word1"]]]}
+    """
+    server: "TaggingServer"
+
+    def _send_json(self, code: int, obj: dict) -> None:
+        body: bytes = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path != "/":
+            return self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        self._send_json(200, self.server.info)
+
+    def do_POST(self) -> None:
+        if self.path != "/tag":
+            return self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        bad_request: dict = {
+            "error": "Request should be a json object with the list of texts in `texts` "
+            "or the list of tokenized documents in `documents`"
+        }
+
+        try:
+            payload: Any = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+        except ValueError:
+            return self._send_json(400, bad_request)
+
+        if not isinstance(payload, dict):
+            return self._send_json(400, bad_request)
+
+        if "documents" in payload:
+            docs: Any = payload["documents"]
+            if not (
+                isinstance(docs, list)
+                and all(isinstance(doc, list) for doc in docs)
+                and all(isinstance(s, list) and all(isinstance(w, str) for w in s) for doc in docs for s in doc)
+            ):
+                return self._send_json(400, bad_request)
+        else:
+            texts: Any = payload.get("texts")
+            if not (isinstance(texts, list) and all(isinstance(t, str) for t in texts)):
+                return self._send_json(400, bad_request)
+
+        try:
+            if "documents" in payload:
+                markups: List[str] = self.server.model.tag_tokenized_batch(docs)
+            else:
+                markups = self.server.model.tag_batch(texts)
+        except Exception as e:
+            log.exception("Model failed to tag the request")
+            return self._send_json(500, {"error": f"Model failed to tag the request: {e}"})
+
+        self._send_json(200, {"markups": markups})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        log.debug(format % args)
+
+
+class TaggingServer(HTTPServer):
+    """
+    Long-living local server that keeps NER model warm between the runs of `tag --server`.
+    Requests are processed one by one, so the model is never called concurrently
+    """
+    def __init__(self, address: Tuple[str, int], model: AbstractNER, info: dict) -> None:
+        super().__init__(address, TaggingRequestHandler)
+
+        self.model: AbstractNER = model
+        self.info: dict = info
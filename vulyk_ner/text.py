@@ -0,0 +1,140 @@
+import json
+from array import array
+from collections import namedtuple
+from enum import Enum
+from itertools import chain
+from typing import Generator, List, Tuple
+
+
+class AlignedToken(namedtuple("AlignedToken", ("token", "orig_pos", "new_pos"))):
+    """
+    As we do changing the whitespaces in tokenized text according to the punctuation rules,
+    we need a class to maintain the positions of whitespace tokenized vs. normalized one
+    """
+
+    __slots__: tuple = ()
+
+    def __str__(self) -> str:
+        return str(self.token)
+
+
+class TokenizationType(Enum):
+    """
+    Tokenization type
+    """
+    NOOP = 1
+    WHITESPACE = 2
+    TOKENIZE_UK = 3
+
+
+def simple_tokenizer(text: str) -> List[List[str]]:
+    """
+    Given whitespace/newline tokenized text, return the
+    list of sentences (where each sentence is made of tokens)
+    using whitespaces and newlines
+    """
+
+    doc: List[List[str]] = []
+    if text:
+        for s in text.split("\n"):
+            doc.append(s.split(" "))
+
+    return doc
+
+
+def read_and_tokenize(text: str, fmt: str, tokenizer: TokenizationType) -> List[List[str]]:
+    if fmt == "json":
+        assert tokenizer == TokenizationType.NOOP, "Json is meant to be already tokenized"
+        return json.loads(text)
+    else:
+        assert tokenizer != TokenizationType.NOOP, "You cannot keep texts not-tokenized"
+        if tokenizer == TokenizationType.WHITESPACE:
+            return simple_tokenizer(text)
+        elif tokenizer == TokenizationType.TOKENIZE_UK:
+            # tokenize_uk is only needed to tag raw texts, so it is not loaded for the rest of commands
+            from tokenize_uk import tokenize_text  # type: ignore
+
+            return list(chain(*tokenize_text(text)))
+
+    return []  # Calm down, mypy
+
+
+def align_tokenized(tokenized_text: List[List[str]]) -> Tuple[str, array, array]:
+    """
+    Accepts tokenized text [["sent1_word1", "sent1_word2"], ["sent2_word2"]]
+    and normalizes spaces in the text according to the punctuation.
+    Returns normalized text and two flat arrays with the original and updated positions
+    of the pieces of normalized text (tokens and spaces/newlines between them): [start1, end1, start2, end2, ...].
+    i-th piece of the text is text[new_offsets[2 * i] : new_offsets[2 * i + 1]]
+    """
+    SPACES_BEFORE: str = "([“«"
+    NO_SPACE_BEFORE: str = ".,:!?)]”»"
+
+    pieces: List[str] = []
+    orig_offsets: array = array("l")
+    new_offsets: array = array("l")
+
+    orig_pos: int = 0
+    adj_pos: int = 0
+
+    for s_idx, s in enumerate(tokenized_text):
+        if s_idx > 0:
+            pieces.append("\n")
+            orig_offsets.extend((orig_pos, orig_pos + 1))
+            new_offsets.extend((adj_pos, adj_pos + 1))
+            orig_pos += 1
+            adj_pos += 1
+
+        prev_token: str = ""
+        for w_idx, w in enumerate(s):
+            w_stripped = w.strip()
+
+            if not w_stripped:
+                # If original text contained a space(-es), let's adjust original position for it
+                # + one space after
+                orig_pos += len(w)
+                if w_idx > 0:
+                    orig_pos += 1
+
+                continue
+
+            if w_idx > 0:
+                if w_stripped not in NO_SPACE_BEFORE and not prev_token in SPACES_BEFORE:
+                    pieces.append(" ")
+                    orig_offsets.extend((orig_pos, orig_pos + 1))
+                    new_offsets.extend((adj_pos, adj_pos + 1))
+                    orig_pos += 1
+                    adj_pos += 1
+                else:
+                    # If we are omitting the space (for example, before comma), we
+                    # adjusting original position as if it's there
+                    orig_pos += 1
+
+            pieces.append(w_stripped)
+            orig_offsets.extend((orig_pos, orig_pos + len(w)))
+            new_offsets.extend((adj_pos, adj_pos + len(w_stripped)))
+
+            orig_pos += len(w)
+            adj_pos += len(w_stripped)
+
+            prev_token = w_stripped
+
+    return "".join(pieces), orig_offsets, new_offsets
+
+
+def reconstruct_tokenized(tokenized_text: List[List[str]]) -> Generator[AlignedToken, None, None]:
+    """
+    Accepts tokenized text [["sent1_word1", "sent1_word2"], ["sent2_word2"]]
+    and normalizes spaces in the text according to the punctuation.
+    Returns an iterator over AlignedToken, where each token has the information
+    on the original position and updated position.
+    Use align_tokenized directly on the large texts, it doesn't create an object per token
+    """
+    text, orig_offsets, new_offsets = align_tokenized(tokenized_text)
+
+    for i in range(0, len(new_offsets), 2):
+        yield AlignedToken(
+            text[new_offsets[i] : new_offsets[i + 1]],
+            (orig_offsets[i], orig_offsets[i + 1]),
+            (new_offsets[i], new_offsets[i + 1]),
+        )